@@ -0,0 +1,93 @@
+# benchmarks/inference.py
+"""
+Compares the inference backends of the summarizer: accuracy (ROUGE against the reference
+summaries of a fixed local corpus) versus speed (generated tokens per second and CPU seconds per summary).
+
+Usage:
+    python benchmarks/inference.py [--backends eager,quantized,onnx] [--model facebook/bart-large-cnn]
+                                   [--intra-op-threads 4] [--inter-op-threads 1] [--json]
+
+Every document is summarized once by each backend after a warmup inference; the eager backend is the accuracy reference.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from backends import BACKENDS, configure_threads  # noqa: E402
+from registry import DEFAULT_SUMMARIZER_MODEL, ModelRegistry, model_key  # noqa: E402
+from rouge import rouge  # noqa: E402
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "corpus.jsonl")
+# The same generation settings as TextProcessor
+GENERATION = {"max_length": 130, "min_length": 30, "do_sample": False, "truncation": True}
+
+
+def load_corpus(path=CORPUS) -> list:
+    with open(path, encoding="utf-8") as corpus:
+        return [json.loads(line) for line in corpus if line.strip()]
+
+
+def run_backend(registry: ModelRegistry, model_name: str, backend: str, documents: list) -> dict:
+    """Summarizes every document with the backend and returns its averaged scores and speed."""
+    registry.warmup([model_name], backend)
+    summarizer = registry.get(model_name, backend)
+
+    scores = {"rouge1": 0.0, "rouge2": 0.0, "rougeL": 0.0}
+    tokens = 0
+    wall_seconds = 0.0
+    cpu_seconds = 0.0
+    summaries = {}
+    for document in documents:
+        wall_started, cpu_started = time.perf_counter(), time.process_time()
+        summary = summarizer(document["text"], **GENERATION)[0]["summary_text"]
+        wall_seconds += time.perf_counter() - wall_started
+        cpu_seconds += time.process_time() - cpu_started
+
+        tokens += len(summarizer.tokenizer(summary, add_special_tokens=False)["input_ids"])
+        summaries[document["id"]] = summary
+        for name, value in rouge(summary, document["reference"]).items():
+            scores[name] += value
+
+    return {
+        "backend": backend,
+        "load_seconds": registry.stats()[model_key(model_name, backend)].load_seconds,
+        **{name: value / len(documents) for name, value in scores.items()},
+        "tokens_per_second": tokens / wall_seconds,
+        "seconds_per_summary": wall_seconds / len(documents),
+        "cpu_seconds_per_summary": cpu_seconds / len(documents),
+        "summaries": summaries,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=DEFAULT_SUMMARIZER_MODEL)
+    parser.add_argument("--backends", default="eager,quantized", help=f"Comma separated, any of {', '.join(BACKENDS)}")
+    parser.add_argument("--corpus", default=CORPUS, help="JSON lines with id, text and reference")
+    parser.add_argument("--intra-op-threads", type=int, default=0)
+    parser.add_argument("--inter-op-threads", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print the results, including the summaries, as JSON")
+    args = parser.parse_args()
+
+    configure_threads(args.intra_op_threads, args.inter_op_threads)
+    documents = load_corpus(args.corpus)
+    registry = ModelRegistry()
+    results = [run_backend(registry, args.model, backend.strip(), documents)
+               for backend in args.backends.split(",") if backend.strip()]
+
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        return
+    print(f"{'backend':<10} {'load s':>7} {'ROUGE-1':>8} {'ROUGE-2':>8} {'ROUGE-L':>8} {'tok/s':>7} {'s/sum':>7} {'CPU s/sum':>9}")
+    for result in results:
+        print(f"{result['backend']:<10} {result['load_seconds']:7.1f} {result['rouge1']:8.3f} {result['rouge2']:8.3f} "
+              f"{result['rougeL']:8.3f} {result['tokens_per_second']:7.1f} {result['seconds_per_summary']:7.2f} "
+              f"{result['cpu_seconds_per_summary']:9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+# benchmarks/pipeline.py
+"""
+Benchmarks the fetch -> summarize pipeline offline, against recorded fixtures:
+
+* saved HTML pages (benchmarks/fixtures/pages), served by a local HTTP server so that the
+  real download and streaming parse of ArticleSource is measured;
+* saved transcript payloads and metadata (benchmarks/fixtures/transcripts), replayed in place
+  of the YouTube endpoints;
+* a deterministic stand-in summarizer by default, or any Hugging Face model with --model.
+
+Reports latency percentiles per stage (classify, fetch, summarize, total), throughput, peak RSS
+and model load time as JSON, and compares them against a stored baseline.
+
+Usage:
+    python benchmarks/pipeline.py [--iterations 20] [--model stand-in] [--output results.json]
+                                  [--baseline benchmarks/baseline.json] [--max-regression 0.25]
+                                  [--save-baseline]
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+from contextlib import ExitStack
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from backends import BACKENDS, DEFAULT_BACKEND  # noqa: E402
+from cache import LRUCache  # noqa: E402
+from factories import SourceFactory  # noqa: E402
+from processors import TextProcessor  # noqa: E402
+from registry import ModelRegistry, model_key  # noqa: E402
+from sources import YouTubeSource  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PAGES = os.path.join(HERE, "fixtures", "pages")
+TRANSCRIPTS = os.path.join(HERE, "fixtures", "transcripts")
+BASELINE = os.path.join(HERE, "baseline.json")
+STAND_IN_MODEL = "stand-in"
+STAGES = ("classify", "fetch", "summarize", "total")
+NOISE_FLOOR = 0.002  # seconds, differences below it are never reported as regressions
+
+
+class StandInSummarizer:
+    """
+    Replaces the summarization pipeline in CI: keeps the leading words of every input,
+    so the chunking, batching and map-reduce code runs without a model.
+    """
+
+    tokenizer = None  # TokenChunker counts whitespace tokens
+    words = 40
+
+    def __call__(self, inputs, **kwargs):
+        texts = [inputs] if isinstance(inputs, str) else inputs
+        return [{"summary_text": " ".join(text.split()[:self.words])} for text in texts]
+
+
+class FixturePageHandler(BaseHTTPRequestHandler):
+    """Serves the saved pages without validators, so every iteration downloads the whole page."""
+
+    def do_GET(self):
+        path = os.path.join(PAGES, os.path.basename(self.path))
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, "rb") as page:
+            body = page.read()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureTranscript:
+    def __init__(self, payload: dict):
+        self.language_code = payload["language_code"]
+        self._pieces = payload["pieces"]
+
+    def find_transcript(self, language_codes):
+        return self
+
+    def fetch(self):
+        return [dict(piece) for piece in self._pieces]
+
+
+class Fixtures:
+    """The recorded pages and transcripts, and the patches replaying them."""
+
+    def __init__(self):
+        self.transcripts = {}
+        for name in sorted(os.listdir(TRANSCRIPTS)):
+            with open(os.path.join(TRANSCRIPTS, name), encoding="utf-8") as payload:
+                transcript = json.load(payload)
+            self.transcripts[transcript["video_id"]] = transcript
+        self.pages = sorted(name for name in os.listdir(PAGES) if name.endswith(".html"))
+        self._server = None
+
+    def cases(self) -> dict:
+        """Returns the URL of every fixture keyed by case name."""
+        base_url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        cases = {f"article:{page[:-len('.html')]}": f"{base_url}/{page}" for page in self.pages}
+        cases.update({f"youtube:{video_id}": f"https://www.youtube.com/watch?v={video_id}" for video_id in self.transcripts})
+        return cases
+
+    def __enter__(self):
+        from youtube_transcript_api import YouTubeTranscriptApi
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), FixturePageHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self._patches = ExitStack()
+        self._patches.enter_context(patch.object(
+            YouTubeTranscriptApi, "list_transcripts", lambda video_id: FixtureTranscript(self.transcripts[video_id])
+        ))
+        self._patches.enter_context(patch.object(
+            YouTubeSource, "_get_metadata", staticmethod(lambda video_id: dict(self.transcripts[video_id]["metadata"]))
+        ))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._patches.close()
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def percentile(values: list, q: float) -> float:
+    """Linearly interpolated percentile, q in [0, 1]."""
+    values = sorted(values)
+    position = (len(values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def summarize_timings(timings: list) -> dict:
+    return {
+        "p50": percentile(timings, 0.5),
+        "p90": percentile(timings, 0.9),
+        "p99": percentile(timings, 0.99),
+        "mean": sum(timings) / len(timings),
+    }
+
+
+def run_case(url: str, processor: TextProcessor, iterations: int) -> dict:
+    """Runs the pipeline on the URL `iterations` times (after one warmup run) and returns its timings."""
+    timings = {stage: [] for stage in STAGES}
+    chunks = None
+    for iteration in range(iterations + 1):
+        started = time.perf_counter()
+        source = SourceFactory.create_source(url)
+        classified = time.perf_counter()
+        content = source.get_content()
+        fetched = time.perf_counter()
+        if content.error_message:
+            raise RuntimeError(f"{url}: {content.error_message}")
+        result = processor.process(content)
+        finished = time.perf_counter()
+        if result.error_message:
+            raise RuntimeError(f"{url}: {result.error_message}")
+
+        if iteration == 0:
+            continue  # Warmup: first-use imports and connections
+        timings["classify"].append(classified - started)
+        timings["fetch"].append(fetched - classified)
+        timings["summarize"].append(finished - fetched)
+        timings["total"].append(finished - started)
+        chunks = result.levels[0].chunks if result.levels else None
+
+    return {
+        "stages": {stage: summarize_timings(values) for stage, values in timings.items()},
+        "throughput_per_second": iterations / sum(timings["total"]),
+        "input_words": len(content.text.split()),
+        "chunks": chunks,
+    }
+
+
+def run(model_name=STAND_IN_MODEL, backend=DEFAULT_BACKEND, iterations=20) -> dict:
+    registry = ModelRegistry()
+    if model_name == STAND_IN_MODEL:
+        registry.register(model_name, StandInSummarizer(), backend)
+    else:
+        registry.warmup([model_name], backend)
+    # No chunk cache, every iteration runs the model
+    processor = TextProcessor(model_name, registry=registry, backend=backend, cache=LRUCache(max_entries=0))
+
+    with Fixtures() as fixtures:
+        cases = {name: run_case(url, processor, iterations) for name, url in fixtures.cases().items()}
+
+    return {
+        "model": model_name,
+        "backend": backend,
+        "iterations": iterations,
+        "model_load_seconds": registry.stats()[model_key(model_name, backend)].load_seconds,
+        # Kilobytes on Linux
+        "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "cases": cases,
+    }
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> list:
+    """
+    Compares the median latency of every stage with the baseline.
+
+    Returns:
+        list: (case, stage, baseline p50, current p50, ratio, regressed) for every stage found in both.
+    """
+    rows = []
+    for case, result in results["cases"].items():
+        baseline_case = baseline.get("cases", {}).get(case)
+        if baseline_case is None:
+            continue
+        for stage in STAGES:
+            before = baseline_case["stages"][stage]["p50"]
+            after = result["stages"][stage]["p50"]
+            ratio = after / before if before else float("inf")
+            regressed = ratio > 1 + max_regression and after - before > NOISE_FLOOR
+            rows.append((case, stage, before, after, ratio, regressed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=STAND_IN_MODEL, help="A Hugging Face model, or the stand-in summarizer")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, choices=BACKENDS)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--output", help="Write the results JSON to this file instead of stdout")
+    parser.add_argument("--baseline", default=BASELINE, help="Results JSON to compare with")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="Exit with status 1 if a stage median is slower than the baseline by more than this fraction")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)  # The loggers write to stdout, keep it for the JSON
+    results = run(args.model, args.backend, args.iterations)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            f.write(output + "\n")
+        print(f"Baseline saved to {args.baseline}", file=sys.stderr)
+        return
+    if not os.path.exists(args.baseline):
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if (baseline.get("model"), baseline.get("backend")) != (results["model"], results["backend"]):
+        print(f"Baseline was recorded with {baseline.get('model')} ({baseline.get('backend')}), not compared", file=sys.stderr)
+        return
+
+    rows = compare(results, baseline, args.max_regression)
+    for case, stage, before, after, ratio, regressed in rows:
+        marker = "  REGRESSION" if regressed else ""
+        print(f"{case:<24} {stage:<10} {before * 1000:9.2f} ms -> {after * 1000:9.2f} ms  x{ratio:5.2f}{marker}", file=sys.stderr)
+    if any(row[-1] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
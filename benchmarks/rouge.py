@@ -0,0 +1,47 @@
+# benchmarks/rouge.py
+"""ROUGE-1, ROUGE-2 and ROUGE-L F1 scores, enough to compare backends against each other without extra dependencies."""
+import re
+from collections import Counter
+
+WORD = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list:
+    return WORD.findall(text.lower())
+
+
+def rouge_n(candidate: list, reference: list, n: int) -> float:
+    """F1 of the n-grams shared by the candidate and the reference tokens."""
+    candidate_ngrams = Counter(tuple(candidate[i:i + n]) for i in range(len(candidate) - n + 1))
+    reference_ngrams = Counter(tuple(reference[i:i + n]) for i in range(len(reference) - n + 1))
+    overlap = sum((candidate_ngrams & reference_ngrams).values())
+    return _f1(overlap, sum(candidate_ngrams.values()), sum(reference_ngrams.values()))
+
+
+def rouge_l(candidate: list, reference: list) -> float:
+    """F1 of the longest common subsequence of the candidate and the reference tokens."""
+    previous = [0] * (len(reference) + 1)
+    for token in candidate:
+        current = [0]
+        for j, reference_token in enumerate(reference):
+            current.append(previous[j] + 1 if token == reference_token else max(previous[j + 1], current[j]))
+        previous = current
+    return _f1(previous[-1], len(candidate), len(reference))
+
+
+def rouge(candidate: str, reference: str) -> dict:
+    """Returns the rouge1, rouge2 and rougeL F1 scores of the candidate summary."""
+    candidate, reference = tokenize(candidate), tokenize(reference)
+    return {
+        "rouge1": rouge_n(candidate, reference, 1),
+        "rouge2": rouge_n(candidate, reference, 2),
+        "rougeL": rouge_l(candidate, reference),
+    }
+
+
+def _f1(overlap: int, candidate_total: int, reference_total: int) -> float:
+    if not overlap:
+        return 0.0
+    precision = overlap / candidate_total
+    recall = overlap / reference_total
+    return 2 * precision * recall / (precision + recall)
@@ -0,0 +1,115 @@
+# benchmarks/startup.py
+"""
+Measures how fast the bot starts:
+
+* the import time of every module of src/, each in a fresh interpreter;
+* the time from starting `main.py` to its first getUpdates request (time-to-first-poll),
+  against a local fake Bot API server so that no token or network is needed.
+
+Usage:
+    python benchmarks/startup.py [--runs 3] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+MODULES = ["models", "urls", "cache", "factories", "sources", "processors", "services", "handlers", "main"]
+IMPORT_SNIPPET = "import time; started = time.perf_counter(); import {module}; print(time.perf_counter() - started)"
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Benchmark", "username": "benchmark_bot"}
+
+
+def import_time(module: str) -> float:
+    """Returns the seconds it takes to import the module in a fresh interpreter."""
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET.format(module=module)],
+        cwd=SRC, env=_env(), capture_output=True, text=True, check=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+class FakeBotApi(BaseHTTPRequestHandler):
+    """Answers the Bot API calls made before polling and records when the first getUpdates arrives."""
+
+    first_poll = None  # threading.Event, set by `time_to_first_poll`
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        method = self.path.rsplit("/", 1)[-1]
+        if method == "getUpdates":
+            self.first_poll.set()
+            result = []
+        elif method == "getMe":
+            result = BOT_USER
+        else:
+            result = True
+        body = json.dumps({"ok": True, "result": result}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def time_to_first_poll(timeout=60) -> float:
+    """Starts `main.py` against the fake Bot API and returns the seconds until its first getUpdates request."""
+    FakeBotApi.first_poll = threading.Event()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeBotApi)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    env = _env(
+        TELEGRAM_BOT_TOKEN="1:benchmark",
+        TELEGRAM_API_URL=f"http://127.0.0.1:{server.server_address[1]}/bot",
+        SUMMARY_CACHE_PATH="",
+        HF_HUB_OFFLINE="1",  # The background model warmup must not download anything
+    )
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "main.py"], cwd=SRC, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not FakeBotApi.first_poll.wait(timeout):
+            raise TimeoutError(f"main.py did not poll within {timeout}s")
+        return time.perf_counter() - started
+    finally:
+        process.kill()
+        process.wait()
+        server.shutdown()
+        server.server_close()
+
+
+def _env(**overrides) -> dict:
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    env.update(overrides)
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="Measurements per value, the median is reported")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    results = {"imports": {}, "time_to_first_poll": None}
+    for module in MODULES:
+        results["imports"][module] = statistics.median(import_time(module) for _ in range(args.runs))
+    results["time_to_first_poll"] = statistics.median(time_to_first_poll() for _ in range(args.runs))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for module, seconds in results["imports"].items():
+        print(f"import {module:<12} {seconds * 1000:8.1f} ms")
+    print(f"time to first poll  {results['time_to_first_poll'] * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,8 +7,16 @@ docker build -t "$image_name" .
 docker stop "$container_name" &>/dev/null || true
 docker rm "$container_name" &>/dev/null || true
 
+# One process polls Telegram and queues the requests, INFERENCE_PROCESSES worker processes summarize them.
+# The workers share the weights of one loaded model, so memory grows little with their number;
+# the summary cache and chunk store are SQLite files on the data volume, shared by all of them.
 docker run -d \
     -e TELEGRAM_BOT_TOKEN="YOUR_TELEGRAM_BOT_TOKEN" \
+    -e INFERENCE_PROCESSES="${INFERENCE_PROCESSES:-$(nproc)}" \
+    -e SUMMARY_CACHE_PATH=/data/summary_cache.db \
+    -e CHUNK_STORE_PATH=/data/chunk_store.db \
+    -v "$container_name-models:/root/.cache/huggingface" \
+    -v "$container_name-data:/data" \
     --name "$container_name" \
     --restart always \
     "$image_name"
@@ -0,0 +1,123 @@
+# backends.py
+import os
+
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# eager: fp32 PyTorch as loaded, the reference for accuracy
+# quantized: dynamic int8 quantization of the Linear layers, the bulk of the CPU time
+# compiled: the model forward compiled with torch.compile
+# onnx: the model exported to ONNX and run by ONNX Runtime (needs optimum[onnxruntime])
+BACKENDS = ("eager", "quantized", "compiled", "onnx")
+DEFAULT_BACKEND = "eager"
+# Backends whose loaded model can be inherited by forked worker processes. Compiled graphs and ONNX Runtime
+# sessions own threads and native state that do not survive fork(), their workers load their own copy.
+FORK_SAFE_BACKENDS = ("eager", "quantized")
+ONNX_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "huggingface", "onnx")
+
+# Thread counts set with `configure_threads`, also used for ONNX Runtime sessions (0 leaves the library default)
+_intra_op_threads = 0
+_inter_op_threads = 0
+
+
+def check_backend(backend: str) -> str:
+    """
+    Validates the backend name.
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend} (expected one of {', '.join(BACKENDS)})")
+    return backend
+
+
+def configure_threads(intra_op_threads=0, inter_op_threads=0):
+    """
+    Sets how many threads the inference of this process uses.
+
+    Args:
+        intra_op_threads (int): Threads used inside one operator (matrix multiplication), 0 keeps the default.
+        inter_op_threads (int): Threads running independent operators, 0 keeps the default.
+            PyTorch only accepts it before the first inference.
+    """
+    global _intra_op_threads, _inter_op_threads
+    _intra_op_threads = intra_op_threads
+    _inter_op_threads = inter_op_threads
+    if not intra_op_threads and not inter_op_threads:
+        return
+
+    import torch
+
+    if intra_op_threads:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError as e:
+            logger.warning(f"Cannot set inter-op threads: {e}")
+    logger.info(f"Inference threads: intra-op {torch.get_num_threads()}, inter-op {torch.get_num_interop_threads()}")
+
+
+def pipeline_arguments(model_name: str, backend: str) -> dict:
+    """
+    Returns the `model` (and `tokenizer`) arguments of the summarization pipeline for the backend.
+
+    Args:
+        model_name (str): The Hugging Face model name.
+        backend (str): One of BACKENDS.
+
+    Returns:
+        dict: The model name for PyTorch backends, the ONNX Runtime model and its tokenizer for "onnx".
+    """
+    if check_backend(backend) != "onnx":
+        return {"model": model_name}
+
+    try:
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    except ImportError as e:
+        raise ImportError("The onnx backend needs optimum[onnxruntime]: pip install 'optimum[onnxruntime]'") from e
+    from transformers import AutoTokenizer
+
+    options = onnxruntime.SessionOptions()
+    if _intra_op_threads:
+        options.intra_op_num_threads = _intra_op_threads
+    if _inter_op_threads:
+        options.inter_op_num_threads = _inter_op_threads
+
+    # The export takes minutes, so it is done once and kept next to the Hugging Face cache
+    export_dir = os.path.join(ONNX_CACHE_DIR, model_name.replace("/", "--"))
+    if os.path.isdir(export_dir):
+        model = ORTModelForSeq2SeqLM.from_pretrained(export_dir, session_options=options)
+    else:
+        logger.info(f"Exporting {model_name} to ONNX...")
+        model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True, session_options=options)
+        model.save_pretrained(export_dir)
+    return {"model": model, "tokenizer": AutoTokenizer.from_pretrained(model_name)}
+
+
+def optimize(summarizer, backend: str):
+    """
+    Applies the PyTorch optimizations of the backend to a loaded pipeline.
+
+    Args:
+        summarizer: The transformers summarization pipeline.
+        backend (str): One of BACKENDS.
+
+    Returns:
+        The same pipeline, with its model replaced or compiled in place.
+    """
+    if check_backend(backend) == "quantized":
+        import torch
+
+        summarizer.model = torch.ao.quantization.quantize_dynamic(
+            summarizer.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+    elif backend == "compiled":
+        import torch
+
+        # Generation calls forward with a different sequence length every step
+        summarizer.model.forward = torch.compile(summarizer.model.forward, dynamic=True)
+    return summarizer
@@ -0,0 +1,299 @@
+# batch.py
+"""
+Summarizes a list of URLs offline, e.g. the back catalogue of a channel or a feed of articles.
+
+Reads JSON lines ({"url": ..., "id": ...}, other fields are copied to the output) or plain URLs
+from a file or stdin, fetches the sources concurrently, summarizes the fetched documents in groups
+whose chunks share inference batches, and appends one JSON line per URL to the output as soon as
+it is done. Running the same command again after a crash skips the URLs already in the output.
+
+Usage:
+    python batch.py urls.jsonl -o summaries.jsonl [--fetch-workers 16] [--processes 4] [--group-size 32]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import asdict
+
+from backends import BACKENDS, DEFAULT_BACKEND, configure_threads
+from cache import ChunkStore, LRUCache
+from factories import SourceFactory
+from logger import setup_logger
+from models import Content, SummaryResult
+from languages import DEFAULT_ROUTES, parse_routes
+from processors import TextProcessor
+from registry import DEFAULT_SUMMARIZER_MODEL, model_registry
+from urls import canonicalize_url
+
+logger = setup_logger(__name__)
+
+CHUNK_CACHE_ENTRIES = 65536  # Must hold the chunks of a whole group, see TextProcessor.process_many
+PROGRESS_INTERVAL = 100  # documents between progress lines
+
+# The processor of an inference worker process
+_worker_processor = None
+
+
+def _init_worker(processor_options: dict, threads=(0, 0)):
+    global _worker_processor
+    configure_threads(*threads)
+    if processor_options.get("chunk_store_path"):
+        cache = ChunkStore(processor_options["chunk_store_path"], memory_entries=CHUNK_CACHE_ENTRIES)
+    else:
+        cache = LRUCache(max_entries=CHUNK_CACHE_ENTRIES)
+    _worker_processor = TextProcessor(cache=cache, **processor_options)
+    model_registry.warmup(_worker_processor.models(), _worker_processor.backend)
+
+
+def _process_group(contents: list) -> list:
+    return _worker_processor.process_many(contents)
+
+
+def read_requests(lines):
+    """
+    Parses the input lines.
+
+    Yields:
+        dict: A request with at least "url", blank lines and comments are skipped.
+    """
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if not line.startswith("{"):
+            yield {"url": line}
+            continue
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            logger.error(f"Line {number} skipped, invalid JSON: {e}")
+            continue
+        if not isinstance(request, dict) or not isinstance(request.get("url"), str):
+            logger.error(f'Line {number} skipped, no "url"')
+            continue
+        yield request
+
+
+def request_key(request: dict) -> str:
+    """Identifies a request in the output: its "id", or the canonical form of its URL."""
+    return str(request["id"]) if "id" in request else canonicalize_url(request["url"])
+
+
+def load_done(path: str, retry_errors=False) -> set:
+    """
+    Returns the keys of the requests already in the output file.
+    A last line cut by a crash is removed, so that appending continues on a new line.
+    """
+    if not os.path.exists(path):
+        return set()
+    with open(path, "rb+") as output:
+        data = output.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            logger.warning(f"Removing the incomplete last line of {path}")
+            output.truncate(end)
+
+    done = set()
+    for line in data[:end].decode("utf-8").splitlines():
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if retry_errors and record.get("error"):
+            continue
+        done.add(request_key(record))
+    return done
+
+
+class BatchRunner:
+    """
+    Fetches sources with a pool of threads and summarizes them in groups on a pool of inference
+    processes (each with its own model), so that throughput grows with the number of cores.
+    """
+
+    def __init__(self, processor_options: dict, fetch_workers=8, processes=1, group_size=16,
+                 intra_op_threads=0, inter_op_threads=0):
+        """
+        Initializes the runner.
+
+        Args:
+            processor_options (dict): TextProcessor arguments, see TextProcessor.options.
+            fetch_workers (int): How many sources are fetched at the same time.
+            processes (int): Inference processes. 0 runs inference in this process.
+            group_size (int): How many documents are summarized together.
+            intra_op_threads (int): Threads per model operator in every inference process, 0 splits the cores.
+            inter_op_threads (int): Threads running independent model operators, 0 keeps the default.
+        """
+        self.fetch_workers = fetch_workers
+        self.group_size = group_size
+        self.max_groups_in_flight = max(processes, 1) * 2
+        if not intra_op_threads and processes:
+            intra_op_threads = max((os.cpu_count() or 1) // processes, 1)
+        threads = (intra_op_threads, inter_op_threads)
+
+        self._fetch_executor = ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix="fetch")
+        if processes:
+            self._inference_executor = ProcessPoolExecutor(
+                max_workers=processes, initializer=_init_worker, initargs=(processor_options, threads)
+            )
+        else:
+            self._inference_executor = ThreadPoolExecutor(
+                max_workers=1, initializer=_init_worker, initargs=(processor_options, threads)
+            )
+
+    def run(self, requests, output) -> dict:
+        """
+        Summarizes every request and writes a JSON line per request to `output`.
+
+        Args:
+            requests: An iterable of request dicts with "url".
+            output: A text file opened for appending.
+
+        Returns:
+            dict: The number of documents written and failed, and the documents per minute.
+        """
+        started = time.monotonic()
+        stats = {"documents": 0, "errors": 0}
+        fetching = deque()  # (request, future) in input order, at most a few per fetch worker
+        group = []  # (request, content) waiting for inference
+        summarizing = {}  # future -> requests of the group
+
+        def write(request, content: Content, result=None):
+            record = dict(request)
+            error = content.error_message or (result.error_message if result is not None else None)
+            if error:
+                record["error"] = error
+                stats["errors"] += 1
+            else:
+                record.update({
+                    "summary": result.summary,
+                    "source_type": content.source_type,
+                    "source_url": content.source_url,
+                    "image_url": content.image_url,
+                    "title": (content.metadata or {}).get("title"),
+                    "language": result.language,
+                    "model": result.model,
+                })
+                if result.chapters:
+                    record["chapters"] = [asdict(chapter) for chapter in result.chapters]
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()  # A crash loses at most the line being written
+            stats["documents"] += 1
+            if stats["documents"] % PROGRESS_INTERVAL == 0:
+                logger.info(f"{stats['documents']} documents, {self._per_minute(stats, started):.1f}/min")
+
+        def collect(return_when):
+            done, _ = wait(summarizing, return_when=return_when)
+            for future in done:
+                pairs = summarizing.pop(future)
+                try:
+                    results = future.result()
+                except Exception as e:  # e.g. a worker process died
+                    logger.exception(f"Inference failed for a group: {e}")
+                    results = [SummaryResult(error_message=f"Error on summarizing: {e}")] * len(pairs)
+                for (request, content), result in zip(pairs, results):
+                    write(request, content, result)
+
+        def summarize(pairs):
+            while len(summarizing) >= self.max_groups_in_flight:
+                collect(FIRST_COMPLETED)
+            future = self._inference_executor.submit(_process_group, [content for _, content in pairs])
+            summarizing[future] = pairs
+
+        def fetched(request, future):
+            content = future.result()
+            if content.error_message:
+                write(request, content)
+                return
+            group.append((request, content))
+            if len(group) >= self.group_size:
+                summarize(list(group))
+                group.clear()
+
+        for request in requests:
+            fetching.append((request, self._fetch_executor.submit(_fetch, request["url"])))
+            # Keep the fetched documents in input order and the memory bounded
+            while len(fetching) > self.fetch_workers * 2 or (fetching and fetching[0][1].done()):
+                fetched(*fetching.popleft())
+        while fetching:
+            fetched(*fetching.popleft())
+        if group:
+            summarize(list(group))
+        while summarizing:
+            collect(FIRST_COMPLETED)
+
+        stats["documents_per_minute"] = self._per_minute(stats, started)
+        return stats
+
+    def close(self):
+        self._fetch_executor.shutdown()
+        self._inference_executor.shutdown()
+
+    @staticmethod
+    def _per_minute(stats, started) -> float:
+        return stats["documents"] / max(time.monotonic() - started, 1e-9) * 60
+
+
+def _fetch(url: str) -> Content:
+    try:
+        return SourceFactory.create_source(url).get_content()
+    except ValueError as e:
+        return Content(source_url=url, error_message=str(e))
+    except Exception as e:
+        logger.exception(f"Error fetching {url}: {e}")
+        return Content(source_url=url, error_message=f"Error fetching the source: {e}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help='JSON lines with "url" (and optionally "id") or plain URLs, "-" for stdin')
+    parser.add_argument("-o", "--output", required=True, help="JSON lines file the results are appended to")
+    parser.add_argument("--model", default=DEFAULT_SUMMARIZER_MODEL)
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, choices=BACKENDS)
+    parser.add_argument("--fetch-workers", type=int, default=8)
+    parser.add_argument("--processes", type=int, default=1, help="Inference processes, each loads the model")
+    parser.add_argument("--group-size", type=int, default=16, help="Documents whose chunks are batched together")
+    parser.add_argument("--batch-size", type=int, default=16, help="Chunks per forward pass of the model")
+    parser.add_argument("--intra-op-threads", type=int, default=0)
+    parser.add_argument("--inter-op-threads", type=int, default=0)
+    parser.add_argument("--retry-errors", action="store_true", help="Summarize again the URLs that failed before")
+    parser.add_argument("--routes", default=",".join(f"{k}={v}" for k, v in DEFAULT_ROUTES.items()),
+                        help='Models by language, e.g. "ru=model,*=model"; empty summarizes everything with --model')
+    parser.add_argument("--chunk-store", help="SQLite file of chunk summaries, shared with the bot (CHUNK_STORE_PATH)")
+    args = parser.parse_args(argv)
+
+    done = load_done(args.output, args.retry_errors)
+    if done:
+        logger.info(f"Resuming, {len(done)} documents already done")
+
+    processor_options = TextProcessor(args.model, batch_size=args.batch_size, backend=args.backend,
+                                      chunk_store_path=args.chunk_store, routes=parse_routes(args.routes)).options()
+    runner = BatchRunner(processor_options, fetch_workers=args.fetch_workers, processes=args.processes,
+                         group_size=args.group_size, intra_op_threads=args.intra_op_threads,
+                         inter_op_threads=args.inter_op_threads)
+
+    def pending(lines):
+        for request in read_requests(lines):
+            key = request_key(request)
+            if key not in done:
+                done.add(key)  # Also skips duplicates of the input
+                yield request
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    try:
+        with open(args.output, "a", encoding="utf-8") as output:
+            stats = runner.run(pending(source), output)
+    finally:
+        runner.close()
+        if source is not sys.stdin:
+            source.close()
+    logger.info(f"Done: {stats['documents']} documents ({stats['errors']} errors), "
+                f"{stats['documents_per_minute']:.1f} documents/min")
+
+
+if __name__ == "__main__":
+    main()
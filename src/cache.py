@@ -0,0 +1,262 @@
+# cache.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, fields
+
+from models import ChapterSummary, Content, SummaryLevel, SummaryResult
+from urls import canonicalize_url
+
+DEFAULT_TTL = 7 * 24 * 60 * 60  # seconds
+EVICTION_INTERVAL = 1000  # ChunkStore writes between evictions
+TOUCH_INTERVAL = 60 * 60  # seconds, a ChunkStore hit updates the access time of an entry at most this often
+
+
+class LRUCache:
+    """Thread-safe in-memory cache that evicts the least recently used entry when full."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ChunkStore:
+    """
+    Persistent chunk -> summary store backed by SQLite, in front of which the most recently used
+    summaries are kept in memory. Keys are content hashes, so a chunk is summarized once across
+    documents, URLs and restarts. The database can be shared by several processes.
+    """
+
+    def __init__(self, path=":memory:", max_entries=200000, memory_entries=4096):
+        """
+        Initializes the store.
+
+        Args:
+            path (str): The SQLite database file, ":memory:" keeps the store in memory.
+            max_entries (int): The maximum number of summaries kept in the database.
+            memory_entries (int): How many summaries are also kept in memory.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory = LRUCache(max_entries=memory_entries)
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+
+    def get(self, key: str, default=None):
+        summary = self._memory.get(key)
+        if summary is not None:
+            self.hits += 1
+            return summary
+        with self._lock:
+            row = self._db().execute("SELECT summary, accessed_at FROM chunks WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return default
+            # Hits stay read-only, so that the processes sharing the file do not queue for its write lock;
+            # an access time that is an hour old is precise enough for the eviction
+            now = time.time()
+            if now - row[1] > TOUCH_INTERVAL:
+                self._db().execute("UPDATE chunks SET accessed_at = ? WHERE key = ?", (now, key))
+                self._db().commit()
+            self.hits += 1
+        self._memory.set(key, row[0])
+        return row[0]
+
+    def set(self, key: str, summary: str):
+        self._memory.set(key, summary)
+        with self._lock:
+            self._db().execute(
+                "INSERT OR REPLACE INTO chunks (key, summary, accessed_at) VALUES (?, ?, ?)", (key, summary, time.time())
+            )
+            self._writes += 1
+            if self._writes % EVICTION_INTERVAL == 0:
+                self._evict()
+            self._db().commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._db().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+
+    def __contains__(self, key):
+        if key in self._memory:
+            return True
+        with self._lock:
+            return self._db().execute("SELECT 1 FROM chunks WHERE key = ?", (key,)).fetchone() is not None
+
+    def _db(self) -> sqlite3.Connection:
+        """
+        Returns the connection of this process, opened on first use: SQLite connections must not be used
+        across fork(), and inference processes are forked from the process that created the store.
+        """
+        if self._connection is None or self._pid != os.getpid():
+            connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            # Readers do not block the writer of another process
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS chunks (key TEXT PRIMARY KEY, summary TEXT NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS chunks_accessed_at ON chunks (accessed_at)")
+            connection.commit()
+            self._connection, self._pid = connection, os.getpid()
+        return self._connection
+
+    def _evict(self):
+        # Scans the index, so it runs every EVICTION_INTERVAL writes rather than on each one
+        self._db().execute(
+            "DELETE FROM chunks WHERE key IN (SELECT key FROM chunks ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+
+class SummaryCache:
+    """
+    Persistent cache of fetched content and summaries backed by SQLite.
+    Entries are keyed by the canonical source URL, expire after `ttl` seconds
+    and the least recently used ones are evicted above `max_entries`.
+    """
+
+    def __init__(self, path=":memory:", ttl=DEFAULT_TTL, max_entries=10000):
+        """
+        Initializes the cache.
+
+        Args:
+            path (str): The SQLite database file, ":memory:" keeps the cache in memory.
+            ttl (float): How many seconds an entry stays valid.
+            max_entries (int): The maximum number of entries kept.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        # The batch CLI and other replicas may use the same file
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "key TEXT PRIMARY KEY, content TEXT NOT NULL, result TEXT NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS summaries_accessed_at ON summaries (accessed_at)")
+        self._connection.commit()
+
+    def get(self, url: str):
+        """
+        Returns the cached entry for the URL.
+
+        Args:
+            url (str): Any form of the source URL.
+
+        Returns:
+            tuple: The cached (Content, SummaryResult), or None on a miss.
+        """
+        key = canonicalize_url(url)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT content, result, created_at FROM summaries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[2] > self.ttl:
+                if row is not None:
+                    self._connection.execute("DELETE FROM summaries WHERE key = ?", (key,))
+                    self._connection.commit()
+                self.misses += 1
+                return None
+
+            self._connection.execute("UPDATE summaries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._connection.commit()
+            self.hits += 1
+        return _content_from_json(row[0]), _result_from_json(row[1])
+
+    def set(self, url: str, content: Content, result: SummaryResult):
+        """Stores the content and summary for the URL, evicting the least recently used entries if needed."""
+        key = canonicalize_url(url)
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO summaries (key, content, result, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, _content_to_json(content), json.dumps(asdict(result)), now, now),
+            )
+            self._connection.execute(
+                "DELETE FROM summaries WHERE key IN ("
+                "SELECT key FROM summaries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._connection.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+def _content_to_json(content: Content) -> str:
+    # The transcript timestamps are only needed while summarizing
+    return json.dumps({f.name: getattr(content, f.name) for f in fields(content) if f.name != "transcript"})
+
+
+def _content_from_json(data: str) -> Content:
+    return Content(**json.loads(data))
+
+
+def _result_from_json(data: str) -> SummaryResult:
+    result = SummaryResult(**json.loads(data))
+    if result.levels:
+        result.levels = [SummaryLevel(**level) for level in result.levels]
+    if result.chapters:
+        result.chapters = [ChapterSummary(**chapter) for chapter in result.chapters]
+    return result
@@ -0,0 +1,194 @@
+# chunkers.py
+import re
+import zlib
+from array import array
+from collections.abc import Sequence
+
+DEFAULT_MAX_TOKENS = 1000  # Leaves room for the special tokens of a 1024 token model window
+# Content-defined chunks end at an "anchor" sentence (1 in ANCHOR_EVERY, by hash) once MIN_FILL of the budget is used
+ANCHOR_EVERY = 8
+MIN_FILL = 0.75
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?…。])\s+")
+STRIPPED = re.compile(r"\S(?:.*\S)?", re.DOTALL)
+WORD = re.compile(r"\S+")
+
+
+def sentence_spans(text: str, start=0, end=None):
+    """Yields the (start, end) offsets of the sentences of text[start:end], without surrounding whitespace."""
+    end = len(text) if end is None else end
+    position = start
+    for boundary in SENTENCE_BOUNDARY.finditer(text, start, end):
+        sentence = STRIPPED.search(text, position, boundary.start())
+        if sentence:
+            yield sentence.span()
+        position = boundary.end()
+    sentence = STRIPPED.search(text, position, end)
+    if sentence:
+        yield sentence.span()
+
+
+def split_sentences(text: str) -> list:
+    """Splits text into sentences on terminal punctuation followed by whitespace."""
+    return [text[start:end] for start, end in sentence_spans(text)]
+
+
+class Chunks(Sequence):
+    """
+    The chunks of a text, kept as offsets into it: a chunk is sliced from the text only when it is read,
+    e.g. when its batch goes through the model, instead of all of them being copied up front.
+    """
+
+    __slots__ = ("text", "starts", "ends", "tokens")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.starts, self.ends, self.tokens = array("l"), array("l"), array("l")
+
+    def append(self, start: int, end: int, tokens: int):
+        self.starts.append(start)
+        self.ends.append(end)
+        self.tokens.append(tokens)
+
+    def span(self, index: int) -> tuple:
+        return self.starts[index], self.ends[index]
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self.tokens)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self.text[self.starts[index]:self.ends[index]]
+
+
+class WhitespaceTokenizer:
+    """Fallback tokenizer that counts words, used when the model does not expose one."""
+
+    def encode(self, text, add_special_tokens=False):
+        return text.split()
+
+
+class TokenChunker:
+    """
+    Packs whole sentences into chunks that fit a token budget of the model's tokenizer.
+    Sentences longer than the budget (e.g. unpunctuated auto-generated captions) are split on words.
+
+    With `content_defined`, chunk boundaries depend on the sentences around them rather than on the
+    position in the text: an edit only changes the chunks around it, the following ones are the same
+    as before and their cached summaries are reused.
+    """
+
+    def __init__(self, tokenizer=None, max_tokens=DEFAULT_MAX_TOKENS, overlap_tokens=0, content_defined=False):
+        """
+        Initializes the chunker.
+
+        Args:
+            tokenizer: A Hugging Face tokenizer (anything with an `encode` method).
+            max_tokens (int): The maximum number of tokens in one chunk.
+            overlap_tokens (int): How many tokens of trailing sentences to repeat at the start of the next chunk.
+            content_defined (bool): End chunks at anchor sentences once they are `MIN_FILL` full.
+        """
+        if overlap_tokens >= max_tokens:
+            raise ValueError("Chunk overlap must be smaller than the chunk size.")
+        self.tokenizer = tokenizer or WhitespaceTokenizer()
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.content_defined = content_defined
+        self.min_tokens = int(max_tokens * MIN_FILL)
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def split(self, text: str) -> list:
+        """
+        Splits the text into chunks of whole sentences.
+
+        Args:
+            text (str): The text to split.
+
+        Returns:
+            list: The chunks, each at most `max_tokens` long.
+        """
+        return list(self.chunks(text))
+
+    def chunks(self, text: str, start=0, end=None) -> Chunks:
+        """
+        Splits text[start:end] into chunks of whole sentences, as offsets into the text.
+
+        Args:
+            text (str): The text to split.
+            start (int): Offset of the part to split.
+            end (int, optional): End offset of the part to split, the end of the text by default.
+
+        Returns:
+            Chunks: The chunks, each at most `max_tokens` long.
+        """
+        pieces = []  # (start, end, tokens)
+        for sentence_start, sentence_end in sentence_spans(text, start, end):
+            tokens = self.count_tokens(text[sentence_start:sentence_end])
+            if tokens > self.max_tokens:
+                pieces.extend(self._split_long_sentence(text, sentence_start, sentence_end))
+            else:
+                pieces.append((sentence_start, sentence_end, tokens))
+
+        chunks = Chunks(text)
+        current, current_tokens = [], 0
+        repeated = 0  # Sentences of `current` overlapping the previous chunk
+        for piece in pieces:
+            tokens = piece[2]
+            # +1 accounts for the joining space merging into the next token
+            if len(current) > repeated and current_tokens + tokens + 1 > self.max_tokens:
+                chunks.append(current[0][0], current[-1][1], sum(t for _, _, t in current))
+                current = self._overlap(current)
+                current_tokens = sum(t + 1 for _, _, t in current)
+                repeated = len(current)
+            if current and current_tokens + tokens + 1 > self.max_tokens:
+                current, current_tokens = [], 0
+            repeated = min(repeated, len(current))
+            current.append(piece)
+            current_tokens += tokens + 1
+            if self.content_defined and current_tokens >= self.min_tokens and _is_anchor(text, piece):
+                chunks.append(current[0][0], current[-1][1], sum(t for _, _, t in current))
+                current = self._overlap(current)
+                current_tokens = sum(t + 1 for _, _, t in current)
+                repeated = len(current)
+
+        if len(current) > repeated:
+            chunks.append(current[0][0], current[-1][1], sum(t for _, _, t in current))
+        return chunks
+
+    def _overlap(self, sentences: list) -> list:
+        """Returns the trailing sentences that fit into the overlap budget."""
+        kept, kept_tokens = [], 0
+        for sentence in reversed(sentences):
+            if kept_tokens + sentence[2] > self.overlap_tokens:
+                break
+            kept.insert(0, sentence)
+            kept_tokens += sentence[2] + 1
+        return kept
+
+    def _split_long_sentence(self, text: str, start: int, end: int) -> list:
+        pieces = []
+        first, last, current_tokens = None, None, 0
+        for word in WORD.finditer(text, start, end):
+            tokens = max(self.count_tokens(" " + word.group()), 1)
+            if first is not None and current_tokens + tokens > self.max_tokens:
+                pieces.append((first, last, current_tokens))
+                first, current_tokens = None, 0
+            if first is None:
+                first = word.start()
+            last = word.end()
+            current_tokens += tokens
+        if first is not None:
+            pieces.append((first, last, current_tokens))
+        return pieces
+
+
+def _is_anchor(text: str, piece: tuple) -> bool:
+    # crc32 rather than hash(), which differs between processes
+    return zlib.crc32(text[piece[0]:piece[1]].encode("utf-8")) % ANCHOR_EVERY == 0
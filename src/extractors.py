@@ -0,0 +1,175 @@
+# extractors.py
+import re
+from dataclasses import dataclass
+from urllib.parse import urljoin
+
+from lxml import etree
+
+# Elements that never hold the article text
+BOILERPLATE_TAGS = {"script", "style", "noscript", "nav", "footer", "aside", "header", "form", "iframe", "svg", "button", "template"}
+PARAGRAPH_TAGS = {"p", "pre", "blockquote"}
+IMAGE_META = ("og:image", "og:image:url", "og:image:secure_url", "twitter:image", "twitter:image:src")
+
+POSITIVE_HINTS = re.compile(r"article|body|content|entry|main|page|post|story|text", re.IGNORECASE)
+NEGATIVE_HINTS = re.compile(
+    r"ad-|advert|banner|comment|cookie|footer|menu|meta|nav|popup|promo|related|share|sidebar|social|sponsor|subscribe|widget",
+    re.IGNORECASE,
+)
+WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass
+class ExtractedArticle:
+    title: str = None
+    text: str = None
+    image_url: str = None
+
+
+class ArticleExtractor:
+    """
+    Extracts the main text and preview image of an HTML page.
+    The page is parsed incrementally with lxml while it downloads (`feed`), boilerplate
+    subtrees are dropped as soon as they are parsed and paragraphs are scored readability-style:
+    every paragraph adds points to its parent (and half to its grandparent) and the highest
+    scoring container is taken as the article body.
+    """
+
+    def __init__(self, base_url: str, encoding: str = None):
+        """
+        Initializes the extractor.
+
+        Args:
+            base_url (str): The URL of the page, used to resolve relative image URLs.
+            encoding (str, optional): The charset from the Content-Type header, detected from the page otherwise.
+        """
+        self.base_url = base_url
+        self._parser = etree.HTMLPullParser(events=("start", "end"), encoding=encoding, remove_comments=True)
+        self._title = None
+        self._meta_image = None
+        self._images = []  # (element, src) in document order
+        self._paragraphs = []  # (element, text) in document order
+        self._scores = {}
+        self._boilerplate_depth = 0
+        self._pending = b""
+
+    def feed(self, data: bytes):
+        """Parses the next part of the page."""
+        # libxml2's push parser can lose the rest of the document when a chunk ends
+        # inside a <script>, so only hand it data that ends right after a tag.
+        data = self._pending + data
+        cut = data.rfind(b">") + 1
+        self._pending = data[cut:]
+        if cut:
+            self._parser.feed(data[:cut])
+            self._read_events()
+
+    def close(self) -> ExtractedArticle:
+        """
+        Finishes parsing.
+
+        Returns:
+            ExtractedArticle: The title, main text and preview image URL of the page.
+        """
+        try:
+            if self._pending:
+                self._parser.feed(self._pending)
+            self._parser.close()
+        except etree.XMLSyntaxError:
+            pass  # Empty or truncated document, use what was parsed
+        self._read_events()
+
+        return ExtractedArticle(title=self._title, text=self._main_text(), image_url=self._image_url())
+
+    def _read_events(self):
+        for event, element in self._parser.read_events():
+            tag = element.tag if isinstance(element.tag, str) else None
+            if tag is None:
+                continue
+            if event == "start":
+                if tag in BOILERPLATE_TAGS:
+                    self._boilerplate_depth += 1
+                elif tag == "meta":
+                    self._read_meta(element)
+                elif tag == "base" and element.get("href"):
+                    self.base_url = urljoin(self.base_url, element.get("href"))
+                continue
+
+            if tag in BOILERPLATE_TAGS:
+                self._boilerplate_depth -= 1
+                element.clear(keep_tail=True)  # Free the subtree right away
+            elif self._boilerplate_depth:
+                continue
+            elif tag == "title" and self._title is None:
+                self._title = _text(element) or None
+            elif tag in PARAGRAPH_TAGS:
+                self._add_paragraph(element)
+            elif tag == "img" and (element.get("src") or element.get("data-src")):
+                self._images.append((element, element.get("src") or element.get("data-src")))
+
+    def _read_meta(self, element):
+        name = element.get("property") or element.get("name") or ""
+        if self._meta_image is None and name.lower() in IMAGE_META and element.get("content"):
+            self._meta_image = element.get("content")
+
+    def _add_paragraph(self, element):
+        if any(child.tag in PARAGRAPH_TAGS for child in element.iterdescendants()):
+            return  # e.g. a blockquote made of paragraphs, they were already counted
+        text = _text(element)
+        if not text:
+            return
+        self._paragraphs.append((element, text))
+
+        score = 1 + text.count(",") + min(len(text) // 100, 3)
+        parent = element.getparent()
+        if parent is not None:
+            self._add_score(parent, score)
+            grandparent = parent.getparent()
+            if grandparent is not None:
+                self._add_score(grandparent, score / 2)
+
+    def _add_score(self, element, score):
+        if element not in self._scores:
+            hints = f"{element.get('class', '')} {element.get('id', '')}"
+            bonus = 0
+            if POSITIVE_HINTS.search(hints) or element.tag in ("article", "main"):
+                bonus += 25
+            if NEGATIVE_HINTS.search(hints):
+                bonus -= 25
+            self._scores[element] = bonus
+        self._scores[element] += score
+
+    def _best_candidate(self):
+        return max(self._scores, key=self._scores.get) if self._scores else None
+
+    def _main_text(self) -> str:
+        best = self._best_candidate()
+        paragraphs = [text for element, text in self._paragraphs if best is None or _is_inside(element, best)]
+        return "\n".join(paragraphs)
+
+    def _image_url(self):
+        image_url = self._meta_image
+        if image_url is None and self._images:
+            # Prefer a picture from the article body over logos and banners elsewhere on the page
+            best = self._best_candidate()
+            inside = [src for element, src in self._images if best is not None and _is_inside(element, best)]
+            image_url = inside[0] if inside else self._images[0][1]
+        return urljoin(self.base_url, image_url.strip()) if image_url else None
+
+
+def extract_article(html: bytes, base_url: str) -> ExtractedArticle:
+    """Extracts the article from a complete page."""
+    extractor = ArticleExtractor(base_url)
+    extractor.feed(html)
+    return extractor.close()
+
+
+def _text(element) -> str:
+    return WHITESPACE.sub(" ", "".join(element.itertext())).strip()
+
+
+def _is_inside(element, container) -> bool:
+    while element is not None:
+        if element is container:
+            return True
+        element = element.getparent()
+    return False
@@ -2,18 +2,60 @@
 from urllib.parse import urlparse
 
 from sources import Source, YouTubeSource, ArticleSource
+from urls import YOUTUBE_HOSTS
 
 
 class SourceFactory:
-    @staticmethod
-    def create_source(source_string: str) -> Source:
+    """
+    Creates the Source of a URL from a registry of source types.
+    Hosts are looked up in a dict built at registration, so dispatch does not depend on the number of
+    source types; URLs on other hosts go to the fallback source of their scheme (articles for http/https).
+    """
+
+    _hosts = {}  # host -> Source class
+    _schemes = {}  # scheme -> fallback Source class
+
+    @classmethod
+    def register(cls, source_class, hosts=(), schemes=()):
+        """
+        Registers a source type.
+
+        Args:
+            source_class (type): A Source subclass, built with the URL.
+            hosts (iterable): Hosts whose URLs the source handles; `Source.accepts` can narrow them down.
+            schemes (iterable): URL schemes the source handles when no host matches.
+        """
+        for host in hosts:
+            cls._hosts[host.lower()] = source_class
+        for scheme in schemes:
+            cls._schemes[scheme] = source_class
+        return source_class
+
+    @classmethod
+    def create_source(cls, source_string: str) -> Source:
+        """
+        Returns the source of a URL.
+
+        Raises:
+            ValueError: If no registered source handles the URL.
+        """
+        source_string = source_string.strip()
         try:
             parsed_url = urlparse(source_string)
-            if parsed_url.netloc == "www.youtube.com" or parsed_url.netloc == "youtu.be":
-                return YouTubeSource(source_string)
-            elif parsed_url.scheme in ("http", "https"):
-                return ArticleSource(source_string)
-            else:
-                raise ValueError("Not supported source.")
-        except Exception as e:
+        except ValueError as e:
             raise ValueError(f"Cannot determine source type {e}")
+        host = (parsed_url.hostname or "").lower()
+        source_class = cls._hosts.get(host)
+        if source_class is not None:
+            # e.g. a channel page on a video host: rejected here instead of failing to fetch
+            if not source_class.accepts(source_string):
+                raise ValueError(f"Not supported link: {source_string}")
+            return source_class(source_string)
+        source_class = cls._schemes.get(parsed_url.scheme)
+        if source_class is None or not host:
+            raise ValueError("Cannot determine source type Not supported source.")
+        return source_class(source_string)
+
+
+SourceFactory.register(YouTubeSource, hosts=YOUTUBE_HOSTS)
+SourceFactory.register(ArticleSource, schemes=("http", "https"))
@@ -1,18 +1,35 @@
 # youtube_summarizer_bot/handlers.py
 
-import io
+import asyncio
+import json
+import time
+import uuid
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
 
 import requests
+from aiohttp import web
 from telegram import Update
+from telegram.error import TelegramError
 from telegram.ext import CallbackContext, CommandHandler, MessageHandler, filters, ApplicationBuilder
 
-from factories import SourceFactory  # Relative import
+from images import photo_sender
+from jobs import JobQueue, QueueFullError
 from logger import setup_logger
-from processors import TextProcessor
+from metrics import Trace, activate, record, stage
+from services import SummaryService
+from urls import extract_urls
 
 logger = setup_logger(__name__)
 
+MESSAGE_MAX_LENGTH = 4096
+PROGRESS_EDIT_INTERVAL = 2  # seconds, Telegram limits how often a message can be edited
+MAX_LINKS_PER_MESSAGE = 5  # More than the queue accepts per chat would be rejected anyway
+API_MAX_BATCH_URLS = 100
+API_JOB_TTL = 60 * 60  # seconds a finished job can be polled
+API_MAX_JOBS = 10000  # finished jobs kept for polling
+
 
 class BaseHandler(ABC):  # Keep the abstract base class
     """
@@ -26,17 +43,75 @@ class BaseHandler(ABC):  # Keep the abstract base class
         pass
 
 
+class ProgressMessage:
+    """Edits a status message with the chunk summaries produced so far, at most once per interval."""
+
+    def __init__(self, bot, message, interval=PROGRESS_EDIT_INTERVAL):
+        self.bot = bot
+        self.message = message
+        self.interval = interval
+        self._summaries = {}  # Chunk index -> summary of the first level
+        self._progress = None
+        self._last_edit = 0
+        self._editing = False
+
+    def update(self, progress):
+        """Records a SummaryProgress and schedules an edit of the status message."""
+        if progress.level == 1:
+            self._summaries[progress.index] = progress.summary
+        self._progress = progress
+        if self.message is None or progress.total == 1:
+            return  # Nothing to edit yet, or the next message is the final summary anyway
+        if self._editing or time.monotonic() - self._last_edit < self.interval:
+            return
+        self._editing = True
+        asyncio.ensure_future(self._edit())
+
+    def text(self) -> str:
+        progress = self._progress
+        header = f"Summarizing... {progress.done}/{progress.total}"
+        if progress.level > 1:
+            header += f" (combining summaries, pass {progress.level})"
+        body = "\n\n".join(self._summaries[index] for index in sorted(self._summaries))
+        room = MESSAGE_MAX_LENGTH - len(header) - 3
+        if len(body) > room:
+            body = "…" + body[-(room - 1):]
+        return f"{header}\n\n{body}"
+
+    async def _edit(self):
+        try:
+            await self.bot.edit_message_text(
+                chat_id=self.message.chat_id, message_id=self.message.message_id, text=self.text()
+            )
+        except TelegramError as e:
+            logger.warning(f"Cannot update progress message: {e}")
+        finally:
+            self._last_edit = time.monotonic()
+            self._editing = False
+
+
 class TelegramHandler(BaseHandler):
     """Handles requests from Telegram."""
 
-    def __init__(self, bot_token):
+    def __init__(self, bot_token, service=None, jobs=None, on_ready=None, base_url=None):
         """
         Initializes the Telegram handler.
 
         Args:
             bot_token (str): The Telegram bot token.
+            service (SummaryService, optional): The pipeline shared by all messages. Defaults to SummaryService.
+            jobs (JobQueue, optional): The queue requests wait in. Defaults to JobQueue.
+            on_ready (callable, optional): Coroutine function called once the bot is initialized, right before polling starts.
+            base_url (str, optional): The Bot API URL the token is appended to, for a local Bot API server.
         """
-        self.application = ApplicationBuilder().token(bot_token).build()
+        self.service = service or SummaryService()
+        self.jobs = jobs or JobQueue()
+        self.on_ready = on_ready
+        # Updates are handled concurrently, the service limits how many jobs actually run
+        builder = ApplicationBuilder().token(bot_token).concurrent_updates(True).post_init(self._post_init)
+        if base_url:
+            builder = builder.base_url(base_url)
+        self.application = builder.build()
         self.bot = self.application.bot
 
         self.application.add_handler(CommandHandler('start', self.start))
@@ -47,55 +122,340 @@ class TelegramHandler(BaseHandler):
         logger.info("Starting polling...")
         self.application.run_polling()
 
-    def start(self, update: Update, context: CallbackContext):
+    async def _post_init(self, application):
+        if self.on_ready is not None:
+            await self.on_ready()
+
+    async def start(self, update: Update, context: CallbackContext):
         """Handles the /start command."""
         logger.info("Start command received")
-        self.bot.send_message(chat_id=update.effective_chat.id, text="Send me a link and I'll summarize it!")
+        await self.bot.send_message(chat_id=update.effective_chat.id, text="Send me a link and I'll summarize it!")
 
-    def handle_message(self, update: Update, context: CallbackContext):
-        """Handles text messages (presumably URLs)."""
-        source_string = update.message.text
+    async def handle_message(self, update: Update, context: CallbackContext):
+        """Handles text messages: every link of the message is summarized, concurrently."""
         chat_id = update.effective_chat.id
-        self.bot.send_message(chat_id=chat_id, text="Processing request...")
+        # A message without links is passed on as is, to be answered with the reason it is not supported
+        source_strings = extract_urls(update.message.text)[:MAX_LINKS_PER_MESSAGE] or [update.message.text]
 
-        try:
-            source = SourceFactory.create_source(source_string)
-            content = source.get_content()
-            if content.error_message:
-                logger.error(content.error_message)
-                self.bot.send_message(chat_id=chat_id, text=content.error_message)
+        async def handle(source_string):
+            trace = Trace(kind="telegram", source_url=source_string)
+            with activate(trace):
+                await self._handle_message(chat_id, source_string, trace)
+            logger.info(f"Trace {trace.to_json()}")
+
+        await asyncio.gather(*(handle(source_string) for source_string in source_strings))
+
+    async def _handle_message(self, chat_id, source_string: str, trace: Trace):
+        # Partial summaries are shown by editing the status message until the final one is sent
+        progress = ProgressMessage(self.bot, None)
+
+        async def summarize():
+            # Jobs run in the tasks of the queue workers, the trace is activated again there
+            with activate(trace):
+                record("queue_wait", time.monotonic() - submitted_at)
+                return await self.service.summarize(source_string, on_progress=progress.update)
+
+        submitted_at = time.monotonic()
+        # The same URL being summarized for another chat is awaited directly, a waiting duplicate
+        # must not hold a worker of the queue (or a place in it) for a viral link
+        position, job = 0, self.service.join(source_string)
+        if job is None:
+            try:
+                position, job = self.jobs.submit(chat_id, summarize)
+            except QueueFullError as e:
+                logger.warning(f"Request of chat {chat_id} rejected: {e}")
+                await self.bot.send_message(chat_id=chat_id, text=str(e))
                 return
+            self.service.track(source_string, job)
+
+        if position:
+            status = await self.bot.send_message(chat_id=chat_id, text=f"You are #{position} in queue, processing will start soon...")
+        else:
+            status = await self.bot.send_message(chat_id=chat_id, text="Processing request...")
+        progress.message = status
 
-            processor = TextProcessor()
-            result = processor.process(content)
+        try:
+            content, result = await job
 
             if result.error_message:
                 logger.error(result.error_message)
-                self.bot.send_message(chat_id=chat_id, text=result.error_message)
+                await self.bot.send_message(chat_id=chat_id, text=result.error_message)
                 return
 
             # Send image and text
             if content.image_url:
                 try:
-                    response = requests.get(content.image_url)
-                    response.raise_for_status()
-                    image_file = io.BytesIO(response.content)
-                    self.bot.send_photo(chat_id=chat_id, photo=image_file, caption=result.summary)
+                    await photo_sender.send(self.bot, chat_id, content.image_url, caption=result.summary)
 
                 except requests.exceptions.RequestException as e:
                     logger.error(f"Error downloading image: {e}")
-                    self.bot.send_message(chat_id=chat_id, text=f"Error downloading image: {e}")
-                    self.bot.send_message(chat_id=chat_id, text=result.summary)  # Send text only
+                    await self.bot.send_message(chat_id=chat_id, text=f"Error downloading image: {e}")
+                    await self.bot.send_message(chat_id=chat_id, text=result.summary)  # Send text only
                 except Exception as e:
                     logger.exception(f"Unexpected error with image: {e}")
-                    self.bot.send_message(chat_id=chat_id, text=result.summary)
+                    await self.bot.send_message(chat_id=chat_id, text=result.summary)
             else:
-                self.bot.send_message(chat_id=chat_id, text=result.summary)
+                with stage("upload"):
+                    await self.bot.send_message(chat_id=chat_id, text=result.summary)
+
+            if result.chapters and len(result.chapters) > 1:
+                with stage("upload"):
+                    for text in format_chapters(result.chapters):
+                        await self.bot.send_message(chat_id=chat_id, text=text)
 
         except ValueError as e:
             logger.error(str(e))
-            self.bot.send_message(chat_id=chat_id, text=str(e))
+            await self.bot.send_message(chat_id=chat_id, text=str(e))
 
         except Exception as e:
             logger.exception(f"An unexpected error occurred: {e}")
-            self.bot.send_message(chat_id=chat_id, text=f"An unexpected error occurred: {e}")
+            await self.bot.send_message(chat_id=chat_id, text=f"An unexpected error occurred: {e}")
+
+
+@dataclass
+class ApiJob:
+    """A URL submitted to the REST API, polled with GET /jobs/{job_id}."""
+    url: str = None
+    job_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "queued"  # queued, running, done or error
+    position: int = 0
+    progress: object = None  # The last SummaryProgress
+    response: dict = None  # The result or error, once finished
+    http_status: int = 200  # Of the response to a synchronous request
+    future: asyncio.Future = None
+    finished_at: float = None
+
+    def to_json(self) -> dict:
+        data = {"job_id": self.job_id, "url": self.url, "status": self.status}
+        if self.status == "queued":
+            data["position"] = self.position
+        if self.status == "running" and self.progress is not None:
+            data["progress"] = {"level": self.progress.level, "done": self.progress.done, "total": self.progress.total}
+        if self.response is not None:
+            data.update(self.response)
+        return data
+
+
+class ApiHandler(BaseHandler):
+    """
+    Handles requests to the local REST API:
+
+    * POST /summarize with {"url": ...} returns the summary, source type, source URL and image URL,
+      and the summary of every chapter of a video; with {"urls": [...]} the URLs are summarized concurrently
+      and returned in order. With "async": true the request returns right away with job IDs to poll.
+      With "chapter": N only that chapter of a video is summarized.
+    * GET /jobs/{job_id} returns the status (and result) of a job.
+    * GET /health
+
+    Requests go through the same SummaryService and JobQueue as Telegram, so they share the models,
+    caches and limits. Every client (X-Client-Id header, else the remote address) is a separate
+    "chat" of the queue, so a client sending large batches does not starve the others.
+    """
+
+    def __init__(self, service=None, jobs=None, host="127.0.0.1", port=8080,
+                 max_batch_urls=API_MAX_BATCH_URLS, job_ttl=API_JOB_TTL, max_jobs=API_MAX_JOBS, on_ready=None):
+        """
+        Initializes the API handler.
+
+        Args:
+            service (SummaryService, optional): The pipeline shared with the other handlers. Defaults to SummaryService.
+            jobs (JobQueue, optional): The queue requests wait in. Defaults to JobQueue.
+            host (str): The address to listen on.
+            port (int): The port to listen on, 0 picks a free one.
+            max_batch_urls (int): The maximum number of URLs of one request.
+            job_ttl (float): Seconds a finished job stays available for polling.
+            max_jobs (int): The maximum number of finished jobs kept for polling.
+            on_ready (callable, optional): Coroutine function called once the server listens.
+        """
+        self.service = service or SummaryService()
+        self.jobs = jobs or JobQueue()
+        self.host = host
+        self.port = port
+        self.max_batch_urls = max_batch_urls
+        self.job_ttl = job_ttl
+        self.max_jobs = max_jobs
+        self.on_ready = on_ready
+        self._jobs = OrderedDict()  # job ID -> ApiJob, in submission order
+        self._runner = None
+
+        self.application = web.Application()
+        self.application.add_routes([
+            web.post("/summarize", self.summarize),
+            web.get("/jobs/{job_id}", self.get_job),
+            web.get("/health", self.health),
+        ])
+
+    def run(self):
+        """Starts the API server and blocks (use `start` to run it in an existing event loop)."""
+        async def serve():
+            await self.start()
+            try:
+                await asyncio.Event().wait()
+            finally:
+                await self.stop()
+
+        asyncio.run(serve())
+
+    async def start(self):
+        """Starts listening in the running event loop, e.g. next to the Telegram handler."""
+        self._runner = web.AppRunner(self.application, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        logger.info(f"Serving the REST API on {self.host}:{self.port}")
+        if self.on_ready is not None:
+            await self.on_ready()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def summarize(self, request: web.Request) -> web.Response:
+        """Handles POST /summarize."""
+        try:
+            payload = await request.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return _error(400, "The body must be a JSON object.")
+        if not isinstance(payload, dict):
+            return _error(400, "The body must be a JSON object.")
+
+        urls = payload.get("urls")
+        batch = urls is not None
+        if not batch:
+            urls = [payload.get("url")]
+        if not isinstance(urls, list) or not urls or not all(isinstance(url, str) and url for url in urls):
+            return _error(400, 'Expected "url" or a non-empty list of "urls".')
+        if len(urls) > self.max_batch_urls:
+            return _error(400, f"At most {self.max_batch_urls} URLs per request.")
+        chapter = payload.get("chapter")
+        if chapter is not None and (not isinstance(chapter, int) or isinstance(chapter, bool) or chapter < 0):
+            return _error(400, '"chapter" must be a chapter index.')
+
+        client = request.headers.get("X-Client-Id") or request.remote
+        self._prune()
+        jobs = []
+        # A batch may fill the queue up to its size, it is still served round-robin with the other clients
+        max_waiting = max(self.jobs.max_per_chat, len(urls)) if batch else None
+        for url in urls:
+            try:
+                jobs.append(self._submit(client, url, chapter, max_waiting))
+            except QueueFullError as e:
+                if not batch:
+                    return _error(503, str(e))
+                jobs.append(ApiJob(url=url, status="error", response={"error": str(e)}))
+
+        if payload.get("async"):
+            if batch:
+                return web.json_response({"jobs": [job.to_json() for job in jobs]}, status=202)
+            return web.json_response(jobs[0].to_json(), status=202)
+
+        # `_finish` was registered first, so it has run when the wait returns
+        pending = [job.future for job in jobs if job.future is not None]
+        if pending:  # None if the queue rejected every URL of a batch
+            await asyncio.wait(pending)
+        if batch:
+            return web.json_response({"results": [job.to_json() for job in jobs]})
+        return web.json_response(jobs[0].to_json(), status=jobs[0].http_status)
+
+    async def get_job(self, request: web.Request) -> web.Response:
+        """Handles GET /jobs/{job_id}."""
+        self._prune()
+        job = self._jobs.get(request.match_info["job_id"])
+        if job is None:
+            return _error(404, "Unknown or expired job.")
+        return web.json_response(job.to_json())
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", "queued": self.jobs.size(), "busy_workers": self.jobs.busy_workers()})
+
+    def _submit(self, client: str, url: str, chapter=None, max_waiting=None) -> ApiJob:
+        job = ApiJob(url=url)
+        trace = Trace(kind="api", source_url=url)
+        submitted_at = time.monotonic()
+
+        def on_progress(progress):
+            job.progress = progress
+
+        async def summarize():
+            with activate(trace):
+                record("queue_wait", time.monotonic() - submitted_at)
+                job.status = "running"
+                return await self.service.summarize(url, on_progress=on_progress, chapter=chapter)
+
+        joined = self.service.join(url, chapter)  # An identical request in progress, see TelegramHandler
+        if joined is not None:
+            job.position, job.future = 0, joined
+        else:
+            job.position, job.future = self.jobs.submit(f"api:{client}", summarize, max_waiting)
+            self.service.track(url, job.future, chapter)
+        job.future.add_done_callback(lambda future: self._finish(job, future, trace))
+        self._jobs[job.job_id] = job
+        return job
+
+    def _finish(self, job: ApiJob, future: asyncio.Future, trace: Trace):
+        job.finished_at = time.monotonic()
+        job.status = "error"
+        if future.cancelled():
+            job.response, job.http_status = {"error": "The job was cancelled."}, 500
+        elif isinstance(future.exception(), ValueError):
+            job.response, job.http_status = {"error": str(future.exception())}, 400  # Unsupported URL
+        elif future.exception() is not None:
+            logger.error(f"Job {job.job_id} failed: {future.exception()}")
+            job.response, job.http_status = {"error": f"An unexpected error occurred: {future.exception()}"}, 500
+        else:
+            content, result = future.result()
+            if result.error_message:
+                job.response, job.http_status = {"error": result.error_message}, 422
+            else:
+                job.status = "done"
+                job.response = {
+                    "summary": result.summary,
+                    "source_type": content.source_type,
+                    "source_url": content.source_url,
+                    "image_url": content.image_url,
+                    "language": result.language,
+                    "model": result.model,
+                }
+                if result.chapters:
+                    job.response["chapters"] = [asdict(chapter) for chapter in result.chapters]
+        job.future = None  # Do not keep the content alive
+        logger.info(f"Trace {trace.to_json()}")
+
+    def _prune(self):
+        """Drops finished jobs older than `job_ttl`, and the oldest finished ones above `max_jobs`."""
+        now = time.monotonic()
+        finished = [job for job in self._jobs.values() if job.finished_at is not None]
+        excess = len(finished) - self.max_jobs
+        for job in finished:
+            if excess > 0 or now - job.finished_at > self.job_ttl:
+                del self._jobs[job.job_id]
+                excess -= 1
+
+
+def format_timestamp(seconds: float) -> str:
+    """Formats seconds as YouTube does, e.g. 4:05 or 1:02:03."""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+def format_chapters(chapters: list) -> list:
+    """Returns the chapter summaries as Telegram messages, split between chapters to fit the message length."""
+    messages, current = [], ""
+    for chapter in chapters:
+        # Time windows of videos without chapters have no title
+        heading = chapter.title or f"- {format_timestamp(chapter.end)}"
+        text = f"{format_timestamp(chapter.start)} {heading}\n{chapter.summary}"[:MESSAGE_MAX_LENGTH]
+        if current and len(current) + 2 + len(text) > MESSAGE_MAX_LENGTH:
+            messages.append(current)
+            current = ""
+        current = f"{current}\n\n{text}" if current else text
+    if current:
+        messages.append(current)
+    return messages
+
+
+def _error(status: int, message: str) -> web.Response:
+    return web.json_response({"error": message}, status=status)
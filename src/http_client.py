@@ -0,0 +1,200 @@
+# http_client.py
+import codecs
+import time
+from dataclasses import dataclass, replace
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.exceptions import DecodeError, ProtocolError, ReadTimeoutError, SSLError
+from urllib3.util.retry import Retry
+
+from cache import LRUCache
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_MAX_BYTES = 10 * 2 ** 20
+CHUNK_SIZE = 64 * 1024
+USER_AGENT = "Mozilla/5.0 (compatible; youtube-summarizer-bot)"
+
+
+class ResponseTooLarge(requests.exceptions.RequestException):
+    """Raised when a response body is larger than the allowed number of bytes."""
+
+
+class DownloadTimeout(requests.exceptions.Timeout):
+    """Raised when a response body is not fully downloaded within the download timeout."""
+
+
+@dataclass
+class HttpResponse:
+    url: str = None
+    status_code: int = None
+    headers: dict = None
+    content: bytes = None
+    encoding: str = None  # The charset of the Content-Type header, None if it has none
+    from_cache: bool = False  # The server answered 304 Not Modified and the stored body was reused
+
+
+class HttpClient:
+    """
+    Shared HTTP client for all sources: pooled keep-alive connections, connect/read timeouts,
+    retries with backoff, streamed downloads with a size limit and conditional requests.
+    """
+
+    def __init__(self, connect_timeout=5, read_timeout=20, download_timeout=60, max_bytes=DEFAULT_MAX_BYTES,
+                 retries=3, backoff_factor=0.5, pool_size=20, conditional_cache_entries=256):
+        """
+        Initializes the client.
+
+        Args:
+            connect_timeout (float): Seconds to wait for the connection.
+            read_timeout (float): Seconds to wait between bytes of the response.
+            download_timeout (float): Seconds the whole body may take, so that a server sending
+                a byte now and then cannot hold a worker for hours.
+            max_bytes (int): Default limit of the response body size.
+            retries (int): How many times connection errors and 429/5xx responses are retried.
+            backoff_factor (float): Base of the exponential sleep between retries.
+            pool_size (int): Connections kept alive per host.
+            conditional_cache_entries (int): How many responses with ETag/Last-Modified are kept for revalidation.
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.download_timeout = download_timeout
+        self.max_bytes = max_bytes
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET", "HEAD"),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._validated = LRUCache(max_entries=conditional_cache_entries)
+
+    def get(self, url: str, max_bytes: int = None, conditional: bool = False, consumer=None,
+            on_headers=None) -> HttpResponse:
+        """
+        Downloads the URL.
+
+        Args:
+            url (str): The URL to download.
+            max_bytes (int, optional): Limit of the body size, defaults to the client limit.
+            conditional (bool): Revalidate a stored response with If-None-Match/If-Modified-Since
+                and reuse its body when the server answers 304 Not Modified.
+            consumer (callable, optional): Called with every chunk of the body as it arrives,
+                so that it can be parsed while downloading.
+            on_headers (callable, optional): Called with the HttpResponse, without its content,
+                before the first chunk is passed to `consumer`.
+
+        Returns:
+            HttpResponse: The downloaded response.
+
+        Raises:
+            requests.exceptions.RequestException: On network errors, HTTP error statuses, too large bodies
+                and bodies downloading for longer than the download timeout.
+        """
+        max_bytes = max_bytes or self.max_bytes
+        headers = {}
+        stored = self._validated.get(url) if conditional else None
+        if stored is not None:
+            if stored.headers.get("ETag"):
+                headers["If-None-Match"] = stored.headers["ETag"]
+            if stored.headers.get("Last-Modified"):
+                headers["If-Modified-Since"] = stored.headers["Last-Modified"]
+
+        deadline = time.monotonic() + self.download_timeout
+        with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+            if response.status_code == 304 and stored is not None:
+                logger.info(f"Not modified: {url}")
+                if on_headers is not None:
+                    on_headers(replace(stored, content=None, from_cache=True))
+                if consumer is not None:
+                    consumer(stored.content)
+                return replace(stored, from_cache=True)
+            response.raise_for_status()
+
+            content_length = response.headers.get("Content-Length")
+            if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+                raise ResponseTooLarge(f"Response is larger than {max_bytes} bytes: {url}")
+
+            result = HttpResponse(
+                url=response.url,
+                status_code=response.status_code,
+                headers=CaseInsensitiveDict(response.headers),
+                encoding=header_charset(response.headers),
+            )
+            if on_headers is not None:
+                on_headers(result)
+
+            body = bytearray()
+            for chunk in _iter_body(response):
+                if time.monotonic() > deadline:
+                    raise DownloadTimeout(f"Response took longer than {self.download_timeout}s: {url}")
+                body += chunk
+                if len(body) > max_bytes:
+                    raise ResponseTooLarge(f"Response is larger than {max_bytes} bytes: {url}")
+                if consumer is not None:
+                    consumer(chunk)
+
+            result = replace(result, content=bytes(body))
+
+        if conditional and ("ETag" in result.headers or "Last-Modified" in result.headers):
+            self._validated.set(url, result)
+        return result
+
+    def close(self):
+        self.session.close()
+
+
+def header_charset(headers) -> str:
+    """
+    Returns the charset parameter of the Content-Type header, None if there is none or it is unknown.
+    Unlike requests, text/* without a charset is not assumed to be ISO-8859-1: the page may declare its own.
+    """
+    for parameter in headers.get("Content-Type", "").split(";")[1:]:
+        name, _, value = parameter.partition("=")
+        if name.strip().lower() != "charset":
+            continue
+        value = value.strip().strip("\"'")
+        try:
+            return value if value and codecs.lookup(value) else None
+        except LookupError:
+            return None
+    return None
+
+
+def _iter_body(response: requests.Response):
+    """
+    Yields the body as it arrives. iter_content waits for a whole chunk before yielding it,
+    a trickling server would never let the caller check its deadline.
+    """
+    raw = response.raw
+    if not hasattr(raw, "read1"):  # urllib3 < 2.3
+        yield from response.iter_content(CHUNK_SIZE)
+        return
+    while True:
+        # The errors are translated as iter_content does
+        try:
+            chunk = raw.read1(CHUNK_SIZE, decode_content=True)
+        except ProtocolError as e:
+            raise requests.exceptions.ChunkedEncodingError(e)
+        except DecodeError as e:
+            raise requests.exceptions.ContentDecodingError(e)
+        except ReadTimeoutError as e:
+            raise requests.exceptions.ConnectionError(e)
+        except SSLError as e:
+            raise requests.exceptions.SSLError(e)
+        if not chunk:
+            return
+        yield chunk
+
+
+# Shared by all sources and handlers so that connections are reused.
+http_client = HttpClient()
@@ -0,0 +1,159 @@
+# images.py
+import asyncio
+import io
+
+from telegram.error import BadRequest, TelegramError
+
+from cache import LRUCache
+from http_client import http_client
+from logger import setup_logger
+from metrics import count, stage
+from singleflight import SingleFlight
+
+logger = setup_logger(__name__)
+
+IMAGE_MAX_BYTES = 10 * 2 ** 20  # Telegram does not accept larger photos
+MAX_SIDE = 1280  # Telegram shows photos at most this large, larger ones are only uploaded to be scaled down
+MAX_UPLOAD_BYTES = 512 * 1024  # Smaller images that fit MAX_SIDE are uploaded as they are
+JPEG_QUALITY = 85
+FILE_ID_ENTRIES = 10000
+
+
+def fit_image(data: bytes, max_side=MAX_SIDE, max_bytes=MAX_UPLOAD_BYTES, quality=JPEG_QUALITY) -> bytes:
+    """
+    Downscales an image to `max_side` and re-encodes it as JPEG, if it is larger than `max_side` or `max_bytes`.
+
+    Args:
+        data (bytes): The downloaded image.
+
+    Returns:
+        bytes: The smaller of the original and the re-encoded image. The original if it already fits,
+            cannot be decoded, or Pillow is not installed.
+    """
+    try:
+        from PIL import Image  # Optional, images are uploaded as downloaded without it
+    except ImportError:
+        return data
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:  # Only reads the header
+            if max(image.size) <= max_side and len(data) <= max_bytes:
+                return data
+            image.draft("RGB", (max_side, max_side))  # JPEG is decoded at a reduced scale right away
+            image.thumbnail((max_side, max_side))
+            if image.mode != "RGB":
+                # Transparent areas become white rather than black
+                rgba = image.convert("RGBA")
+                image = Image.new("RGB", rgba.size, "white")
+                image.paste(rgba, mask=rgba.getchannel("A"))
+            output = io.BytesIO()
+            image.save(output, "JPEG", quality=quality, optimize=True, progressive=True)
+    except Exception as e:  # Truncated or unknown formats, decompression bombs
+        logger.warning(f"Cannot re-encode the image: {e}")
+        return data
+
+    resized = output.getvalue()
+    return resized if len(resized) < len(data) else data
+
+
+def is_file_id_error(error: BadRequest) -> bool:
+    """Tells whether Telegram rejected the file_id itself, e.g. "Wrong file identifier/http url specified"."""
+    message = str(error).lower()
+    return "file identifier" in message or "file_id" in message
+
+
+class PhotoSender:
+    """
+    Sends images as Telegram photos. Telegram returns a file_id for every uploaded photo, which is
+    remembered per image URL: sending the same image again (e.g. the thumbnail of a video asked for
+    by many users) uploads nothing. The first send of an image is coalesced: one caller downloads it
+    with a size limit, shrinks it if it is oversized and uploads it, the callers arriving meanwhile
+    wait for its file_id.
+    """
+
+    def __init__(self, client=None, file_ids=None, max_bytes=IMAGE_MAX_BYTES, max_side=MAX_SIDE):
+        """
+        Initializes the sender.
+
+        Args:
+            client (HttpClient, optional): Downloads the images. Defaults to the shared client.
+            file_ids (LRUCache, optional): Telegram file_id by image URL. Defaults to an in-memory LRUCache.
+            max_bytes (int): Larger images are not downloaded.
+            max_side (int): Images are scaled down to fit this width and height.
+        """
+        self.client = client or http_client
+        self.file_ids = file_ids if file_ids is not None else LRUCache(max_entries=FILE_ID_ENTRIES)
+        self.max_bytes = max_bytes
+        self.max_side = max_side
+        self._uploads = SingleFlight()
+        self._downloads = SingleFlight()
+
+    async def send(self, bot, chat_id, image_url: str, caption: str = None):
+        """
+        Sends the image at `image_url` to the chat.
+
+        Returns:
+            telegram.Message: The sent message.
+
+        Raises:
+            requests.exceptions.RequestException: If the image cannot be downloaded.
+            telegram.error.TelegramError: If Telegram rejects the photo.
+        """
+        file_id = self.file_ids.get(image_url)
+        if file_id is not None:
+            try:
+                return await self._send_file_id(bot, chat_id, file_id, caption)
+            except BadRequest as e:
+                if not is_file_id_error(e):
+                    raise  # e.g. a too long caption, the file_id is fine
+                # The file expired on Telegram's side, upload it again
+                logger.warning(f"Cached photo of {image_url} rejected: {e}")
+                self.file_ids.delete(image_url)
+
+        leader = False
+
+        async def upload():
+            nonlocal leader
+            leader = True
+            return await self._upload(bot, chat_id, image_url, caption)
+
+        try:
+            message = await self._uploads.do(image_url, upload)
+        except TelegramError:
+            if leader:
+                raise
+            message = None  # The upload to the chat of the first caller failed, not necessarily to this one
+        if leader:
+            return message
+
+        file_id = self.file_ids.get(image_url)
+        if file_id is not None:
+            return await self._send_file_id(bot, chat_id, file_id, caption)
+        return await self._upload(bot, chat_id, image_url, caption)
+
+    async def _send_file_id(self, bot, chat_id, file_id: str, caption: str):
+        with stage("upload"):
+            message = await bot.send_photo(chat_id=chat_id, photo=file_id, caption=caption)
+        count("images", source="file_id")
+        return message
+
+    async def _upload(self, bot, chat_id, image_url: str, caption: str):
+        data = await self._downloads.do(image_url, lambda: asyncio.to_thread(self.fetch, image_url))
+        with stage("upload"):
+            message = await bot.send_photo(chat_id=chat_id, photo=data, caption=caption)
+        if message.photo:
+            self.file_ids.set(image_url, message.photo[-1].file_id)  # The largest size, as uploaded
+        count("images", source="upload")
+        count("image_bytes", len(data))
+        return message
+
+    def fetch(self, image_url: str) -> bytes:
+        """Downloads the image and shrinks it if it is oversized (blocking)."""
+        with stage("image_download"):
+            response = self.client.get(image_url, max_bytes=self.max_bytes)
+        with stage("image_resize"):
+            return fit_image(response.content, self.max_side)
+
+
+# Shared by all chats so that every image is uploaded once.
+photo_sender = PhotoSender()
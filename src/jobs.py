@@ -0,0 +1,133 @@
+# jobs.py
+import asyncio
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted over the queue capacity."""
+
+
+@dataclass
+class Job:
+    chat_id: int = None
+    fn: object = None  # Returns the coroutine to run
+    future: asyncio.Future = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class JobQueue:
+    """
+    Bounded job queue served by a fixed number of workers.
+    Chats are served round-robin, so one chat sending many links cannot starve the others.
+    """
+
+    def __init__(self, workers=4, max_size=100, max_per_chat=5):
+        """
+        Initializes the queue.
+
+        Args:
+            workers (int): How many jobs run at the same time.
+            max_size (int): How many jobs may wait in total.
+            max_per_chat (int): How many jobs of one chat may wait.
+        """
+        self.workers = workers
+        self.max_size = max_size
+        self.max_per_chat = max_per_chat
+        self._chats = OrderedDict()  # chat_id -> deque of waiting jobs, in serving order
+        self._size = 0
+        self._idle = workers
+        self._available = None
+        self._tasks = []
+
+    def submit(self, chat_id, fn, max_waiting=None) -> tuple:
+        """
+        Queues a job.
+
+        Args:
+            chat_id: The chat the job belongs to.
+            fn: A callable returning the coroutine to run.
+            max_waiting (int, optional): How many jobs of the chat may wait, defaults to `max_per_chat`.
+
+        Returns:
+            tuple: The place of the job in the queue (0 if it starts right away) and a future with its result.
+
+        Raises:
+            QueueFullError: If the queue or the chat's share of it is full.
+        """
+        self._start()
+        waiting = self._chats.get(chat_id)
+        if self._size >= self.max_size:
+            raise QueueFullError("The bot is overloaded, please try again later.")
+        if max_waiting is None:
+            max_waiting = self.max_per_chat
+        if waiting is not None and len(waiting) >= max_waiting:
+            raise QueueFullError(f"You already have {len(waiting)} requests waiting, please wait for them to finish.")
+
+        job = Job(chat_id=chat_id, fn=fn, future=asyncio.get_running_loop().create_future())
+        position = self._position(chat_id)
+        self._chats.setdefault(chat_id, deque()).append(job)
+        self._size += 1
+        self._available.release()
+        return position, job.future
+
+    def size(self) -> int:
+        return self._size
+
+    def busy_workers(self) -> int:
+        return self.workers - self._idle
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _position(self, chat_id) -> int:
+        """Place of a new job of the chat in the round-robin order (1 is next), 0 if a worker is free."""
+        own = len(self._chats.get(chat_id, ()))
+        ahead = own + sum(min(len(jobs), own + 1) for other, jobs in self._chats.items() if other != chat_id)
+        if ahead < self._idle:
+            return 0
+        return ahead - self._idle + 1
+
+    def _start(self):
+        # Workers are started lazily so that they belong to the running loop
+        if self._tasks:
+            return
+        self._available = asyncio.Semaphore(0)
+        self._tasks = [asyncio.ensure_future(self._work()) for _ in range(self.workers)]
+
+    def _next_job(self) -> Job:
+        chat_id, jobs = self._chats.popitem(last=False)
+        job = jobs.popleft()
+        if jobs:
+            self._chats[chat_id] = jobs  # Back to the end of the rotation
+        self._size -= 1
+        return job
+
+    async def _work(self):
+        while True:
+            await self._available.acquire()
+            job = self._next_job()
+            if job.future.done():
+                continue  # Cancelled while waiting
+            self._idle -= 1
+            logger.info(f"Job of chat {job.chat_id} waited {time.monotonic() - job.enqueued_at:.2f}s")
+            try:
+                result = await job.fn()
+                if not job.future.done():
+                    job.future.set_result(result)
+            except asyncio.CancelledError:
+                job.future.cancel()
+                raise
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                self._idle += 1
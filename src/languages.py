@@ -0,0 +1,95 @@
+# languages.py
+import re
+from collections import Counter
+
+# Summarization models by language of the text, "*" for the other languages. Languages without a route
+# go to the default model of the processor: bart-large-cnn only knows English, Russian texts get a model
+# of their own. Add e.g. "*=csebuetnlp/mT5_multilingual_XLSum" for the other languages.
+DEFAULT_ROUTES = {
+    "ru": "IlyaGusev/mbart_ru_sum_gazeta",
+}
+SAMPLE_CHARS = 2000  # The language is detected on the start of the text
+MIN_SCORE = 0.05  # Share of the words that must be stop words of the detected language
+
+# Letters telling the languages written in a script apart
+SCRIPTS = (
+    ("uk", re.compile(r"[іїєґІЇЄҐ]")),
+    ("ru", re.compile(r"[а-яёА-ЯЁ]")),
+    ("ja", re.compile(r"[぀-ヿ]")),
+    ("zh", re.compile(r"[一-鿿]")),
+    ("ko", re.compile(r"[가-힯]")),
+    ("ar", re.compile(r"[؀-ۿ]")),
+    ("he", re.compile(r"[֐-׿]")),
+    ("el", re.compile(r"[Ͱ-Ͽ]")),
+    ("hi", re.compile(r"[ऀ-ॿ]")),
+)
+# The most frequent words of the languages written in the Latin script
+STOP_WORDS = {
+    "en": "the and of to in is that it for was on with as are this be by have you not",
+    "de": "der die und das ist nicht ein eine zu den mit sich auf für dem von auch",
+    "fr": "le la les et des est une un du que pour dans pas qui sur au avec",
+    "es": "el la los las y de que en un una es por con para del se no",
+    "it": "il la che di e un una per non sono del della con si è gli",
+    "pt": "o a os as e de que em um uma para com não do da se é",
+    "nl": "de het een en van is dat niet op te zijn met voor die",
+}
+STOP_WORDS = {language: frozenset(words.split()) for language, words in STOP_WORDS.items()}
+WORD = re.compile(r"[^\W\d_]+")
+
+
+def detect_language(text: str):
+    """
+    Detects the language of a text from its script, and from its stop words for the Latin script.
+
+    Args:
+        text (str): The text, only its first SAMPLE_CHARS characters are read.
+
+    Returns:
+        str: An ISO 639-1 code, or None if the language is not recognized.
+    """
+    sample = (text or "")[:SAMPLE_CHARS]
+    letters = sum(1 for char in sample if char.isalpha())
+    if not letters:
+        return None
+    for language, letters_pattern in SCRIPTS:
+        matches = len(letters_pattern.findall(sample))
+        # Ukrainian is told apart from Russian by a few letters of its own
+        if matches > (letters * 0.02 if language == "uk" else letters * 0.3):
+            return language
+
+    words = Counter(word.lower() for word in WORD.findall(sample))
+    total = sum(words.values())
+    scores = {
+        language: sum(count for word, count in words.items() if word in stop_words) / total
+        for language, stop_words in STOP_WORDS.items()
+    }
+    language = max(scores, key=scores.get)
+    return language if scores[language] >= MIN_SCORE else None
+
+
+def route_model(language: str, routes: dict, default: str) -> str:
+    """Returns the model summarizing texts in the language, `default` if no route matches."""
+    return routes.get(language) or routes.get("*") or default
+
+
+def parse_routes(value: str) -> dict:
+    """
+    Parses routes written as "ru=IlyaGusev/mbart_ru_sum_gazeta,en=facebook/bart-large-cnn,*=other/model".
+
+    Raises:
+        ValueError: If a route has no "=".
+    """
+    routes = {}
+    for route in value.split(","):
+        if not route.strip():
+            continue
+        language, separator, model = route.partition("=")
+        if not separator or not language.strip() or not model.strip():
+            raise ValueError(f"Invalid summarizer route: {route!r} (expected language=model)")
+        routes[language.strip()] = model.strip()
+    return routes
+
+
+def normalize_language(code: str):
+    """Reduces a language code of a source (e.g. "en-US", "pt_BR") to its ISO 639-1 part."""
+    return re.split(r"[-_]", code, maxsplit=1)[0].lower() if code else None
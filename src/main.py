@@ -1,23 +1,129 @@
 # main.py
+import time
+
+STARTED_AT = time.monotonic()  # Before the imports below, so that the startup time includes them
+
+import asyncio
 import os
 
 from dotenv import load_dotenv
 
-from handlers import TelegramHandler
+from backends import DEFAULT_BACKEND, check_backend
+from cache import DEFAULT_TTL, SummaryCache
+from handlers import ApiHandler, TelegramHandler
+from jobs import JobQueue
 from logger import setup_logger
+from metrics import MetricsServer, metrics
+from languages import DEFAULT_ROUTES, parse_routes
+from processors import DEFAULT_CHAPTER_WINDOW_SECONDS, TextProcessor
+from registry import DEFAULT_SUMMARIZER_MODEL
+from services import SummaryService
 
 logger = setup_logger(__name__)
 
 load_dotenv()
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")  # e.g. a local Bot API server, defaults to api.telegram.org
+API_PORT = int(os.getenv("API_PORT", "0"))  # Serves the REST API, 0 disables it. Without a bot token only the API runs.
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+# Comma separated list of models to load at startup, the first one is used by default.
+SUMMARIZER_MODELS = [m.strip() for m in os.getenv("SUMMARIZER_MODELS", DEFAULT_SUMMARIZER_MODEL).split(",") if m.strip()]
+# Models by language of the content, "*" for the other languages. Empty summarizes everything with the first model.
+SUMMARIZER_ROUTES = parse_routes(os.getenv("SUMMARIZER_ROUTES", ",".join(f"{k}={v}" for k, v in DEFAULT_ROUTES.items())))
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "4"))  # Requests fetched and summarized at the same time
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1"))  # Threads running the summarizer
+INFERENCE_PROCESSES = int(os.getenv("INFERENCE_PROCESSES", "0"))  # Worker processes running the summarizer instead of threads
+# The worker processes share the weights of one model loaded by this process instead of loading one each
+SHARE_MODEL_MEMORY = os.getenv("SHARE_MODEL_MEMORY", "1") == "1"
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", DEFAULT_BACKEND)  # eager, quantized, compiled or onnx
+INTRA_OP_THREADS = int(os.getenv("INTRA_OP_THREADS", "0"))  # Threads per model operator (per process), 0 for the default
+INTER_OP_THREADS = int(os.getenv("INTER_OP_THREADS", "0"))
+# Videos without chapters are summarized in windows of this length, 0 summarizes them as a whole
+CHAPTER_WINDOW_SECONDS = float(os.getenv("CHAPTER_WINDOW_SECONDS", str(DEFAULT_CHAPTER_WINDOW_SECONDS)))
+QUEUE_MAX_SIZE = int(os.getenv("QUEUE_MAX_SIZE", "100"))  # Requests waiting over this limit are rejected
+QUEUE_MAX_PER_CHAT = int(os.getenv("QUEUE_MAX_PER_CHAT", "5"))
+SUMMARY_CACHE_PATH = os.getenv("SUMMARY_CACHE_PATH", "summary_cache.db")  # Empty string disables the cache
+SUMMARY_CACHE_TTL = float(os.getenv("SUMMARY_CACHE_TTL", str(DEFAULT_TTL)))
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "10000"))
+# Chunk summaries shared by all documents and inference processes, empty string keeps them in memory only
+CHUNK_STORE_PATH = os.getenv("CHUNK_STORE_PATH", "chunk_store.db")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # Serves /metrics (Prometheus) and /debug/profile, 0 disables it
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+READY_FILE = os.getenv("READY_FILE", "")  # Created once polling started and the models are loaded, for health checks
 
 
 def main():
     """Main function to start the bot."""
+    check_backend(INFERENCE_BACKEND)
+    if READY_FILE and os.path.exists(READY_FILE):
+        os.remove(READY_FILE)  # Left by the previous run of the container
+
+    cache = None
+    if SUMMARY_CACHE_PATH:
+        cache = SummaryCache(SUMMARY_CACHE_PATH, ttl=SUMMARY_CACHE_TTL, max_entries=SUMMARY_CACHE_MAX_ENTRIES)
+
+    service = SummaryService(
+        TextProcessor(SUMMARIZER_MODELS[0], backend=INFERENCE_BACKEND, chapter_window_seconds=CHAPTER_WINDOW_SECONDS,
+                      chunk_store_path=CHUNK_STORE_PATH or None, routes=SUMMARIZER_ROUTES or None),
+        max_concurrent_jobs=MAX_CONCURRENT_JOBS,
+        inference_workers=INFERENCE_WORKERS,
+        cache=cache,
+        inference_processes=INFERENCE_PROCESSES,
+        intra_op_threads=INTRA_OP_THREADS,
+        inter_op_threads=INTER_OP_THREADS,
+        share_model=SHARE_MODEL_MEMORY,
+    )
+    jobs = JobQueue(workers=MAX_CONCURRENT_JOBS, max_size=QUEUE_MAX_SIZE, max_per_chat=QUEUE_MAX_PER_CHAT)
+
+    if METRICS_PORT:
+        metrics.gauge("queue_size", jobs.size, "Requests waiting in the queue.")
+        metrics.gauge("busy_workers", jobs.busy_workers, "Requests being processed.")
+        if cache is not None:
+            metrics.gauge("summary_cache_entries", lambda: cache.stats()["entries"], "Entries of the summary cache.")
+        if CHUNK_STORE_PATH:
+            metrics.gauge("chunk_store_entries", lambda: service.processor.cache.stats()["entries"],
+                          "Summaries in the chunk store.")
+        MetricsServer(METRICS_PORT, host=METRICS_HOST).start()
+
+    def warmup():
+        started = time.monotonic()
+        try:
+            service.warmup(SUMMARIZER_MODELS)
+        except Exception as e:
+            logger.exception(f"Cannot load the models: {e}")
+            return
+        logger.info(f"Models loaded in {time.monotonic() - started:.2f}s, ready {time.monotonic() - STARTED_AT:.2f}s after startup")
+        if READY_FILE:
+            with open(READY_FILE, "w"):
+                pass
+
+    async def warmup_in_background():
+        # Polling does not wait for the models: requests arriving in the meantime are queued
+        # and wait for the model in the registry.
+        asyncio.get_running_loop().run_in_executor(None, warmup)
+
+    api_handler = None
+    if API_PORT:
+        api_handler = ApiHandler(service=service, jobs=jobs, host=API_HOST, port=API_PORT, on_ready=warmup_in_background)
+
+    async def on_ready():
+        logger.info(f"Polling starts {time.monotonic() - STARTED_AT:.2f}s after startup")
+        if api_handler is not None:
+            await api_handler.start()  # In the loop of the bot, both share the queue. Starts the warmup.
+        else:
+            await warmup_in_background()
+
+    if not TELEGRAM_BOT_TOKEN:
+        if api_handler is None:
+            raise SystemExit("Set TELEGRAM_BOT_TOKEN and/or API_PORT")
+        api_handler.run()
+        return
 
     # Create the Telegram handler
-    telegram_handler = TelegramHandler(TELEGRAM_BOT_TOKEN)
+    telegram_handler = TelegramHandler(
+        TELEGRAM_BOT_TOKEN, service=service, jobs=jobs, on_ready=on_ready, base_url=TELEGRAM_API_URL
+    )
 
     # Start the bot (using the handler's 'run' method)
     telegram_handler.run()
@@ -0,0 +1,243 @@
+# metrics.py
+import bisect
+import contextvars
+import itertools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# seconds, from URL classification (microseconds) to inference of long videos (minutes)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+PREFIX = "summarizer_"
+
+_trace_ids = itertools.count(1)
+_current_trace = contextvars.ContextVar("trace", default=None)
+
+
+@dataclass
+class Trace:
+    """Timings and counts of one request, collected across handlers, services, sources and processors."""
+    kind: str = None  # The front-end, e.g. "telegram"
+    source_url: str = None
+    trace_id: int = field(default_factory=lambda: next(_trace_ids))
+    started_at: float = field(default_factory=time.monotonic)
+    stages: dict = field(default_factory=dict)  # stage -> seconds, summed over repeats
+    counts: dict = field(default_factory=dict)  # e.g. chunks, cache hits, input/output tokens
+
+    def to_json(self) -> str:
+        data = asdict(self)
+        data.pop("started_at")
+        data["seconds"] = round(time.monotonic() - self.started_at, 4)
+        data["stages"] = {stage: round(seconds, 4) for stage, seconds in self.stages.items()}
+        return json.dumps(data, ensure_ascii=False)
+
+
+class Metrics:
+    """
+    Thread-safe counters, gauges and histograms rendered in the Prometheus text format.
+    Names get the "summarizer_" prefix, labels are passed as keyword arguments.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counters = {}  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+        self._gauges = {}  # name -> callable returning the value
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value=1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            histogram[bisect.bisect_left(self.buckets, value)] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def gauge(self, name: str, fn, help_text: str = None):
+        """Registers a gauge whose value is read from `fn` when the metrics are rendered."""
+        with self._lock:
+            self._gauges[name] = fn
+            if help_text:
+                self._help[name] = help_text
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def value(self, name: str, **labels):
+        """Returns a counter value, or the (count, sum) of a histogram; mostly for tests."""
+        key = (name, _labels(labels))
+        with self._lock:
+            if key in self._histograms:
+                return self._histograms[key][-1], self._histograms[key][-2]
+            return self._counters.get(key, 0)
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        """Returns all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+            gauges = sorted(self._gauges.items())
+
+        lines = []
+        typed = set()
+
+        def header(name, kind):
+            if name not in typed:
+                typed.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {PREFIX}{name} {self._help[name]}")
+                lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{PREFIX}{name}{_format_labels(labels)} {value}")
+        for (name, labels), histogram in histograms:
+            header(name, "histogram")
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), histogram):
+                cumulative += count
+                lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {histogram[-2]}")
+            lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {histogram[-1]}")
+        for name, fn in gauges:
+            try:
+                value = fn()
+            except Exception as e:
+                logger.warning(f"Cannot read gauge {name}: {e}")
+                continue
+            header(name, "gauge")
+            lines.append(f"{PREFIX}{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# Shared by every module of the process.
+metrics = Metrics()
+metrics.describe("stage_seconds", "Time spent in each stage of a request.")
+metrics.describe("requests_total", "Finished requests by source type and outcome.")
+metrics.describe("tokens_total", "Tokens passed through the summarizer.")
+
+
+def current_trace() -> Trace:
+    return _current_trace.get()
+
+
+@contextmanager
+def activate(trace: Trace):
+    """Makes the trace the current one of this context (and of threads and tasks started from it)."""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def record(stage: str, seconds: float):
+    """Records the duration of a stage in the stage histogram and the current trace."""
+    metrics.observe("stage_seconds", seconds, stage=stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.stages[stage] = trace.stages.get(stage, 0) + seconds
+
+
+@contextmanager
+def stage(name: str):
+    """Times the block as a stage of the current request."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def count(name: str, value=1, **labels):
+    """Adds to the `<name>_total` counter and to the counts of the current trace."""
+    metrics.inc(f"{name}_total", value, **labels)
+    trace = _current_trace.get()
+    if trace is not None:
+        key = "_".join([name, *map(str, labels.values())])
+        trace.counts[key] = trace.counts.get(key, 0) + value
+
+
+class MetricsServer:
+    """
+    Serves the metrics on a local HTTP port:
+    /metrics in the Prometheus text format and /debug/profile?seconds=N with the collapsed
+    stacks of a sampling profile (see profiler.py), which flame graph tools read.
+    """
+
+    def __init__(self, port: int, host="127.0.0.1", registry: Metrics = None):
+        self.registry = registry or metrics
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/metrics":
+                    self._send(200, registry.render(), "text/plain; version=0.0.4; charset=utf-8")
+                elif url.path == "/debug/profile":
+                    from profiler import SamplingProfiler
+
+                    query = parse_qs(url.query)
+                    seconds = min(float(query.get("seconds", ["10"])[0]), 300)
+                    self._send(200, SamplingProfiler().profile(seconds), "text/plain; charset=utf-8")
+                else:
+                    self._send(404, "Not found\n", "text/plain; charset=utf-8")
+
+            def _send(self, status, text, content_type):
+                body = text.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True).start()
+        logger.info(f"Serving metrics on port {self.port}")
+        return self
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
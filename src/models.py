@@ -1,8 +1,98 @@
 # models.py
+from array import array
+from bisect import bisect_right
 from dataclasses import dataclass
+from typing import List
 
 
-@dataclass
+class Transcript:
+    """
+    The text of a transcript, joined once, with the start and duration of every segment in compact arrays
+    instead of one dict per segment. A long video has thousands of segments.
+    """
+
+    __slots__ = ("text", "offsets", "starts", "durations")
+
+    def __init__(self, text: str, offsets: array, starts: array, durations: array):
+        self.text = text
+        self.offsets = offsets  # Of the segments in the text
+        self.starts = starts  # seconds
+        self.durations = durations  # seconds
+
+    @classmethod
+    def from_segments(cls, segments) -> "Transcript":
+        """
+        Builds the transcript from the segments returned by youtube_transcript_api.
+
+        Args:
+            segments: An iterable of dicts (or objects) with `text`, `start` and `duration`.
+        """
+        texts = []
+        offsets, starts, durations = array("l"), array("d"), array("d")
+        position = 0
+        for segment in segments:
+            if isinstance(segment, dict):
+                text, start, duration = segment["text"], segment["start"], segment.get("duration", 0)
+            else:
+                text, start, duration = segment.text, segment.start, segment.duration
+            text = text.strip()
+            if not text:
+                continue
+            texts.append(text)
+            offsets.append(position)
+            starts.append(start)
+            durations.append(duration or 0)
+            position += len(text) + 1  # The joining space
+        return cls(" ".join(texts), offsets, starts, durations)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def time_at(self, offset: int) -> float:
+        """Returns the start in seconds of the segment containing the text offset."""
+        return self.starts[max(bisect_right(self.offsets, offset) - 1, 0)]
+
+    def offset_at(self, seconds: float) -> int:
+        """Returns the text offset of the first segment starting at or after `seconds`."""
+        index = bisect_right(self.starts, seconds - 1e-9)
+        return self.offsets[index] if index < len(self.offsets) else len(self.text)
+
+    def sections(self, chapters=None, window_seconds=0) -> list:
+        """
+        Splits the transcript on the chapter markers of the video, or else into time windows.
+
+        Args:
+            chapters (list, optional): Chapters from the video metadata, dicts with `title`, `start_time` and `end_time`.
+            window_seconds (float): Length of a window when there are no chapters, 0 for no windows.
+
+        Returns:
+            list: (title, start seconds, end seconds, start offset, end offset) of every non-empty section.
+        """
+        if not len(self):
+            return []
+        duration = self.starts[-1] + self.durations[-1]
+        if chapters:
+            bounds = [(chapter.get("title"), chapter["start_time"], chapter.get("end_time")) for chapter in chapters]
+        elif window_seconds:
+            bounds = []
+            start = 0
+            while start < duration:
+                bounds.append((None, start, min(start + window_seconds, duration)))
+                start += window_seconds
+        else:
+            bounds = [(None, 0, duration)]
+
+        sections = []
+        for index, (title, start, end) in enumerate(bounds):
+            # Segments before the first chapter go into it, segments after the last one into the last one
+            start_offset = self.offset_at(start) if index else 0
+            end_offset = self.offset_at(bounds[index + 1][1]) if index + 1 < len(bounds) else len(self.text)
+            if end_offset > start_offset:
+                sections.append((title, start, end if end is not None else duration, start_offset, end_offset))
+        return sections
+
+
+@dataclass(slots=True)
 class Content:
     text: str = None
     audio_path: str = None
@@ -10,9 +100,43 @@ class Content:
     source_url: str = None
     image_url: str = None
     error_message: str = None
+    metadata: dict = None
+    transcript: Transcript = None  # Timestamps of the text, for videos
+    language: str = None  # ISO 639-1 code given by the source, e.g. of the transcript
+
+
+@dataclass(slots=True)
+class SummaryLevel:
+    level: int = None
+    chunks: int = None
+    cached: int = None
+    seconds: float = None
+    input_tokens: int = None
+    output_tokens: int = None
+
+
+@dataclass(slots=True)
+class SummaryProgress:
+    level: int = None
+    index: int = None  # Of the chunk within the level
+    done: int = None
+    total: int = None
+    summary: str = None  # Of the chunk
+
+
+@dataclass(slots=True)
+class ChapterSummary:
+    title: str = None  # None for a time window of a video without chapters
+    start: float = None  # seconds
+    end: float = None  # seconds
+    summary: str = None
 
 
-@dataclass
+@dataclass(slots=True)
 class SummaryResult:
     summary: str = None
     error_message: str = None
+    levels: List[SummaryLevel] = None
+    chapters: List[ChapterSummary] = None  # Of videos, in order
+    language: str = None  # Of the content, None if it was not recognized
+    model: str = None  # The summarization model routed to that language
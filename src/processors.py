@@ -1,9 +1,26 @@
 # processors.py
+import contextvars
+import copy
+import hashlib
+import time
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 
-from transformers import pipeline
+from backends import DEFAULT_BACKEND
+from cache import ChunkStore, LRUCache
+from chunkers import DEFAULT_MAX_TOKENS, TokenChunker
+from languages import detect_language, route_model
+from logger import setup_logger
+from metrics import stage
+from models import ChapterSummary, Content, SummaryLevel, SummaryProgress, SummaryResult
+from registry import DEFAULT_SUMMARIZER_MODEL, model_key, model_registry
 
-from models import Content, SummaryResult
+logger = setup_logger(__name__)
+
+DEFAULT_TARGET_TOKENS = 200  # Keeps the summary within a Telegram caption (1024 characters)
+DEFAULT_CHAPTER_TARGET_TOKENS = 80
+DEFAULT_CHAPTER_WINDOW_SECONDS = 10 * 60  # Videos without chapters are summarized in windows of this length
+SPECIAL_TOKENS = 24  # Room left in the model input window for the special tokens
 
 
 class Processor(ABC):
@@ -11,6 +28,13 @@ class Processor(ABC):
     def process(self, content: Content) -> SummaryResult:
         pass
 
+    def iter_process(self, content: Content, chapter=None):
+        """Yields progress while processing, processors without partial results only yield the SummaryResult."""
+        if chapter is not None:
+            yield SummaryResult(error_message="Chapters are not supported by this processor.")
+            return
+        yield self.process(content)
+
 # import speech_recognition as sr
 # class AudioProcessor(Processor):
 #     def __init__(self, summarizer_model="facebook/bart-large-cnn"):
@@ -46,24 +70,357 @@ class Processor(ABC):
 
 
 class TextProcessor(Processor):
-    def __init__(self, summarizer_model="facebook/bart-large-cnn"):
-        self.summarizer = pipeline("summarization", model=summarizer_model)
+    def __init__(self, summarizer_model=DEFAULT_SUMMARIZER_MODEL, registry=None,
+                 max_chunk_tokens=DEFAULT_MAX_TOKENS, chunk_overlap_tokens=0, batch_size=8,
+                 map_reduce=True, target_tokens=DEFAULT_TARGET_TOKENS, max_levels=5, map_workers=1, cache=None,
+                 backend=DEFAULT_BACKEND, chapter_target_tokens=DEFAULT_CHAPTER_TARGET_TOKENS,
+                 chapter_window_seconds=DEFAULT_CHAPTER_WINDOW_SECONDS, content_defined_chunks=True,
+                 chunk_store_path=None, routes=None):
+        """
+        Initializes the text processor.
 
-    def process(self, content: Content) -> SummaryResult:
+        Args:
+            summarizer_model (str): The Hugging Face model name.
+            registry (ModelRegistry, optional): Where models are loaded from. Defaults to the process-wide registry.
+            max_chunk_tokens (int): Token budget of one chunk, should fit the model input window.
+            chunk_overlap_tokens (int): Tokens of trailing sentences repeated in the next chunk.
+            batch_size (int): How many chunks are passed through the model in one forward pass.
+            map_reduce (bool): Summarize the concatenated chunk summaries again until they fit `target_tokens`.
+            target_tokens (int): The length the final summary should fit into.
+            max_levels (int): Upper bound on the number of summarization levels.
+            map_workers (int): How many batches of one level run in parallel.
+            cache (LRUCache, optional): Cache of chunk summaries shared between levels and documents.
+                Defaults to a ChunkStore at `chunk_store_path`, or else to an in-memory LRUCache.
+            backend (str): How the model is run on the CPU, one of backends.BACKENDS.
+            chapter_target_tokens (int): The length a chapter summary should fit into.
+            chapter_window_seconds (float): Videos without chapters are summarized in time windows of this length,
+                0 summarizes them as a whole.
+            content_defined_chunks (bool): Place chunk boundaries by content, so that the unchanged chunks of an
+                edited text keep their cached summaries (see TokenChunker).
+            chunk_store_path (str, optional): SQLite file persisting the chunk summaries, shared by processes.
+            routes (dict, optional): Model by language of the content, "*" for the other languages
+                (see languages.DEFAULT_ROUTES). Without routes every content goes to `summarizer_model`.
+        """
+        self.summarizer_model = summarizer_model
+        self.registry = registry or model_registry
+        self.max_chunk_tokens = max_chunk_tokens
+        self.chunk_overlap_tokens = chunk_overlap_tokens
+        self.batch_size = batch_size
+        self.map_reduce = map_reduce
+        self.target_tokens = target_tokens
+        self.max_levels = max_levels
+        self.map_workers = map_workers
+        self.chunk_store_path = chunk_store_path
+        if cache is None:
+            cache = ChunkStore(chunk_store_path) if chunk_store_path else LRUCache(max_entries=4096)
+        self.cache = cache
+        self.backend = backend
+        self.chapter_target_tokens = chapter_target_tokens
+        self.chapter_window_seconds = chapter_window_seconds
+        self.content_defined_chunks = content_defined_chunks
+        self.routes = routes
+        self._routed = {}  # model -> processor
+        self._executor = ThreadPoolExecutor(max_workers=map_workers) if map_workers > 1 else None
+
+    @property
+    def summarizer(self):
+        # Models are owned by the registry, so creating processors is cheap.
+        return self.registry.get(self.summarizer_model, self.backend)
+
+    def options(self) -> dict:
+        """Returns the constructor arguments needed to build the same processor in another process."""
+        return {
+            "summarizer_model": self.summarizer_model,
+            "max_chunk_tokens": self.max_chunk_tokens,
+            "chunk_overlap_tokens": self.chunk_overlap_tokens,
+            "batch_size": self.batch_size,
+            "map_reduce": self.map_reduce,
+            "target_tokens": self.target_tokens,
+            "max_levels": self.max_levels,
+            "map_workers": self.map_workers,
+            "backend": self.backend,
+            "chapter_target_tokens": self.chapter_target_tokens,
+            "chapter_window_seconds": self.chapter_window_seconds,
+            "content_defined_chunks": self.content_defined_chunks,
+            "chunk_store_path": self.chunk_store_path,
+            "routes": self.routes,
+        }
+
+    def models(self) -> list:
+        """Returns the default model followed by the models of the routes, each once."""
+        return list(dict.fromkeys([self.summarizer_model, *(self.routes or {}).values()]))
+
+    def route(self, content: Content) -> tuple:
+        """
+        Picks the model for the language of the content: the one given by the source, or else the detected one.
+
+        Returns:
+            tuple: The language (None if unknown) and the model name.
+        """
+        language = content.language or detect_language(content.text)
+        if not self.routes:
+            return language, self.summarizer_model
+        return language, route_model(language, self.routes, self.summarizer_model)
+
+    def _for_model(self, model: str) -> "TextProcessor":
+        """Returns this processor running another model, sharing its cache, registry and threads."""
+        if model == self.summarizer_model:
+            return self
+        processor = self._routed.get(model)
+        if processor is None:
+            processor = copy.copy(self)
+            processor.summarizer_model = model
+            processor.routes = None
+            self._routed[model] = processor
+        return processor
+
+    def process(self, content: Content, chapter=None) -> SummaryResult:
+        result = None
+        for item in self.iter_process(content, chapter):
+            result = item
+        return result
+
+    def iter_process(self, content: Content, chapter=None):
+        """
+        Summarizes the content, reporting every chunk summary as soon as it is produced.
+        Videos are summarized chapter by chapter (or by time window), see `chapter_window_seconds`.
+
+        Args:
+            content (Content): The content to summarize.
+            chapter (int, optional): Summarize only this chapter (index into SummaryResult.chapters).
+
+        Yields:
+            SummaryProgress: One item per summarized chunk of every level.
+            SummaryResult: The final summary (or error), always the last item.
+        """
         if content.error_message:
-            return SummaryResult(error_message=content.error_message)
+            yield SummaryResult(error_message=content.error_message)
+            return
 
         if not content.text:
-            return SummaryResult(error_message="TextProcessor: No text for processing.")
+            yield SummaryResult(error_message="TextProcessor: No text for processing.")
+            return
+
+        language, model = self.route(content)
+        for item in self._for_model(model)._iter_summaries(content, chapter):
+            if isinstance(item, SummaryResult) and not item.error_message:
+                item.language, item.model = language, model
+            yield item
+
+    def _iter_summaries(self, content: Content, chapter=None):
+        """Summarizes the content with the model of this processor, see `iter_process`."""
         try:
-            max_chunk_length = 1024
-            chunks = [content.text[i:i + max_chunk_length] for i in range(0, len(content.text), max_chunk_length)]
-            summaries = []
-            for chunk in chunks:
-                summary = self.summarizer(chunk, max_length=130, min_length=30, do_sample=False)[0]['summary_text']
-                summaries.append(summary)
+            summarizer = self.summarizer
+            chunker = self._chunker(summarizer)
+            sections = self._sections(content)
+            if chapter is not None:
+                if not sections or not 0 <= chapter < len(sections):
+                    yield SummaryResult(error_message=f"No chapter {chapter} in this video.")
+                    return
+                sections = [sections[chapter]]
 
-            return SummaryResult(summary=" ".join(summaries))
+            if not sections:
+                with stage("chunking"):
+                    # Offsets into the text, a chunk is copied out of it only when its batch is summarized
+                    chunks = chunker.chunks(content.text)
+                (summary,), levels = yield from self._iter_levels(summarizer, chunker, [chunks], self.target_tokens)
+                yield SummaryResult(summary=summary, levels=levels)
+                return
+
+            # Chunks never cross a chapter, so every chapter is summarized (and cached) independently,
+            # while the batches mix chunks of all chapters
+            with stage("chunking"):
+                groups = [chunker.chunks(content.text, start, end) for _, _, _, start, end in sections]
+            summaries, levels = yield from self._iter_levels(summarizer, chunker, groups, self.chapter_target_tokens)
+            chapters = [
+                ChapterSummary(title=title, start=start, end=end, summary=summary)
+                for (title, start, end, _, _), summary in zip(sections, summaries)
+            ]
+
+            summary = " ".join(summaries)
+            if len(chapters) > 1 and chunker.count_tokens(summary) > self.target_tokens:
+                with stage("chunking"):
+                    chunks = chunker.chunks(summary)
+                (summary,), more_levels = yield from self._iter_levels(
+                    summarizer, chunker, [chunks], self.target_tokens, first_level=len(levels) + 1
+                )
+                levels += more_levels
+            yield SummaryResult(summary=summary, levels=levels, chapters=chapters)
 
         except Exception as e:
-            return SummaryResult(error_message=f"Error on summarizing: {e}")
+            yield SummaryResult(error_message=f"Error on summarizing: {e}")
+
+    def _iter_levels(self, summarizer, chunker: TokenChunker, groups: list, target_tokens: int, first_level=1):
+        """
+        Summarizes several texts level by level: the chunk summaries of a text are concatenated and summarized
+        again until they fit `target_tokens`. The chunks of all texts of a level go through the model together.
+
+        Args:
+            groups (list): The Chunks of every text.
+
+        Yields:
+            SummaryProgress: One item per summarized chunk of every level.
+
+        Returns:
+            tuple: The summary of every text and the SummaryLevel of every level.
+        """
+        summaries = [None] * len(groups)
+        levels = []
+        active = list(range(len(groups)))
+        while active:
+            started = time.perf_counter()
+            level = first_level + len(levels)
+            if len(active) == 1:
+                chunks = groups[active[0]]
+            else:
+                chunks = [chunk for group in active for chunk in groups[group]]
+            outputs = [None] * len(chunks)
+            cached = 0
+            for done, (index, chunk_summary, hit) in enumerate(self._iter_map(summarizer, chunks), start=1):
+                outputs[index] = chunk_summary
+                cached += hit
+                yield SummaryProgress(level=level, index=index, done=done, total=len(chunks), summary=chunk_summary)
+
+            position = 0
+            output_tokens = {}
+            for group in active:
+                summaries[group] = " ".join(outputs[position:position + len(groups[group])])
+                position += len(groups[group])
+                output_tokens[group] = chunker.count_tokens(summaries[group])
+            levels.append(SummaryLevel(
+                level=level, chunks=len(chunks), cached=cached, seconds=time.perf_counter() - started,
+                input_tokens=sum(groups[group].total_tokens for group in active),
+                output_tokens=sum(output_tokens.values()),
+            ))
+            logger.info(f"Level {level}: {len(chunks)} chunks ({cached} cached) in {levels[-1].seconds:.2f}s")
+
+            remaining = []
+            for group in active:
+                if not self.map_reduce or len(groups[group]) == 1 or len(levels) >= self.max_levels:
+                    continue
+                if output_tokens[group] <= target_tokens:
+                    continue
+
+                # Reduce: the concatenated summaries become the input of the next level
+                with stage("chunking"):
+                    reduced = chunker.chunks(summaries[group])
+                if len(reduced) >= len(groups[group]) and output_tokens[group] >= groups[group].total_tokens:
+                    continue  # The model is not shrinking the text, another level would not help
+                groups[group] = reduced
+                remaining.append(group)
+            active = remaining
+        return summaries, levels
+
+    def _sections(self, content: Content) -> list:
+        """Returns the chapters (or time windows) of a video, None for other content and single-section videos."""
+        if content.transcript is None:
+            return None
+        chapters = (content.metadata or {}).get("chapters")
+        sections = content.transcript.sections(chapters, self.chapter_window_seconds)
+        return sections if len(sections) > 1 else None
+
+    def process_many(self, contents: list) -> list:
+        """
+        Summarizes several documents, running the first-level chunks of all of them through the model
+        together so that the batches are full even when the documents are short.
+
+        Args:
+            contents (list): The Content objects to summarize.
+
+        Returns:
+            list: A SummaryResult per content, in the same order.
+        """
+        by_model = {}
+        for content in contents:
+            if content.text and not content.error_message:
+                by_model.setdefault(self.route(content)[1], []).append(content)
+        try:
+            for model, group in by_model.items():
+                processor = self._for_model(model)
+                summarizer = processor.summarizer
+                chunker = processor._chunker(summarizer)
+                with stage("chunking"):
+                    # Split as in `_iter_summaries`, so that videos are chunked chapter by chapter
+                    chunks = []
+                    for content in group:
+                        sections = processor._sections(content) or [(None, None, None, 0, None)]
+                        for _, _, _, start, end in sections:
+                            chunks.extend(chunker.chunks(content.text, start, end))
+                # Fills the chunk cache, the first level of every document is then read from it
+                for _ in processor._iter_map(summarizer, chunks):
+                    pass
+        except Exception as e:
+            logger.exception(f"Error on summarizing a batch: {e}")  # Every document reports it below
+        return [self.process(content) for content in contents]
+
+    def _chunker(self, summarizer) -> TokenChunker:
+        tokenizer = getattr(summarizer, "tokenizer", None)
+        max_tokens, overlap_tokens = self.max_chunk_tokens, self.chunk_overlap_tokens
+        # Routed models may have a smaller input window (e.g. 512 tokens for mT5) than the configured budget
+        window = getattr(tokenizer, "model_max_length", None)
+        if isinstance(window, int) and SPECIAL_TOKENS < window < max_tokens + SPECIAL_TOKENS:
+            max_tokens = window - SPECIAL_TOKENS
+            overlap_tokens = min(overlap_tokens, max_tokens // 2)
+        return TokenChunker(
+            tokenizer,
+            max_tokens=max_tokens,
+            overlap_tokens=overlap_tokens,
+            content_defined=self.content_defined_chunks,
+        )
+
+    def _iter_map(self, summarizer, chunks: list):
+        """
+        Summarizes every chunk, cached summaries first, then batch by batch.
+
+        Yields:
+            tuple: The chunk index, its summary and whether it came from the cache.
+        """
+        indices = {}  # Identical chunks are summarized once
+        for index, chunk in enumerate(chunks):
+            indices.setdefault(self._cache_key(chunk), []).append(index)
+
+        pending = []
+        for key, key_indices in indices.items():
+            summary = self.cache.get(key)
+            if summary is None:
+                pending.append(key)
+                continue
+            for index in key_indices:
+                yield index, summary, True
+
+        batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+
+        def summarize_batch(batch):
+            return self._summarize(summarizer, [chunks[indices[key][0]] for key in batch])
+
+        # Independent batches of one level may run in parallel, the model releases the GIL during inference.
+        # The context is copied so that their timings go to the trace of the request.
+        if self._executor is None:
+            results = map(summarize_batch, batches)
+        else:
+            context = contextvars.copy_context()
+            results = self._executor.map(lambda batch: context.copy().run(summarize_batch, batch), batches)
+        for batch, summaries in zip(batches, results):
+            for key, summary in zip(batch, summaries):
+                self.cache.set(key, summary)
+                for index in indices[key]:
+                    yield index, summary, False
+
+    def _cache_key(self, chunk: str) -> str:
+        # Quantized models summarize slightly differently, so the backend is part of the key.
+        # Whitespace is normalized, mirrors of a page often differ only in it.
+        text = " ".join(chunk.split())
+        return hashlib.sha1(f"{model_key(self.summarizer_model, self.backend)}\n{text}".encode("utf-8")).hexdigest()
+
+    def _summarize(self, summarizer, chunks: list) -> list:
+        """Runs the chunks through the model as padded batches of `batch_size`."""
+        with stage("inference"):
+            outputs = summarizer(
+                chunks,
+                max_length=130,
+                min_length=30,
+                do_sample=False,
+                truncation=True,
+                batch_size=self.batch_size,
+            )
+        return [output['summary_text'] for output in outputs]
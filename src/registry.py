@@ -0,0 +1,172 @@
+# registry.py
+import os
+import resource
+import sys
+import threading
+import time
+from dataclasses import dataclass
+
+from backends import DEFAULT_BACKEND, check_backend, optimize, pipeline_arguments
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_SUMMARIZER_MODEL = "facebook/bart-large-cnn"
+WARMUP_TEXT = "The bot is warming up the summarization model before accepting requests."
+
+
+def pipeline(*args, **kwargs):
+    """Builds a transformers pipeline. transformers (and torch) are imported on first use, they take seconds to import."""
+    from transformers import pipeline as transformers_pipeline
+
+    return transformers_pipeline(*args, **kwargs)
+
+
+def model_key(model_name: str, backend: str = DEFAULT_BACKEND) -> str:
+    """Returns the registry key of the model run by the backend, the model name for the default backend."""
+    return model_name if backend == DEFAULT_BACKEND else f"{model_name}:{backend}"
+
+
+def rss_bytes() -> int:
+    """Returns the current resident set size of the process in bytes."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # Not on Linux: fall back to the peak RSS (kilobytes on Linux, bytes on macOS).
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def memory_usage() -> dict:
+    """
+    Returns the memory of this process in bytes: `rss` (resident), `pss` (resident, with pages shared
+    with other processes divided between them) and `private` (pages only this process uses).
+    Empty where /proc/self/smaps_rollup is not available.
+    """
+    fields = {"Rss": "rss", "Pss": "pss", "Private_Clean": "private", "Private_Dirty": "private"}
+    usage = {}
+    try:
+        with open("/proc/self/smaps_rollup") as smaps:
+            for line in smaps:
+                name, _, value = line.partition(":")
+                if name in fields:
+                    key = fields[name]
+                    usage[key] = usage.get(key, 0) + int(value.split()[0]) * 1024
+    except (OSError, ValueError, IndexError):
+        return {}
+    return usage
+
+
+@dataclass
+class ModelStats:
+    model_name: str = None
+    backend: str = DEFAULT_BACKEND
+    load_seconds: float = None
+    rss_before: int = None
+    rss_after: int = None
+
+    @property
+    def rss_delta(self) -> int:
+        return self.rss_after - self.rss_before
+
+
+class ModelRegistry:
+    """
+    Process-wide pool of summarization pipelines keyed by model name and inference backend.
+    Every model is loaded at most once per backend and shared by all processors and handlers.
+    """
+
+    def __init__(self):
+        self._models = {}
+        self._stats = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_name=DEFAULT_SUMMARIZER_MODEL, backend=DEFAULT_BACKEND):
+        """
+        Returns the pipeline for the given model, loading it on first use.
+
+        Args:
+            model_name (str): The Hugging Face model name.
+            backend (str): The inference backend, one of backends.BACKENDS.
+
+        Returns:
+            The transformers summarization pipeline.
+
+        Raises:
+            ValueError: If the backend is unknown.
+        """
+        key = model_key(model_name, backend)
+        summarizer = self._models.get(key)
+        if summarizer is not None:
+            return summarizer
+        check_backend(backend)
+
+        # One lock per model so loading a second model does not wait for the first one.
+        with self._lock:
+            model_lock = self._locks.setdefault(key, threading.Lock())
+
+        with model_lock:
+            summarizer = self._models.get(key)
+            if summarizer is None:
+                summarizer = self._load(model_name, backend)
+        return summarizer
+
+    def register(self, model_name, summarizer, backend=DEFAULT_BACKEND):
+        """Adds an already built summarizer, e.g. a stand-in model for tests and benchmarks."""
+        key = model_key(model_name, backend)
+        rss = rss_bytes()
+        with self._lock:
+            self._models[key] = summarizer
+            self._stats[key] = ModelStats(model_name=model_name, backend=backend, load_seconds=0, rss_before=rss, rss_after=rss)
+
+    def warmup(self, model_names, backend=DEFAULT_BACKEND):
+        """Loads the given models and runs one short inference so the first request is not slowed down."""
+        for model_name in model_names:
+            summarizer = self.get(model_name, backend)
+            try:
+                summarizer(WARMUP_TEXT, max_length=16, min_length=1, do_sample=False)
+            except Exception as e:
+                logger.warning(f"Warmup inference failed for {model_name}: {e}")
+
+    def stats(self) -> dict:
+        """Returns the load statistics of every loaded model keyed by `model_key`."""
+        return dict(self._stats)
+
+    def loaded_models(self) -> list:
+        return list(self._models)
+
+    def clear(self):
+        """Drops all loaded models (mostly useful in tests)."""
+        with self._lock:
+            self._models.clear()
+            self._stats.clear()
+            self._locks.clear()
+
+    def _load(self, model_name, backend):
+        key = model_key(model_name, backend)
+        logger.info(f"Loading summarizer model {key}...")
+        rss_before = rss_bytes()
+        started = time.perf_counter()
+
+        summarizer = optimize(pipeline("summarization", **pipeline_arguments(model_name, backend)), backend)
+
+        stats = ModelStats(
+            model_name=model_name,
+            backend=backend,
+            load_seconds=time.perf_counter() - started,
+            rss_before=rss_before,
+            rss_after=rss_bytes(),
+        )
+        self._models[key] = summarizer
+        self._stats[key] = stats
+        logger.info(
+            f"Loaded {key} in {stats.load_seconds:.2f}s, "
+            f"resident memory {stats.rss_after / 2 ** 20:.0f} MiB (+{stats.rss_delta / 2 ** 20:.0f} MiB)"
+        )
+        return summarizer
+
+
+# Shared by every processor in the process.
+model_registry = ModelRegistry()
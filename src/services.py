@@ -0,0 +1,347 @@
+# services.py
+import asyncio
+import contextvars
+import gc
+import itertools
+import os
+import time
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from backends import DEFAULT_BACKEND, FORK_SAFE_BACKENDS, configure_threads
+from factories import SourceFactory
+from logger import setup_logger
+from metrics import Trace, activate, count, record, stage
+from models import Content, SummaryProgress, SummaryResult
+from processors import Processor, TextProcessor
+from registry import memory_usage, model_registry
+from singleflight import SingleFlight
+from urls import canonicalize_url
+
+logger = setup_logger(__name__)
+
+# The processor of an inference worker process and the queue it reports progress to
+_worker_processor = None
+_worker_progress = None
+
+
+def _init_worker(processor_options: dict, progress_queue, threads=(0, 0)):
+    """Builds the processor of an inference worker process and loads its model."""
+    global _worker_processor, _worker_progress
+    configure_threads(*threads)
+    _worker_processor = TextProcessor(**processor_options)
+    _worker_progress = progress_queue
+    model_registry.warmup(_worker_processor.models(), _worker_processor.backend)
+
+
+def _worker_ready() -> dict:
+    """Runs in a worker process once its initializer has loaded the model, returns its memory usage."""
+    return {"pid": os.getpid(), **memory_usage()}
+
+
+def _process_in_worker(content: Content, job_id=None, chapter=None) -> tuple:
+    """
+    Runs the processor in a worker process.
+
+    Returns:
+        tuple: The SummaryResult and the seconds of every stage (chunking, inference, ...), which the metrics
+            of the worker process would never export; the service records them in the request's trace.
+    """
+    def report(progress):
+        if job_id is not None:
+            _worker_progress.put((job_id, progress))
+
+    with activate(Trace()) as trace:
+        result = _drain(_worker_processor.iter_process(content, chapter), report)
+    return result, trace.stages
+
+
+def _drain(items, report) -> SummaryResult:
+    """Consumes `Processor.iter_process`, passing progress to `report` and returning the final result."""
+    result = None
+    for item in items:
+        if isinstance(item, SummaryProgress):
+            report(item)
+        else:
+            result = item
+    return result
+
+
+def _count_result(source_type: str, result: SummaryResult):
+    """Counts the request and, from its levels, the chunks and tokens (also for processors in worker processes)."""
+    count("requests", source=source_type, outcome="error" if result.error_message else "ok")
+    if result.model:
+        count("summaries", language=result.language or "unknown", model=result.model)
+    for level in result.levels or []:
+        count("chunks", level.chunks or 0)
+        count("chunk_cache_hits", level.cached or 0)
+        count("tokens", level.input_tokens or 0, direction="input")
+        count("tokens", level.output_tokens or 0, direction="output")
+
+
+def _flight_key(source_string: str, chapter=None) -> str:
+    key = canonicalize_url(source_string)
+    return key if chapter is None else f"{key}#chapter={chapter}"
+
+
+def _select_chapter(result: SummaryResult, chapter: int) -> SummaryResult:
+    """Narrows the summary of a whole video to one of its chapters."""
+    if result.error_message:
+        return result
+    if not result.chapters or not 0 <= chapter < len(result.chapters):
+        return SummaryResult(error_message=f"No chapter {chapter} in this video.")
+    return SummaryResult(summary=result.chapters[chapter].summary, chapters=[result.chapters[chapter]])
+
+
+class SummaryService:
+    """
+    Runs the fetch -> summarize pipeline without blocking the event loop.
+    Shared by the handlers so that they use the same models and limits.
+    """
+
+    def __init__(self, processor: Processor = None, max_concurrent_jobs=4, inference_workers=1, cache=None,
+                 inference_processes=0, intra_op_threads=0, inter_op_threads=0, share_model=False):
+        """
+        Initializes the service.
+
+        Args:
+            processor (Processor, optional): The processor used for every request. Defaults to TextProcessor.
+            max_concurrent_jobs (int): How many requests are fetched and summarized at the same time.
+            inference_workers (int): Size of the executor running the CPU-bound processor.
+            cache (SummaryCache, optional): Where finished summaries are stored and looked up.
+            inference_processes (int): If set, the processor runs in this many worker processes
+                (each with its own copy of the model) instead of `inference_workers` threads.
+            intra_op_threads (int): Threads used inside one model operator, per process. 0 keeps the library default
+                (with `share_model`, 0 splits the cores between the processes).
+            inter_op_threads (int): Threads running independent model operators, per process. 0 keeps the default.
+            share_model (bool): Load the model once in this process and fork the worker processes from it, so that
+                they share its weights copy-on-write instead of loading a copy each. Needs the fork start method
+                and a backend of FORK_SAFE_BACKENDS, else every worker loads its own model.
+        """
+        self.processor = processor or TextProcessor()
+        self.cache = cache
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self._semaphore = None
+        self._in_flight = SingleFlight()
+        self._queued = {}  # flight key -> future of a request waiting in (or running from) a handler queue
+        self._progress_queue = None
+        self._listeners = {}  # job ID -> (loop, progress callback) of jobs running in worker processes
+        self._job_ids = itertools.count()
+        self.inference_processes = inference_processes
+        self.share_model = bool(inference_processes and share_model and self._can_share_model())
+        self._preload_lock = threading.Lock()
+        self._preloaded = False
+        if inference_processes:
+            context = None
+            if self.share_model:
+                context = multiprocessing.get_context("fork")
+                if not intra_op_threads:
+                    # The workers inherit the single thread the model is loaded with, give each its share of the cores
+                    intra_op_threads = max((os.cpu_count() or 1) // inference_processes, 1)
+            self._progress_queue = (context or multiprocessing).Queue()
+            self._executor = ProcessPoolExecutor(
+                max_workers=inference_processes,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(self.processor.options(), self._progress_queue, (intra_op_threads, inter_op_threads)),
+            )
+            threading.Thread(target=self._dispatch_progress, name="progress", daemon=True).start()
+        else:
+            configure_threads(intra_op_threads, inter_op_threads)
+            self._executor = ThreadPoolExecutor(max_workers=inference_workers, thread_name_prefix="inference")
+
+    def warmup(self, model_names):
+        """
+        Loads the models before the first request needs them. Blocks, so the bot runs it in the background.
+
+        Args:
+            model_names (list): Models to load in this process, along with the models of the processor.
+                Worker processes not sharing this process' models load the ones of the processor instead.
+        """
+        if not self.inference_processes:
+            model_registry.warmup(self._models(model_names), getattr(self.processor, "backend", DEFAULT_BACKEND))
+            return
+        self._preload(model_names)
+        # Worker processes start on demand, keep them all busy at once so that every one of them starts
+        futures = [self._executor.submit(_worker_ready) for _ in range(self.inference_processes)]
+        for future in futures:
+            usage = future.result()
+            if usage.get("pss") is not None:
+                logger.info(f"Inference worker {usage['pid']}: RSS {usage['rss'] / 2 ** 20:.0f} MB, "
+                            f"PSS {usage['pss'] / 2 ** 20:.0f} MB, private {usage['private'] / 2 ** 20:.0f} MB")
+
+    def _models(self, model_names=None) -> list:
+        """The models of the processor (its default model and the ones it routes languages to) and `model_names`."""
+        models = self.processor.models() if hasattr(self.processor, "models") else []
+        return list(dict.fromkeys([*models, *(model_names or [])]))
+
+    def _can_share_model(self) -> bool:
+        if "fork" not in multiprocessing.get_all_start_methods():
+            logger.warning("Cannot share the model between processes without fork, every worker loads its own")
+            return False
+        if getattr(self.processor, "backend", DEFAULT_BACKEND) not in FORK_SAFE_BACKENDS:
+            logger.warning(f"The {self.processor.backend} backend cannot be shared, every worker loads its own model")
+            return False
+        return True
+
+    def _preload(self, model_names=None):
+        """
+        Loads the model of the processor, the models it routes other languages to and the other `model_names`
+        before the first worker process is forked, so that the workers inherit them instead of loading a copy each.
+        The loading runs on a single thread: the OpenMP thread pool of PyTorch does not survive fork(),
+        the workers run the first inference after it.
+        """
+        if not self.share_model:
+            return
+        with self._preload_lock:
+            if self._preloaded:
+                return
+            configure_threads(1)
+            started = time.monotonic()
+            for model_name in self._models(model_names):
+                model_registry.get(model_name, self.processor.backend)
+            # Objects created so far are never collected, so the garbage collector does not write to
+            # (and thereby copy) the pages the workers share with this process
+            gc.freeze()
+            self._preloaded = True
+            logger.info(f"Models loaded for the inference processes in {time.monotonic() - started:.1f}s")
+
+    async def summarize(self, source_string: str, on_progress=None, chapter=None) -> tuple:
+        """
+        Fetches the source and summarizes it.
+
+        Args:
+            source_string (str): The URL sent by the user.
+            on_progress (callable, optional): Called in the event loop with every SummaryProgress.
+                Requests joining an identical request already in progress get no progress.
+            chapter (int, optional): Summarize only this chapter of a video (index into SummaryResult.chapters),
+                taken from the cached summary of the whole video if there is one.
+
+        Returns:
+            tuple: The fetched Content and the SummaryResult.
+
+        Raises:
+            ValueError: If the source type cannot be determined.
+        """
+        with stage("classify"):
+            source = SourceFactory.create_source(source_string)
+
+        # Identical requests arriving while one is being processed share its result
+        key = _flight_key(source_string, chapter)
+        return await self._in_flight.do(key, lambda: self._summarize(source, source_string, on_progress, chapter))
+
+    def join(self, source_string: str, chapter=None):
+        """
+        Joins an identical request already queued or being summarized, so that the handlers can wait
+        for it without taking a place in their queue or one of its workers.
+
+        Returns:
+            asyncio.Future: Resolves to the (Content, SummaryResult) of that request, None if there is none.
+        """
+        try:
+            key = _flight_key(source_string, chapter)
+        except ValueError:  # Not a URL, `summarize` reports it
+            return None
+        queued = self._queued.get(key)
+        if queued is not None:
+            self._in_flight.shared += 1
+            return asyncio.shield(queued)
+        return self._in_flight.join(key)
+
+    def track(self, source_string: str, future: asyncio.Future, chapter=None):
+        """
+        Registers the future of a request a handler queued (resolving to the result of `summarize`),
+        so that identical requests `join` it until it is done.
+        """
+        try:
+            key = _flight_key(source_string, chapter)
+        except ValueError:
+            return
+        self._queued[key] = future
+
+        def done(_):
+            if self._queued.get(key) is future:
+                del self._queued[key]
+
+        future.add_done_callback(done)
+
+    async def _summarize(self, source, source_string: str, on_progress=None, chapter=None) -> tuple:
+        source_type = type(source).__name__.replace("Source", "").lower()
+        if self.cache is not None:
+            with stage("cache_lookup"):
+                cached = await asyncio.to_thread(self.cache.get, source_string)
+            if cached is not None:
+                logger.info(f"Cache hit: {source_string}")
+                count("requests", source=source_type, outcome="cached")
+                content, result = cached
+                return content, result if chapter is None else _select_chapter(result, chapter)
+
+        # Created lazily so that it belongs to the loop the handler runs in
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_jobs)
+
+        waiting = time.perf_counter()
+        async with self._semaphore:
+            record("slot_wait", time.perf_counter() - waiting)
+            with stage("fetch"):
+                content = await asyncio.to_thread(source.get_content)
+            if content.error_message:
+                count("requests", source=source_type, outcome="error")
+                return content, SummaryResult(error_message=content.error_message)
+
+            with stage("summarize"):
+                result = await self.process(content, on_progress, chapter)
+
+        _count_result(source_type, result)
+        # A single chapter is not the summary of the URL
+        if self.cache is not None and not result.error_message and chapter is None:
+            await asyncio.to_thread(self.cache.set, source_string, content, result)
+        return content, result
+
+    async def process(self, content: Content, on_progress=None, chapter=None) -> SummaryResult:
+        """Runs the processor on the inference executor, passing its progress to `on_progress`."""
+        loop = asyncio.get_running_loop()
+        if self._progress_queue is None:
+            # Run in a copy of the context, so that the processor timings go to the trace of the request
+            context = contextvars.copy_context()
+            if on_progress is None and chapter is None:
+                return await loop.run_in_executor(self._executor, context.run, self.processor.process, content)
+
+            def report(progress):
+                if on_progress is not None:
+                    loop.call_soon_threadsafe(on_progress, progress)
+
+            return await loop.run_in_executor(
+                self._executor, context.run, _drain, self.processor.iter_process(content, chapter), report
+            )
+
+        if self.share_model and not self._preloaded:
+            await asyncio.to_thread(self._preload)  # Before the first fork
+        job_id = None
+        if on_progress is not None:
+            job_id = next(self._job_ids)
+            self._listeners[job_id] = (loop, on_progress)
+        try:
+            result, stages = await loop.run_in_executor(self._executor, _process_in_worker, content, job_id, chapter)
+        finally:
+            self._listeners.pop(job_id, None)
+        for name, seconds in stages.items():
+            record(name, seconds)
+        return result
+
+    def _dispatch_progress(self):
+        """Forwards progress reported by the worker processes to the event loop of the job."""
+        while True:
+            job_id, progress = self._progress_queue.get()
+            listener = self._listeners.get(job_id)
+            if listener is None:
+                continue
+            loop, on_progress = listener
+            try:
+                loop.call_soon_threadsafe(on_progress, progress)
+            except RuntimeError:
+                pass  # The loop is closed
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
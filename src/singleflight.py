@@ -0,0 +1,51 @@
+# singleflight.py
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller starts the job,
+    callers arriving while it runs wait for the same result (or exception).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.shared = 0  # How many calls joined a job that was already running
+
+    async def do(self, key, fn):
+        """
+        Runs `fn()` unless a job for `key` is already in progress.
+
+        Args:
+            key: Identifies identical jobs.
+            fn: A callable returning the coroutine to run.
+
+        Returns:
+            The result of the (shared) job.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.shared += 1
+
+        # A cancelled caller must not cancel the job the others are waiting for
+        return await asyncio.shield(task)
+
+    def join(self, key):
+        """
+        Joins the job for `key` if one is in progress.
+
+        Returns:
+            asyncio.Future: The (shielded) result of the job, None if there is no such job.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            return None
+        self.shared += 1
+        return asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        return len(self._calls)
@@ -1,25 +1,39 @@
 # sources.py
+import contextvars
+import time
 from abc import ABC, abstractmethod
-from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
-from bs4 import BeautifulSoup
-from langchain_community.document_loaders import YoutubeLoader
-from langchain_yt_dlp.youtube_loader import YoutubeLoaderDL
 
+from cache import LRUCache
+from extractors import ArticleExtractor
+from http_client import http_client
+from languages import normalize_language
 from logger import setup_logger
-from models import Content
+from metrics import record, stage
+from models import Content, Transcript
+from urls import extract_video_id
 
 logger = setup_logger(__name__)
 
-TRANSCRIPT_LANGUAGE = "ru,ru_auto,en,en_auto"  # a list of languages from highest priority to lowest
-TRANSCRIPT_TRANSLATE = "ru"  # The language you want the transcript to auto-translate to, if it does not already exist.
+# A list of languages from highest priority to lowest. Other videos get the transcript in their own
+# language, it is summarized by the model routed to that language (see languages.py), never translated.
+TRANSCRIPT_LANGUAGE = "ru,ru_auto,en,en_auto"
+
+_metadata_cache = LRUCache(max_entries=1024)  # Video metadata keyed by video ID
+_youtube_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="youtube")
 
 
 class Source(ABC):
     def __init__(self, source_string):
         self.source_string = source_string
 
+    @classmethod
+    def accepts(cls, url: str) -> bool:
+        """Tells whether the source can fetch the URL of one of its hosts, checked before it is created."""
+        return True
+
     @abstractmethod
     def get_content(self) -> Content:
         pass
@@ -30,43 +44,95 @@ class YouTubeSource(Source):
     def __init__(self, url):
         super().__init__(url)
 
+    @classmethod
+    def accepts(cls, url: str) -> bool:
+        return extract_video_id(url) is not None  # Channels and playlists have no transcript
+
     def get_content(self) -> Content:
+        # Imported on first use, it slows down the bot startup
+        from youtube_transcript_api import NoTranscriptFound, TranscriptsDisabled
+
         # Check if the URL is valid
-        if not self.source_string or self.source_string == "":
+        video_id = extract_video_id(self.source_string) if self.source_string else None
+        if not video_id:
             logger.error(f"Invalid YouTube URL: {self.source_string}")
             return Content(source_type="youtube", source_url=self.source_string, error_message=f"Invalid YouTube URL: {self.source_string}")
 
         try:
-            details = YoutubeLoaderDL.from_youtube_url(self.source_string, add_video_info=True).load()
-
-            if len(details) == 0:
-                logger.warning(f"Failed to get video details: {self.source_string}")
-                return Content(source_type="youtube", source_url=self.source_string, error_message="Failed to get video details")
-
-            image_url = details[0].metadata.get("thumbnail_url")
-
-            docs = YoutubeLoader.from_youtube_url(
-                self.source_string,
-                add_video_info=True,
-                language=TRANSCRIPT_LANGUAGE.split(","),
-                translation=TRANSCRIPT_TRANSLATE,
-            ).load()
+            # Video info and captions come from different endpoints, so fetch them concurrently
+            metadata_future = _youtube_executor.submit(contextvars.copy_context().run, self._get_metadata, video_id)
+            with stage("transcript"):
+                transcript, language = self._get_transcript(video_id)
+        except (TranscriptsDisabled, NoTranscriptFound) as e:
+            logger.warning(f"Subtitles could not be downloaded: {self.source_string} ({type(e).__name__})")
+            return Content(source_type="youtube", source_url=self.source_string, error_message="Subtitles could not be downloaded")
         except Exception as e:
             logger.exception(f"Error YouTube: {e}")
             return Content(source_type="youtube", source_url=self.source_string, error_message=f"Error YouTube: {e}")
 
-        if not docs:  # If the download failed
+        try:
+            metadata = metadata_future.result()
+        except Exception as e:  # Only the thumbnail, title and chapters are missing, the transcript is summarized
+            logger.warning(f"Video metadata could not be downloaded: {self.source_string} ({e})")
+            metadata = {}
+
+        # The segments are dropped here, only their timestamps are kept
+        transcript = Transcript.from_segments(transcript or [])
+        if not transcript.text:  # If the download failed
             logger.warning(f"Subtitles could not be downloaded: {self.source_string}")
             return Content(source_type="youtube", source_url=self.source_string, error_message="Subtitles could not be downloaded")
 
-        text = ""
-        for doc in docs:
-            try:
-                text += doc.page_content
-            except AttributeError:
-                logger.error(f"Error processing document: {doc}")
+        return Content(text=transcript.text, source_type="youtube", source_url=self.source_string,
+                       image_url=metadata.get("thumbnail_url"), metadata=metadata, transcript=transcript,
+                       language=normalize_language(language))
+
+    @staticmethod
+    def _get_transcript(video_id: str) -> tuple:
+        """
+        Returns the transcript pieces (`text`, `start`, `duration`) in the preferred language,
+        or else in the first language of the video, and the language code of the transcript.
+        """
+        from youtube_transcript_api import NoTranscriptFound, YouTubeTranscriptApi
 
-        return Content(text=text, source_type="youtube", source_url=self.source_string, image_url=image_url)
+        transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
+        try:
+            transcript = transcript_list.find_transcript(TRANSCRIPT_LANGUAGE.split(","))
+        except NoTranscriptFound:
+            # Manually created transcripts come first
+            transcript = next(iter(transcript_list), None)
+            if transcript is None:
+                raise
+
+        return transcript.fetch(), transcript.language_code
+
+    @staticmethod
+    def _get_metadata(video_id: str) -> dict:
+        """Returns the video metadata, extracted once per video ID."""
+        metadata = _metadata_cache.get(video_id)
+        if metadata is not None:
+            return metadata
+
+        from yt_dlp import YoutubeDL  # Imported on first use, it slows down the bot startup
+
+        with stage("metadata"), YoutubeDL({"quiet": True, "no_warnings": True, "skip_download": True}) as ydl:
+            # process=False skips format selection, which we do not need
+            info = ydl.extract_info(f"https://www.youtube.com/watch?v={video_id}", download=False, process=False)
+
+        thumbnail_url = info.get("thumbnail")
+        if not thumbnail_url and info.get("thumbnails"):
+            thumbnail_url = max(info["thumbnails"], key=lambda t: t.get("preference") or 0).get("url")
+
+        metadata = {
+            "video_id": video_id,
+            "title": info.get("title"),
+            "duration": info.get("duration"),
+            "thumbnail_url": thumbnail_url,
+            "language": info.get("language"),
+            "languages": sorted(info.get("subtitles") or {}),
+            "chapters": info.get("chapters") or [],
+        }
+        _metadata_cache.set(video_id, metadata)
+        return metadata
 
 
 class ArticleSource(Source):
@@ -75,23 +141,32 @@ class ArticleSource(Source):
 
     def get_content(self) -> Content:
         try:
-            response = requests.get(self.source_string)
-            response.raise_for_status()
-
-            soup = BeautifulSoup(response.content, 'html.parser')
-            paragraphs = soup.find_all('p')
-            text = "\n".join([p.get_text() for p in paragraphs])
-
-            image_url = None
-            img_tag = soup.find('img')
-            if img_tag and img_tag.get('src'):
-                image_url = img_tag.get('src')
-
-                if not image_url.startswith("http"):
-                    base_url = urlparse(self.source_string).scheme + "://" + urlparse(self.source_string).netloc
-                    image_url = base_url + image_url
-
-            return Content(text=text, source_type="article", source_url=self.source_string, image_url=image_url)
+            extractor = ArticleExtractor(self.source_string)
+            parsing = 0
+
+            def headers(response):
+                nonlocal extractor
+                # Pages often declare their charset only in the header, e.g. cp1251 ones
+                if response.encoding:
+                    extractor = ArticleExtractor(self.source_string, encoding=response.encoding)
+
+            def feed(data):
+                nonlocal parsing
+                started = time.perf_counter()
+                extractor.feed(data)
+                parsing += time.perf_counter() - started
+
+            # The page is parsed while it downloads. Unchanged articles are revalidated
+            # with ETag/Last-Modified instead of downloaded again.
+            started = time.perf_counter()
+            http_client.get(self.source_string, conditional=True, consumer=feed, on_headers=headers)
+            downloaded = time.perf_counter()
+            article = extractor.close()
+            record("download", downloaded - started - parsing)
+            record("parse", parsing + time.perf_counter() - downloaded)
+
+            return Content(text=article.text, source_type="article", source_url=self.source_string,
+                           image_url=article.image_url, metadata={"title": article.title})
 
         except requests.exceptions.RequestException as e:
             logger.error(f"Error loading the article: {e}")
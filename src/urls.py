@@ -0,0 +1,93 @@
+# urls.py
+import re
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+YOUTUBE_HOSTS = ("www.youtube.com", "youtube.com", "m.youtube.com", "music.youtube.com", "youtu.be")
+YOUTUBE_PATH_PREFIXES = ("/shorts/", "/embed/", "/live/", "/v/")
+
+# Query parameters that only track where the click came from
+TRACKING_PARAMS = ("fbclid", "gclid", "yclid", "mc_cid", "mc_eid", "igshid", "ref_src")
+
+# Links in free text: with a scheme, or starting with "www." or a YouTube host
+URL_PATTERN = re.compile(r"(?:https?://|\bwww\.|\b(?:m\.|music\.)?youtube\.com/|\byoutu\.be/)[^\s<>\"']+", re.IGNORECASE)
+TRAILING_PUNCTUATION = ".,;:!?)]}»\"'"
+
+
+def extract_urls(text: str) -> list:
+    """
+    Finds the links in a message.
+
+    Args:
+        text (str): The message, e.g. "Look at this: youtu.be/dQw4w9WgXcQ and https://example.com/a."
+
+    Returns:
+        list: The URLs with a scheme, in order of appearance and without duplicates (by canonical URL).
+    """
+    urls, seen = [], set()
+    for match in URL_PATTERN.finditer(text or ""):
+        url = match.group()
+        while url[-1] in TRAILING_PUNCTUATION:
+            if url[-1] == ")" and url.count("(") >= url.count(")"):
+                break  # e.g. a Wikipedia link with parentheses
+            url = url[:-1]
+        if not url.lower().startswith(("http://", "https://")):
+            url = "https://" + url
+        key = canonicalize_url(url)
+        if key not in seen:
+            seen.add(key)
+            urls.append(url)
+    return urls
+
+
+def extract_video_id(url: str):
+    """
+    Extracts the video ID from a YouTube URL.
+
+    Args:
+        url (str): The YouTube URL.
+
+    Returns:
+        str: The video ID, or None if the URL does not point to a video.
+    """
+    parsed_url = urlparse(url.strip())
+    host = (parsed_url.hostname or "").lower()
+    if host not in YOUTUBE_HOSTS:
+        return None
+
+    if host == "youtu.be":
+        video_id = parsed_url.path.lstrip("/").split("/")[0]
+    elif parsed_url.path == "/watch":
+        video_id = dict(parse_qsl(parsed_url.query)).get("v")
+    else:
+        video_id = None
+        for prefix in YOUTUBE_PATH_PREFIXES:
+            if parsed_url.path.startswith(prefix):
+                video_id = parsed_url.path[len(prefix):].split("/")[0]
+                break
+    return video_id or None
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Returns one canonical form for URLs that point to the same content.
+    YouTube links (youtu.be, shorts, `&t=` offsets, ...) become `https://www.youtube.com/watch?v=<id>`,
+    other links lose their fragment, tracking parameters and parameter order.
+
+    Args:
+        url (str): The URL sent by the user.
+
+    Returns:
+        str: The canonical URL.
+    """
+    url = url.strip()
+    video_id = extract_video_id(url)
+    if video_id:
+        return f"https://www.youtube.com/watch?v={video_id}"
+
+    parsed_url = urlparse(url)
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parsed_url.query, keep_blank_values=True)
+        if not key.startswith("utm_") and key not in TRACKING_PARAMS
+    )
+    path = parsed_url.path.rstrip("/") or "/"
+    return urlunparse((parsed_url.scheme.lower(), parsed_url.netloc.lower(), path, parsed_url.params, urlencode(query), ""))
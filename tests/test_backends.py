@@ -0,0 +1,41 @@
+# tests/test_backends.py
+from unittest.mock import patch, MagicMock
+
+import pytest
+
+from src.backends import check_backend, optimize, pipeline_arguments
+from src.registry import ModelRegistry
+
+
+def test_check_backend_rejects_unknown_backend():
+    assert check_backend("quantized") == "quantized"
+    with pytest.raises(ValueError):
+        check_backend("tensorrt")
+
+
+def test_pytorch_backends_load_the_model_by_name():
+    assert pipeline_arguments("model-a", "eager") == {"model": "model-a"}
+    assert pipeline_arguments("model-a", "quantized") == {"model": "model-a"}
+
+
+def test_eager_backend_keeps_the_pipeline():
+    summarizer = MagicMock()
+    model = summarizer.model
+    assert optimize(summarizer, "eager") is summarizer
+    assert summarizer.model is model
+
+
+@patch('src.registry.optimize', side_effect=lambda summarizer, backend: summarizer)
+@patch('src.registry.pipeline')
+def test_registry_keeps_backends_side_by_side(mock_pipeline, mock_optimize):
+    mock_pipeline.side_effect = lambda task, model: MagicMock(name=model)
+    registry = ModelRegistry()
+
+    eager = registry.get("model-a")
+    quantized = registry.get("model-a", "quantized")
+
+    assert eager is not quantized
+    assert registry.get("model-a", "quantized") is quantized
+    assert sorted(registry.loaded_models()) == ["model-a", "model-a:quantized"]
+    assert registry.stats()["model-a:quantized"].backend == "quantized"
+    mock_optimize.assert_any_call(quantized, "quantized")
@@ -0,0 +1,64 @@
+# tests/test_batch.py
+import io
+import json
+from unittest.mock import patch, MagicMock
+
+from src.batch import BatchRunner, load_done, read_requests, request_key
+from src.chunkers import WhitespaceTokenizer
+from src.models import Content
+
+
+def fake_source(url):
+    source = MagicMock()
+    if url.endswith("/broken"):
+        source.get_content.return_value = Content(source_url=url, error_message="Error loading the article")
+    else:
+        source.get_content.return_value = Content(text=f"Text of {url}.", source_type="article", source_url=url)
+    return source
+
+
+def test_read_requests_accepts_json_and_plain_urls():
+    lines = ['{"url": "https://example.com/a", "id": 1}', "https://example.com/b", "", "# comment", "{broken", '{"id": 2}']
+    requests = list(read_requests(lines))
+    assert requests == [{"url": "https://example.com/a", "id": 1}, {"url": "https://example.com/b"}]
+    assert request_key(requests[0]) == "1"
+    assert request_key({"url": "https://example.com/b/?utm_source=x"}) == "https://example.com/b"
+
+
+def test_load_done_removes_incomplete_last_line(tmp_path):
+    path = tmp_path / "out.jsonl"
+    path.write_text('{"url": "https://example.com/a", "summary": "A"}\n'
+                    '{"url": "https://example.com/b", "error": "Failed"}\n'
+                    '{"url": "https://example.com/c", "summ')
+
+    assert load_done(str(path)) == {"https://example.com/a", "https://example.com/b"}
+    assert load_done(str(path), retry_errors=True) == {"https://example.com/a"}
+    assert path.read_text().endswith("\n")
+
+
+@patch('registry.pipeline')
+@patch('src.batch.SourceFactory.create_source', side_effect=fake_source)
+def test_batch_runner_batches_chunks_across_documents(mock_create_source, mock_pipeline):
+    mock_summarizer = MagicMock()
+    mock_summarizer.side_effect = lambda chunks, **kwargs: [{'summary_text': f"Summary: {chunk}"} for chunk in chunks]
+    mock_summarizer.tokenizer = WhitespaceTokenizer()
+    mock_pipeline.return_value = mock_summarizer
+    options = {"summarizer_model": "batch-test-model", "batch_size": 8}
+    runner = BatchRunner(options, fetch_workers=4, processes=0, group_size=4)
+    requests = [{"url": f"https://example.com/{i}", "id": i} for i in range(6)] + [{"url": "https://example.com/broken"}]
+    output = io.StringIO()
+
+    try:
+        stats = runner.run(requests, output)
+    finally:
+        runner.close()
+
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert stats["documents"] == 7
+    assert stats["errors"] == 1
+    assert sorted(record.get("id", -1) for record in records) == [-1, 0, 1, 2, 3, 4, 5]
+    assert {record["summary"] for record in records if "id" in record} == {
+        f"Summary: Text of https://example.com/{i}." for i in range(6)
+    }
+    # Groups of 4 and 2 documents, one forward pass each (the inference warmup is the first call)
+    assert [len(call.args[0]) for call in mock_summarizer.call_args_list[1:]] == [4, 2]
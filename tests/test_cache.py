@@ -0,0 +1,81 @@
+# tests/test_cache.py
+
+from src.cache import ChunkStore, LRUCache, SummaryCache
+from src.models import Content, SummaryLevel, SummaryResult
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert "a" in cache
+    assert "b" not in cache
+    assert cache.get("c") == 3
+
+
+def test_summary_cache_round_trip_with_url_variants():
+    cache = SummaryCache()
+    content = Content(text="Test text", source_type="youtube", source_url="https://youtu.be/dQw4w9WgXcQ")
+    result = SummaryResult(summary="Test summary", levels=[SummaryLevel(level=1, chunks=1, cached=0, seconds=0.1)])
+    cache.set("https://youtu.be/dQw4w9WgXcQ", content, result)
+
+    cached = cache.get("https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=10s")
+
+    assert cached is not None
+    cached_content, cached_result = cached
+    assert cached_content.text == "Test text"
+    assert cached_result.summary == "Test summary"
+    assert cached_result.levels[0].chunks == 1
+    assert cache.stats() == {"hits": 1, "misses": 0, "entries": 1}
+
+
+def test_summary_cache_expires_entries():
+    cache = SummaryCache(ttl=-1)
+    cache.set("https://www.example.com/article", Content(text="Test text"), SummaryResult(summary="Test summary"))
+    assert cache.get("https://www.example.com/article") is None
+    assert cache.stats() == {"hits": 0, "misses": 1, "entries": 0}
+
+
+def test_summary_cache_evicts_least_recently_used(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = SummaryCache(path, max_entries=2)
+    for name in ("a", "b"):
+        cache.set(f"https://www.example.com/{name}", Content(text=name), SummaryResult(summary=name))
+    cache.get("https://www.example.com/a")
+    cache.set("https://www.example.com/c", Content(text="c"), SummaryResult(summary="c"))
+    cache.close()
+
+    reopened = SummaryCache(path, max_entries=2)  # Entries survive a restart
+    assert reopened.get("https://www.example.com/b") is None
+    assert reopened.get("https://www.example.com/a")[1].summary == "a"
+    assert reopened.get("https://www.example.com/c")[1].summary == "c"
+
+
+def test_chunk_store_persists_and_evicts(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.cache.EVICTION_INTERVAL", 1)
+    monkeypatch.setattr("src.cache.TOUCH_INTERVAL", -1)  # Every hit updates the access time
+    path = str(tmp_path / "chunks.db")
+    store = ChunkStore(path, max_entries=2, memory_entries=1)
+    store.set("a", "Summary a")
+    store.set("b", "Summary b")
+    assert store.get("a") == "Summary a"  # Read from the database, "b" is the one in memory
+    store.set("c", "Summary c")
+    store.close()
+
+    reopened = ChunkStore(path, max_entries=2)  # Shared with other processes and restarts
+    assert reopened.get("b") is None
+    assert reopened.get("a") == "Summary a"
+    assert "c" in reopened
+    assert reopened.stats() == {"hits": 1, "misses": 1, "entries": 2}
+
+
+def test_chunk_store_hits_do_not_write(tmp_path):
+    path = str(tmp_path / "chunks.db")
+    ChunkStore(path).set("a", "Summary a")
+
+    store = ChunkStore(path)  # Another process, nothing in memory
+    changes = store._db().total_changes
+    assert store.get("a") == "Summary a"
+    assert store._db().total_changes == changes
@@ -0,0 +1,48 @@
+# tests/test_chunkers.py
+
+import pytest
+
+from src.chunkers import TokenChunker, split_sentences
+
+
+def test_split_sentences():
+    assert split_sentences("First one. Second one! Third? ") == ["First one.", "Second one!", "Third?"]
+
+
+def test_chunker_packs_whole_sentences():
+    chunker = TokenChunker(max_tokens=10)
+    text = "One two three four. Five six seven eight. Nine ten eleven twelve."
+    chunks = chunker.split(text)
+    assert chunks == ["One two three four. Five six seven eight.", "Nine ten eleven twelve."]
+
+
+def test_chunker_splits_unpunctuated_text_on_words():
+    chunker = TokenChunker(max_tokens=10)
+    chunks = chunker.split(" ".join(["word"] * 35))
+    assert len(chunks) == 4
+    assert all(len(chunk.split()) <= 10 for chunk in chunks)
+
+
+def test_chunker_overlap_repeats_trailing_sentences():
+    chunker = TokenChunker(max_tokens=10, overlap_tokens=4)
+    text = "One two three four. Five six seven eight. Nine ten eleven twelve."
+    chunks = chunker.split(text)
+    assert chunks[1].startswith("Five six seven eight.")
+    assert chunks[-1].endswith("Nine ten eleven twelve.")
+
+
+def test_chunker_rejects_overlap_larger_than_chunk():
+    with pytest.raises(ValueError):
+        TokenChunker(max_tokens=10, overlap_tokens=10)
+
+
+def test_chunks_are_offsets_into_the_text():
+    chunker = TokenChunker(max_tokens=10)
+    text = "  One two three four. Five six seven eight.  Nine ten eleven twelve. "
+    chunks = chunker.chunks(text)
+
+    assert list(chunks) == ["One two three four. Five six seven eight.", "Nine ten eleven twelve."]
+    assert [text[slice(*chunks.span(i))] for i in range(len(chunks))] == list(chunks)
+    assert list(chunks.tokens) == [8, 4]
+    assert chunks.total_tokens == 12
+    assert chunker.chunks(text, start=text.index("Nine")).total_tokens == 4
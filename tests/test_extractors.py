@@ -0,0 +1,56 @@
+# tests/test_extractors.py
+
+from src.extractors import ArticleExtractor, extract_article
+
+PAGE = b"""<html>
+<head>
+  <title>Test article</title>
+  <meta property="og:image" content="/images/preview.jpg">
+  <script>var tracking = "<p>not text</p>";</script>
+</head>
+<body>
+  <header><p>Site header</p><img src="/logo.png"></header>
+  <nav><p>Home, News, Sports, Weather</p></nav>
+  <div class="sidebar"><p>Popular now</p></div>
+  <div class="article-content">
+    <p>First paragraph of the article, with a comma.</p>
+    <p>Second paragraph of the article, with another comma, and one more.</p>
+    <blockquote><p>A quoted paragraph.</p></blockquote>
+  </div>
+  <footer><p>Copyright, all rights reserved</p></footer>
+</body>
+</html>"""
+
+
+def test_extractor_keeps_main_content_only():
+    article = extract_article(PAGE, "https://www.example.com/news/article")
+    assert article.title == "Test article"
+    assert article.text == (
+        "First paragraph of the article, with a comma.\n"
+        "Second paragraph of the article, with another comma, and one more.\n"
+        "A quoted paragraph."
+    )
+
+
+def test_extractor_prefers_og_image():
+    article = extract_article(PAGE, "https://www.example.com/news/article")
+    assert article.image_url == "https://www.example.com/images/preview.jpg"
+
+
+def test_extractor_resolves_image_relative_to_page():
+    html = b"<html><body><article><p>Test text</p><img src='image.jpg'></article></body></html>"
+    article = extract_article(html, "https://www.example.com/news/article")
+    assert article.image_url == "https://www.example.com/news/image.jpg"
+
+
+def test_extractor_incremental_feed():
+    extractor = ArticleExtractor("https://www.example.com/news/article")
+    for i in range(0, len(PAGE), 7):
+        extractor.feed(PAGE[i:i + 7])
+    assert extractor.close() == extract_article(PAGE, "https://www.example.com/news/article")
+
+
+def test_extractor_empty_page():
+    article = extract_article(b"", "https://www.example.com/")
+    assert article.text == ""
+    assert article.image_url is None
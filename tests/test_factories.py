@@ -24,3 +24,21 @@ def test_source_factory_valid_url(url, expected_class):
 def test_source_factory_invalid_url(invalid_url):
     with pytest.raises(ValueError):  # Expect a ValueError
         SourceFactory.create_source(invalid_url)
+
+
+@pytest.mark.parametrize("url, expected_class", [
+    ("https://m.youtube.com/watch?v=dQw4w9WgXcQ", "YouTubeSource"),
+    ("https://youtube.com/shorts/dQw4w9WgXcQ", "YouTubeSource"),
+    ("https://music.youtube.com/watch?v=dQw4w9WgXcQ", "YouTubeSource"),
+    ("HTTPS://WWW.YOUTUBE.COM/watch?v=dQw4w9WgXcQ", "YouTubeSource"),
+    ("https://www.youtube.com:443/watch?v=dQw4w9WgXcQ", "YouTubeSource"),
+    ("https://news.example.com/2024/article", "ArticleSource"),
+])
+def test_source_factory_dispatches_by_host(url, expected_class):
+    assert type(SourceFactory.create_source(url)).__name__ == expected_class
+
+
+def test_source_factory_rejects_unsupported_links_of_known_hosts():
+    with pytest.raises(ValueError):
+        SourceFactory.create_source("https://www.youtube.com/@channel")
+
@@ -0,0 +1,213 @@
+# tests/test_handlers.py
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from src.handlers import ApiHandler, JobQueue, TelegramHandler, format_chapters  # The JobQueue the handler catches QueueFullError of
+from src.metrics import Trace
+from src.models import ChapterSummary, Content, SummaryResult
+from src.services import SummaryService
+
+
+class FakeService:
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.calls = []
+
+    def join(self, source_string, chapter=None):
+        return None
+
+    def track(self, source_string, future, chapter=None):
+        pass
+
+    async def summarize(self, source_string, on_progress=None, chapter=None):
+        self.calls.append(source_string)
+        await asyncio.sleep(self.delay)
+        if source_string == "invalid-url":
+            raise ValueError("Cannot determine source type")
+        if source_string.endswith("/broken"):
+            return Content(error_message="Error loading the article"), SummaryResult(error_message="Error loading the article")
+        content = Content(text="Text", source_type="article", source_url=source_string, image_url="https://example.com/a.jpg")
+        return content, SummaryResult(summary=f"Summary of {source_string}")
+
+
+def call_api(handler, requests):
+    """Runs the coroutine functions in `requests` against the handler's app, returning their results."""
+    async def run():
+        async with TestClient(TestServer(handler.application)) as client:
+            results = []
+            for request in requests:
+                results.append(await request(client))
+            return results
+
+    return asyncio.run(run())
+
+
+async def post(client, payload, **kwargs):
+    response = await client.post("/summarize", json=payload, **kwargs)
+    return response.status, await response.json()
+
+
+def test_api_summarize_single_url():
+    handler = ApiHandler(service=FakeService(), jobs=JobQueue(workers=2))
+
+    [(status, body)] = call_api(handler, [lambda client: post(client, {"url": "https://example.com/a"})])
+
+    assert status == 200
+    assert body["summary"] == "Summary of https://example.com/a"
+    assert body["source_type"] == "article"
+    assert body["source_url"] == "https://example.com/a"
+    assert body["image_url"] == "https://example.com/a.jpg"
+
+
+def test_api_summarize_errors():
+    handler = ApiHandler(service=FakeService(), jobs=JobQueue(workers=2))
+
+    results = call_api(handler, [
+        lambda client: post(client, {"url": "invalid-url"}),
+        lambda client: post(client, {"url": "https://example.com/broken"}),
+        lambda client: post(client, {"nothing": True}),
+    ])
+
+    assert [status for status, _ in results] == [400, 422, 400]
+    assert all("error" in body for _, body in results)
+
+
+def test_api_batch_runs_concurrently_in_order():
+    service = FakeService(delay=0.2)
+    handler = ApiHandler(service=service, jobs=JobQueue(workers=4))
+    urls = [f"https://example.com/{i}" for i in range(4)] + ["https://example.com/broken"]
+
+    async def timed(client):
+        started = asyncio.get_running_loop().time()
+        result = await post(client, {"urls": urls})
+        return result, asyncio.get_running_loop().time() - started
+
+    [((status, body), seconds)] = call_api(handler, [timed])
+
+    assert status == 200
+    assert [result["url"] for result in body["results"]] == urls
+    assert [result["status"] for result in body["results"]] == ["done"] * 4 + ["error"]
+    assert seconds < 0.7  # Five requests of 0.2s on four workers
+
+
+def test_api_batch_is_not_limited_by_the_per_chat_limit():
+    handler = ApiHandler(service=FakeService(), jobs=JobQueue())  # The default limits, 5 per chat
+    urls = [f"https://example.com/{i}" for i in range(20)]
+
+    [(status, body)] = call_api(handler, [lambda client: post(client, {"urls": urls})])
+
+    assert status == 200
+    assert [result["status"] for result in body["results"]] == ["done"] * 20
+
+
+def test_api_async_job_polling():
+    handler = ApiHandler(service=FakeService(delay=0.1), jobs=JobQueue(workers=1))
+
+    async def submit_and_poll(client):
+        status, job = await post(client, {"url": "https://example.com/a", "async": True})
+        assert status == 202
+        assert job["status"] in ("queued", "running")
+        while job["status"] not in ("done", "error"):
+            await asyncio.sleep(0.02)
+            response = await client.get(f"/jobs/{job['job_id']}")
+            job = await response.json()
+        missing = await client.get("/jobs/unknown")
+        return job, missing.status
+
+    [(job, missing_status)] = call_api(handler, [submit_and_poll])
+
+    assert job["status"] == "done"
+    assert job["summary"] == "Summary of https://example.com/a"
+    assert missing_status == 404
+
+
+def test_api_rejects_requests_over_the_queue_limit():
+    handler = ApiHandler(service=FakeService(delay=0.2), jobs=JobQueue(workers=1, max_size=1, max_per_chat=1))
+
+    async def flood(client):
+        return await asyncio.gather(*(post(client, {"url": f"https://example.com/{i}"}) for i in range(4)))
+
+    [results] = call_api(handler, [flood])
+
+    assert 503 in [status for status, _ in results]
+    assert 200 in [status for status, _ in results]
+
+
+def test_api_batch_rejected_by_a_full_queue():
+    handler = ApiHandler(service=FakeService(), jobs=JobQueue(workers=1, max_size=0))
+
+    [(status, body)] = call_api(handler, [
+        lambda client: post(client, {"urls": ["https://example.com/a", "https://example.com/b"]}),
+    ])
+
+    assert status == 200
+    assert [result["status"] for result in body["results"]] == ["error", "error"]
+    assert all("error" in result for result in body["results"])
+
+
+def test_format_chapters_splits_messages_between_chapters():
+    chapters = [ChapterSummary(title=None, start=i * 600.0, end=(i + 1) * 600.0, summary="word " * 300) for i in range(8)]
+
+    messages = format_chapters(chapters)
+
+    assert messages[0].startswith("0:00 - 10:00\nword")
+    assert len(messages) > 1
+    assert all(len(message) <= 4096 for message in messages)
+    assert sum(message.count("\nword") for message in messages) == 8
+    assert "1:10:00 - 1:20:00" in messages[-1]
+
+
+def test_telegram_handler_summarizes_every_link_of_a_message_concurrently():
+    handler = TelegramHandler("123456:TEST", service=FakeService(), jobs=JobQueue(workers=2))
+    started = []
+
+    async def handle(chat_id, source_string, trace):
+        started.append(source_string)
+        await asyncio.sleep(0.1)
+        assert len(started) == 2  # Both links are in progress at the same time
+
+    handler._handle_message = handle
+    update = MagicMock()
+    update.message.text = "Compare https://example.com/a with youtu.be/dQw4w9WgXcQ, please"
+    asyncio.run(handler.handle_message(update, None))
+
+    assert started == ["https://example.com/a", "https://youtu.be/dQw4w9WgXcQ"]
+
+
+class TimedSource:
+    def __init__(self, url):
+        self.url = url
+
+    def get_content(self):
+        time.sleep(0.5 if self.url.endswith("/viral") else 0)
+        return Content(text=f"Text of {self.url}", source_type="test", source_url=self.url)
+
+
+@patch('src.services.SourceFactory.create_source', side_effect=TimedSource)
+def test_telegram_identical_requests_do_not_hold_the_queue(mock_create_source):
+    processor = MagicMock()
+    processor.iter_process.side_effect = lambda content, chapter=None: iter([SummaryResult(summary="Test summary")])
+    handler = TelegramHandler("123456:TEST", service=SummaryService(processor), jobs=JobQueue(workers=2))
+    handler.bot = MagicMock(send_message=AsyncMock())
+    seconds = {}
+
+    async def send(chat_id, url):
+        started = time.monotonic()
+        await handler._handle_message(chat_id, url, Trace())
+        seconds[chat_id] = time.monotonic() - started
+
+    async def run():
+        viral = [asyncio.ensure_future(send(chat_id, "https://example.com/viral")) for chat_id in range(4)]
+        await asyncio.sleep(0.05)
+        await send(10, "https://example.com/other")
+        await asyncio.gather(*viral)
+
+    asyncio.run(run())
+
+    assert seconds[10] < 0.3  # Another chat is served while the viral link is summarized
+    assert processor.iter_process.call_count == 2  # The viral link once
+    texts = [call.kwargs["text"] for call in handler.bot.send_message.call_args_list]
+    assert texts.count("Test summary") == 5
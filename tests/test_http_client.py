@@ -0,0 +1,102 @@
+# tests/test_http_client.py
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from src.http_client import DownloadTimeout, HttpClient, ResponseTooLarge, header_charset
+
+PAGE = b"<html><body><p>Test text</p></body></html>"
+
+
+class ArticleServerHandler(BaseHTTPRequestHandler):
+    requests_seen = []
+
+    def do_GET(self):
+        self.requests_seen.append((self.path, dict(self.headers)))
+        if self.path == "/article":
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", str(len(PAGE)))
+            self.end_headers()
+            self.wfile.write(PAGE)
+        elif self.path == "/large":
+            self.send_response(200)  # No Content-Length, the size is only known while streaming
+            self.end_headers()
+            self.wfile.write(b"x" * 4096)
+        elif self.path == "/trickle":
+            self.send_response(200)
+            self.end_headers()
+            try:
+                for _ in range(50):  # A byte at a time, each well within the read timeout
+                    self.wfile.write(b"x")
+                    self.wfile.flush()
+                    time.sleep(0.1)
+            except OSError:
+                pass  # The client gave up
+        else:
+            self.send_response(404)
+            self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    ArticleServerHandler.requests_seen = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), ArticleServerHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_http_client_conditional_request(server):
+    client = HttpClient(retries=0)
+
+    first = client.get(f"{server}/article", conditional=True)
+    second = client.get(f"{server}/article", conditional=True)
+
+    assert first.content == PAGE
+    assert not first.from_cache
+    assert second.content == PAGE
+    assert second.from_cache
+    assert ArticleServerHandler.requests_seen[1][1].get("If-None-Match") == '"v1"'
+
+
+def test_http_client_max_bytes(server):
+    client = HttpClient(retries=0)
+    with pytest.raises(ResponseTooLarge):
+        client.get(f"{server}/large", max_bytes=1024)
+    with pytest.raises(ResponseTooLarge):
+        client.get(f"{server}/article", max_bytes=10)  # Rejected from Content-Length
+
+
+def test_http_client_error_status(server):
+    client = HttpClient(retries=0)
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.get(f"{server}/missing")
+
+
+def test_http_client_download_timeout(server):
+    client = HttpClient(retries=0, download_timeout=0.5)
+    started = time.monotonic()
+    with pytest.raises(DownloadTimeout):
+        client.get(f"{server}/trickle")
+    assert time.monotonic() - started < 2
+
+
+def test_header_charset():
+    assert header_charset({"Content-Type": "text/html; charset=windows-1251"}) == "windows-1251"
+    assert header_charset({"Content-Type": 'text/html; Charset="UTF-8"'}) == "UTF-8"
+    assert header_charset({"Content-Type": "text/html"}) is None  # The page may declare it
+    assert header_charset({"Content-Type": "text/html; charset=bogus"}) is None
+    assert header_charset({}) is None
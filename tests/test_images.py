@@ -0,0 +1,111 @@
+# tests/test_images.py
+import asyncio
+import io
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from telegram.error import BadRequest, Forbidden
+
+from src.http_client import HttpResponse
+from src.images import PhotoSender, fit_image
+
+
+def fake_bot():
+    bot = MagicMock()
+
+    async def send_photo(chat_id, photo, caption=None):
+        await asyncio.sleep(0)
+        return MagicMock(photo=[MagicMock(file_id="small"), MagicMock(file_id="large")])
+
+    bot.send_photo = AsyncMock(side_effect=send_photo)
+    return bot
+
+
+def test_photo_sender_reuses_the_file_id():
+    client = MagicMock()
+    client.get.return_value = HttpResponse(content=b"image bytes")
+    sender = PhotoSender(client=client)
+    bot = fake_bot()
+
+    async def send_to_chats():
+        # Concurrent requests for the same image download and upload it once
+        await asyncio.gather(*(sender.send(bot, chat_id, "https://example.com/a.jpg", "Summary") for chat_id in (1, 2)))
+        await sender.send(bot, 3, "https://example.com/a.jpg", "Summary")
+
+    asyncio.run(send_to_chats())
+
+    client.get.assert_called_once()
+    photos = [(call.kwargs["chat_id"], call.kwargs["photo"]) for call in bot.send_photo.call_args_list]
+    assert photos == [(1, b"image bytes"), (2, "large"), (3, "large")]
+
+
+def test_photo_sender_uploads_itself_when_the_first_upload_fails():
+    client = MagicMock()
+    client.get.return_value = HttpResponse(content=b"image bytes")
+    sender = PhotoSender(client=client)
+    bot = fake_bot()
+    upload = bot.send_photo.side_effect
+
+    async def send_photo(chat_id, photo, caption=None):
+        if chat_id == 1:
+            await asyncio.sleep(0)
+            raise Forbidden("Bot was blocked by the user")
+        return await upload(chat_id, photo, caption)
+
+    bot.send_photo.side_effect = send_photo
+
+    async def send_to_chats():
+        return await asyncio.gather(*(sender.send(bot, chat_id, "https://example.com/a.jpg") for chat_id in (1, 2)),
+                                    return_exceptions=True)
+
+    blocked, sent = asyncio.run(send_to_chats())
+
+    assert isinstance(blocked, Forbidden)
+    assert sent.photo[-1].file_id == "large"
+    assert bot.send_photo.call_args.kwargs == {"chat_id": 2, "photo": b"image bytes", "caption": None}
+
+
+def test_photo_sender_uploads_again_when_the_file_id_is_rejected():
+    client = MagicMock()
+    client.get.return_value = HttpResponse(content=b"image bytes")
+    sender = PhotoSender(client=client)
+    sender.file_ids.set("https://example.com/a.jpg", "expired")
+    bot = fake_bot()
+    uploaded = MagicMock(photo=[MagicMock(file_id="large")])
+    bot.send_photo.side_effect = [BadRequest("Wrong file identifier"), uploaded]
+
+    asyncio.run(sender.send(bot, 1, "https://example.com/a.jpg"))
+
+    assert bot.send_photo.call_args.kwargs["photo"] == b"image bytes"
+    assert sender.file_ids.get("https://example.com/a.jpg") == "large"
+
+
+def test_photo_sender_keeps_the_file_id_on_other_errors():
+    client = MagicMock()
+    sender = PhotoSender(client=client)
+    sender.file_ids.set("https://example.com/a.jpg", "valid")
+    bot = fake_bot()
+    bot.send_photo.side_effect = BadRequest("Message caption is too long")
+
+    with pytest.raises(BadRequest):
+        asyncio.run(sender.send(bot, 1, "https://example.com/a.jpg", "Long caption"))
+
+    assert sender.file_ids.get("https://example.com/a.jpg") == "valid"
+    bot.send_photo.assert_called_once()
+    client.get.assert_not_called()
+
+
+def test_fit_image_keeps_small_and_unknown_images():
+    assert fit_image(b"not an image", max_bytes=1) == b"not an image"
+
+
+def test_fit_image_downscales_large_images():
+    Image = pytest.importorskip("PIL.Image")
+    original = io.BytesIO()
+    Image.new("RGBA", (3000, 1500), (200, 10, 10, 128)).save(original, "PNG")
+
+    resized = fit_image(original.getvalue(), max_side=1280)
+
+    with Image.open(io.BytesIO(resized)) as image:
+        assert (image.format, image.size) == ("JPEG", (1280, 640))
+    assert len(resized) < len(original.getvalue())
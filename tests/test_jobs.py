@@ -0,0 +1,82 @@
+# tests/test_jobs.py
+import asyncio
+
+import pytest
+
+from src.jobs import JobQueue, QueueFullError
+
+
+def test_job_queue_runs_jobs():
+    async def run():
+        queue = JobQueue(workers=2)
+
+        async def job(value):
+            await asyncio.sleep(0.01)
+            return value
+
+        futures = [queue.submit(1, lambda v=v: job(v))[1] for v in range(5)]
+        results = await asyncio.gather(*futures)
+        await queue.close()
+        return results
+
+    assert asyncio.run(run()) == [0, 1, 2, 3, 4]
+
+
+def test_job_queue_serves_chats_round_robin():
+    async def run():
+        queue = JobQueue(workers=1, max_per_chat=10)
+        release = asyncio.Event()
+        order = []
+
+        async def job(name):
+            await release.wait()
+            order.append(name)
+
+        positions = [queue.submit(1, lambda: job("a1"))[0]]
+        await asyncio.sleep(0)  # The worker takes the first job
+        futures = []
+        for chat_id, name in ((1, "a2"), (1, "a3"), (2, "b1")):
+            position, future = queue.submit(chat_id, lambda name=name: job(name))
+            positions.append(position)
+            futures.append(future)
+        release.set()
+        await asyncio.gather(*futures)
+        await queue.close()
+        return positions, order
+
+    positions, order = asyncio.run(run())
+    assert positions == [0, 1, 2, 2]  # b1 overtakes a3
+    assert order == ["a1", "a2", "b1", "a3"]
+
+
+def test_job_queue_rejects_over_capacity():
+    async def run():
+        queue = JobQueue(workers=1, max_size=2, max_per_chat=1)
+        blocker = asyncio.Event()
+        queue.submit(1, blocker.wait)
+        await asyncio.sleep(0)  # The worker takes the first job
+        queue.submit(1, blocker.wait)
+        with pytest.raises(QueueFullError):
+            queue.submit(1, blocker.wait)  # Chat limit
+        queue.submit(2, blocker.wait)
+        with pytest.raises(QueueFullError):
+            queue.submit(3, blocker.wait)  # Queue limit
+        blocker.set()
+        await queue.close()
+
+    asyncio.run(run())
+
+
+def test_job_queue_propagates_errors():
+    async def run():
+        queue = JobQueue(workers=1)
+
+        async def job():
+            raise ValueError("Test error")
+
+        _, future = queue.submit(1, job)
+        with pytest.raises(ValueError):
+            await future
+        await queue.close()
+
+    asyncio.run(run())
@@ -0,0 +1,36 @@
+# tests/test_languages.py
+import pytest
+
+from src.languages import detect_language, normalize_language, parse_routes, route_model
+
+
+def test_detect_language():
+    assert detect_language("Это короткий текст о погоде в городе.") == "ru"
+    assert detect_language("Це текст українською мовою, і він має літери ї та є.") == "uk"
+    assert detect_language("The weather in the city is fine and it is warm.") == "en"
+    assert detect_language("Der Hund ist nicht in dem Haus und die Katze auch.") == "de"
+    assert detect_language("Le chat est dans la maison et il ne sort pas.") == "fr"
+    assert detect_language("これは日本語のテキストです") == "ja"
+    assert detect_language("1234 5678") is None
+    assert detect_language("") is None
+
+
+def test_route_model():
+    routes = {"en": "en-model", "*": "other-model"}
+    assert route_model("en", routes, "default") == "en-model"
+    assert route_model("fr", routes, "default") == "other-model"
+    assert route_model(None, routes, "default") == "other-model"
+    assert route_model("fr", {"en": "en-model"}, "default") == "default"
+
+
+def test_parse_routes():
+    assert parse_routes(" ru=ru/model , *=other/model,") == {"ru": "ru/model", "*": "other/model"}
+    assert parse_routes("") == {}
+    with pytest.raises(ValueError):
+        parse_routes("ru")
+
+
+def test_normalize_language():
+    assert normalize_language("en-US") == "en"
+    assert normalize_language("pt_BR") == "pt"
+    assert normalize_language(None) is None
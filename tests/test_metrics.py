@@ -0,0 +1,69 @@
+# tests/test_metrics.py
+import threading
+import time
+import urllib.request
+
+from src.metrics import Metrics, MetricsServer, Trace, activate, count, current_trace, stage
+from src.profiler import SamplingProfiler
+
+
+def test_metrics_render_prometheus_text():
+    metrics = Metrics(buckets=(0.1, 1))
+    metrics.inc("requests_total", source="article", outcome="ok")
+    metrics.inc("requests_total", source="article", outcome="ok")
+    metrics.observe("stage_seconds", 0.05, stage="fetch")
+    metrics.observe("stage_seconds", 0.5, stage="fetch")
+    metrics.gauge("queue_size", lambda: 3)
+
+    text = metrics.render()
+
+    assert '# TYPE summarizer_requests_total counter' in text
+    assert 'summarizer_requests_total{outcome="ok",source="article"} 2' in text
+    assert 'summarizer_stage_seconds_bucket{stage="fetch",le="0.1"} 1' in text
+    assert 'summarizer_stage_seconds_bucket{stage="fetch",le="1"} 2' in text
+    assert 'summarizer_stage_seconds_bucket{stage="fetch",le="+Inf"} 2' in text
+    assert 'summarizer_stage_seconds_count{stage="fetch"} 2' in text
+    assert 'summarizer_queue_size 3' in text
+
+
+def test_stages_and_counts_go_to_the_current_trace():
+    trace = Trace(kind="test")
+    with activate(trace):
+        with stage("parse"):
+            time.sleep(0.01)
+        count("tokens", 5, direction="input")
+        assert current_trace() is trace
+    assert current_trace() is None
+
+    assert trace.stages["parse"] >= 0.01
+    assert trace.counts["tokens_input"] == 5
+    assert '"kind": "test"' in trace.to_json()
+
+
+def test_metrics_server_serves_metrics():
+    metrics = Metrics()
+    metrics.inc("requests_total")
+    server = MetricsServer(0, registry=metrics).start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics") as response:
+            assert "summarizer_requests_total 1" in response.read().decode()
+    finally:
+        server.close()
+
+
+def test_sampling_profiler_collects_stacks():
+    def busy_loop(stop):
+        while not stop.is_set():
+            sum(range(1000))
+
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_loop, args=(stop,), name="busy")
+    worker.start()
+    try:
+        profile = SamplingProfiler(interval=0.001).profile(0.1)
+    finally:
+        stop.set()
+        worker.join()
+
+    assert "busy_loop" in profile
+    assert profile.splitlines()[0].rsplit(" ", 1)[1].isdigit()
@@ -1,6 +1,6 @@
 # tests/test_models.py
 
-from src.models import Content, SummaryResult
+from src.models import Content, SummaryResult, Transcript
 
 
 def test_content_creation():
@@ -20,3 +20,40 @@ def test_summary_result_creation():
     result = SummaryResult(summary="Test summary", error_message="Test error")
     assert result.summary == "Test summary"
     assert result.error_message == "Test error"
+
+
+def test_models_are_slotted():
+    content = Content(text="Test text")
+    assert not hasattr(content, "__dict__")
+
+
+def test_transcript_from_segments():
+    segments = [
+        {"text": " Hello there ", "start": 0.0, "duration": 1.5},
+        {"text": "\n", "start": 1.5, "duration": 0.5},  # Empty segments are dropped
+        {"text": "general Kenobi", "start": 2.0, "duration": 2.0},
+    ]
+    transcript = Transcript.from_segments(segments)
+
+    assert transcript.text == "Hello there general Kenobi"
+    assert len(transcript) == 2
+    assert transcript.time_at(transcript.text.index("Kenobi")) == 2.0
+    assert transcript.time_at(0) == 0.0
+    assert transcript.offset_at(1.0) == transcript.text.index("general")
+    assert transcript.offset_at(10.0) == len(transcript.text)
+
+
+def test_transcript_sections_follow_chapters_or_windows():
+    transcript = Transcript.from_segments(
+        {"text": f"Segment {i}.", "start": i * 60.0, "duration": 60.0} for i in range(5)
+    )
+    chapters = [{"title": "Intro", "start_time": 0.0, "end_time": 120.0},
+                {"title": "Main", "start_time": 120.0, "end_time": 300.0}]
+
+    sections = transcript.sections(chapters)
+    assert [(title, start, end) for title, start, end, _, _ in sections] == [("Intro", 0.0, 120.0), ("Main", 120.0, 300.0)]
+    assert [transcript.text[start:end].strip() for *_, start, end in sections] == [
+        "Segment 0. Segment 1.", "Segment 2. Segment 3. Segment 4."
+    ]
+    assert [(start, end) for _, start, end, _, _ in transcript.sections(window_seconds=200)] == [(0, 200), (200, 300.0)]
+    assert len(transcript.sections()) == 1
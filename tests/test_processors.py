@@ -1,18 +1,20 @@
 # tests/test_processors.py
 from unittest.mock import patch, MagicMock
 
-from src.models import Content
+from src.chunkers import WhitespaceTokenizer
+from src.models import Content, Transcript
 from src.processors import TextProcessor
+from src.registry import ModelRegistry
 
 
-@patch('processors.pipeline')  # Mock pipeline
+@patch('src.registry.pipeline')  # Mock pipeline
 def test_text_processor_valid_content(mock_pipeline):
     # Create a mock object for summarizer
     mock_summarizer = MagicMock()
     mock_summarizer.return_value = [{'summary_text': 'Test summary'}]  # expected result
     mock_pipeline.return_value = mock_summarizer  # set return value
 
-    processor = TextProcessor()
+    processor = TextProcessor(registry=ModelRegistry())
     content = Content(text="Test text", source_type="test")
     result = processor.process(content)
 
@@ -22,43 +24,241 @@ def test_text_processor_valid_content(mock_pipeline):
 
 
 def test_text_processor_no_text():
-    processor = TextProcessor()
+    processor = TextProcessor(registry=ModelRegistry())
     content = Content(source_type="test")  # No text
     result = processor.process(content)
     assert result.error_message is not None
 
 
 def test_text_processor_error_content():
-    processor = TextProcessor()
+    processor = TextProcessor(registry=ModelRegistry())
     content = Content(error_message="Test error", source_type="test")  # Error in Content
     result = processor.process(content)
     assert result.error_message == "Test error"
 
 
-@patch('processors.pipeline')  # Mock pipeline
+@patch('src.registry.pipeline')  # Mock pipeline
 def test_text_processor_long_text(mock_pipeline):
     # Create mock object for summarizer
     mock_summarizer = MagicMock()
-    mock_summarizer.side_effect = lambda x, **kwargs: [{'summary_text': f'Summary of {x}'}]
+    mock_summarizer.side_effect = lambda chunks, **kwargs: [{'summary_text': f'Summary of {x}'} for x in chunks]
+    mock_summarizer.tokenizer = WhitespaceTokenizer()
     mock_pipeline.return_value = mock_summarizer
 
-    processor = TextProcessor()
-    long_text = "a" * 2048  # Long text
+    processor = TextProcessor(registry=ModelRegistry(), max_chunk_tokens=100, batch_size=4)
+    long_text = " ".join(f"Sentence number {i} has six words." for i in range(100))  # Long text
     content = Content(text=long_text, source_type="test")
     result = processor.process(content)
     assert result.summary is not None
-    # Additional checks if needed (e.g., that summary contains "Summary of")
-    assert mock_summarizer.call_count > 1  # Should be called multiple times
+    assert "Summary of" in result.summary
+    # Chunks go through the pipeline in batches of batch_size
+    batches = [call.args[0] for call in mock_summarizer.call_args_list]
+    chunks = [chunk for batch in batches for chunk in batch]
+    assert len(chunks) > 1
+    assert all(len(batch) <= 4 for batch in batches)
+    assert len(batches) == -(-len(chunks) // 4)
+    assert all(chunk.endswith(".") for chunk in chunks)  # Chunks keep whole sentences
+    assert mock_summarizer.call_args.kwargs["batch_size"] == 4
 
 
-@patch('processors.pipeline')
+@patch('src.registry.pipeline')
 def test_text_processor_summarization_error(mock_pipeline):
     # Create a mock that raises an exception
     mock_summarizer = MagicMock()
     mock_summarizer.side_effect = Exception("Test summarization error")  # Simulate a summarization error
     mock_pipeline.return_value = mock_summarizer
 
-    processor = TextProcessor()
+    processor = TextProcessor(registry=ModelRegistry())
     content = Content(text="Test text", source_type="test")
     result = processor.process(content)
     assert result.error_message is not None
+
+
+@patch('src.registry.pipeline')
+def test_text_processor_map_reduce(mock_pipeline):
+    # Every chunk is summarized into four words, so the summaries get reduced again
+    mock_summarizer = MagicMock()
+    mock_summarizer.side_effect = lambda chunks, **kwargs: [{'summary_text': 'Short summary of chunk.'} for _ in chunks]
+    mock_summarizer.tokenizer = WhitespaceTokenizer()
+    mock_pipeline.return_value = mock_summarizer
+
+    processor = TextProcessor(registry=ModelRegistry(), max_chunk_tokens=20, target_tokens=4)
+    long_text = " ".join(f"Sentence number {i} has six words." for i in range(60))
+    result = processor.process(Content(text=long_text, source_type="test"))
+
+    assert result.error_message is None
+    assert result.summary == "Short summary of chunk."
+    assert len(result.levels) > 1
+    assert result.levels[-1].chunks == 1
+    assert [level.level for level in result.levels] == list(range(1, len(result.levels) + 1))
+
+
+@patch('src.registry.pipeline')
+def test_text_processor_caches_chunk_summaries(mock_pipeline):
+    mock_summarizer = MagicMock()
+    mock_summarizer.side_effect = lambda chunks, **kwargs: [{'summary_text': 'Test summary'} for _ in chunks]
+    mock_pipeline.return_value = mock_summarizer
+
+    processor = TextProcessor(registry=ModelRegistry())
+    content = Content(text="Test text", source_type="test")
+    processor.process(content)
+    result = processor.process(content)
+
+    assert result.summary == "Test summary"
+    assert result.levels[0].cached == 1
+    mock_summarizer.assert_called_once()
+
+
+@patch('src.registry.pipeline')
+def test_text_processor_iter_process_reports_progress(mock_pipeline):
+    mock_summarizer = MagicMock()
+    mock_summarizer.side_effect = lambda chunks, **kwargs: [{'summary_text': f'Summary {len(x)}'} for x in chunks]
+    mock_summarizer.tokenizer = WhitespaceTokenizer()
+    mock_pipeline.return_value = mock_summarizer
+
+    processor = TextProcessor(registry=ModelRegistry(), max_chunk_tokens=20, batch_size=1, map_reduce=False)
+    long_text = " ".join(f"Sentence number {i} has six words." for i in range(10))
+    items = list(processor.iter_process(Content(text=long_text, source_type="test")))
+
+    progress, result = items[:-1], items[-1]
+    assert [item.done for item in progress] == list(range(1, len(progress) + 1))
+    assert all(item.total == len(progress) for item in progress)
+    assert result.summary == " ".join(item.summary for item in sorted(progress, key=lambda item: item.index))
+    assert mock_summarizer.call_count == len(progress)  # A progress item after every batch
+
+
+@patch('src.registry.pipeline')
+def test_text_processor_process_many_batches_across_documents(mock_pipeline):
+    mock_summarizer = MagicMock()
+    mock_summarizer.side_effect = lambda chunks, **kwargs: [{'summary_text': f'Summary of {x}'} for x in chunks]
+    mock_summarizer.tokenizer = WhitespaceTokenizer()
+    mock_pipeline.return_value = mock_summarizer
+
+    processor = TextProcessor(registry=ModelRegistry(), batch_size=8)
+    contents = [Content(text=f"Short text {i}.", source_type="test") for i in range(3)]
+    contents.append(Content(error_message="Test error", source_type="test"))
+    results = processor.process_many(contents)
+
+    assert [result.summary for result in results[:3]] == [f"Summary of Short text {i}." for i in range(3)]
+    assert results[3].error_message == "Test error"
+    mock_summarizer.assert_called_once()  # One batch for the three documents
+
+
+def video_content():
+    transcript = Transcript.from_segments(
+        {"text": f"Part {i // 2} sentence {i}.", "start": i * 30.0, "duration": 30.0} for i in range(6)
+    )
+    chapters = [{"title": f"Chapter {n}", "start_time": n * 60.0, "end_time": (n + 1) * 60.0} for n in range(3)]
+    return Content(text=transcript.text, source_type="youtube", metadata={"chapters": chapters}, transcript=transcript)
+
+
+@patch('src.registry.pipeline')
+def test_text_processor_summarizes_chapters(mock_pipeline):
+    mock_summarizer = MagicMock()
+    mock_summarizer.side_effect = lambda chunks, **kwargs: [{'summary_text': f'S({x})'} for x in chunks]
+    mock_summarizer.tokenizer = WhitespaceTokenizer()
+    mock_pipeline.return_value = mock_summarizer
+
+    processor = TextProcessor(registry=ModelRegistry(), batch_size=8, target_tokens=1000)
+    result = processor.process(video_content())
+
+    assert [(chapter.title, chapter.start, chapter.end) for chapter in result.chapters] == [
+        ("Chapter 0", 0.0, 60.0), ("Chapter 1", 60.0, 120.0), ("Chapter 2", 120.0, 180.0)
+    ]
+    assert result.chapters[1].summary == "S(Part 1 sentence 2. Part 1 sentence 3.)"
+    assert result.summary == " ".join(chapter.summary for chapter in result.chapters)
+    # The chunks of all chapters share one batch, none of them crosses a chapter
+    mock_summarizer.assert_called_once()
+    assert len(mock_summarizer.call_args.args[0]) == 3
+
+
+@patch('src.registry.pipeline')
+def test_text_processor_process_many_batches_chapters(mock_pipeline):
+    mock_summarizer = MagicMock()
+    mock_summarizer.side_effect = lambda chunks, **kwargs: [{'summary_text': f'S({x})'} for x in chunks]
+    mock_summarizer.tokenizer = WhitespaceTokenizer()
+    mock_pipeline.return_value = mock_summarizer
+
+    processor = TextProcessor(registry=ModelRegistry(), batch_size=8, target_tokens=1000)
+    (result,) = processor.process_many([video_content()])
+
+    assert len(result.chapters) == 3
+    # The first level is read from the chunks summarized ahead, chapter by chapter
+    assert result.levels[0].cached == result.levels[0].chunks == 3
+    mock_summarizer.assert_called_once()
+
+
+@patch('src.registry.pipeline')
+def test_text_processor_summarizes_one_chapter(mock_pipeline):
+    mock_summarizer = MagicMock()
+    mock_summarizer.side_effect = lambda chunks, **kwargs: [{'summary_text': f'S({x})'} for x in chunks]
+    mock_summarizer.tokenizer = WhitespaceTokenizer()
+    mock_pipeline.return_value = mock_summarizer
+
+    processor = TextProcessor(registry=ModelRegistry(), batch_size=8)
+    result = processor.process(video_content(), chapter=2)
+
+    assert result.summary == "S(Part 2 sentence 4. Part 2 sentence 5.)"
+    assert [chapter.title for chapter in result.chapters] == ["Chapter 2"]
+    mock_summarizer.assert_called_once_with(["Part 2 sentence 4. Part 2 sentence 5."], max_length=130, min_length=30,
+                                            do_sample=False, truncation=True, batch_size=8)
+    assert processor.process(video_content(), chapter=3).error_message == "No chapter 3 in this video."
+
+
+@patch('src.registry.pipeline')
+def test_text_processor_resummarizes_only_changed_chunks(mock_pipeline, tmp_path):
+    mock_summarizer = MagicMock()
+    mock_summarizer.side_effect = lambda chunks, **kwargs: [{'summary_text': f'Summary {len(x)}'} for x in chunks]
+    mock_summarizer.tokenizer = WhitespaceTokenizer()
+    mock_pipeline.return_value = mock_summarizer
+    sentences = [f"Sentence {i} of the article {'with more words ' * (i % 4)}ends here." for i in range(400)]
+
+    def summarized_chunks(processor, text):
+        mock_summarizer.reset_mock()
+        processor.process(Content(text=text, source_type="article"))
+        return sum(len(call.args[0]) for call in mock_summarizer.call_args_list)
+
+    path = str(tmp_path / "chunks.db")
+    processor = TextProcessor(registry=ModelRegistry(), max_chunk_tokens=100, map_reduce=False, chunk_store_path=path)
+    total = summarized_chunks(processor, " ".join(sentences))
+
+    # A restarted bot, a mirror of the article with other whitespace, and an edit of its second sentence
+    processor = TextProcessor(registry=ModelRegistry(), max_chunk_tokens=100, map_reduce=False, chunk_store_path=path)
+    assert summarized_chunks(processor, "\n\n".join(sentences)) == 0
+    sentences[1] = "This sentence was rewritten."
+    assert 0 < summarized_chunks(processor, " ".join(sentences)) <= 2 < total
+
+
+def test_text_processor_routes_by_language():
+    registry = ModelRegistry()
+    summarizers = {}
+    for name in ("en-model", "ru-model", "other-model"):
+        summarizer = summarizers[name] = MagicMock()
+        summarizer.side_effect = lambda chunks, name=name, **kwargs: [{'summary_text': f'{name}: {x}'} for x in chunks]
+        summarizer.tokenizer = WhitespaceTokenizer()
+        registry.register(name, summarizer, "eager")
+    routes = {"en": "en-model", "ru": "ru-model", "*": "other-model"}
+    processor = TextProcessor("en-model", registry=registry, routes=routes)
+
+    result = processor.process(Content(text="Это короткий текст о погоде в городе.", source_type="test"))
+    assert (result.language, result.model) == ("ru", "ru-model")
+    assert result.summary.startswith("ru-model: ")
+    # The language given by the source wins over detection
+    result = processor.process(Content(text="The weather in the city is fine.", language="de", source_type="test"))
+    assert (result.language, result.model) == ("de", "other-model")
+
+    results = processor.process_many([
+        Content(text="The weather in the city is fine and it is warm.", source_type="test"),
+        Content(text="Погода в городе хорошая и тёплая.", source_type="test"),
+    ])
+    assert [result.model for result in results] == ["en-model", "ru-model"]
+    summarizers["en-model"].assert_called_once()
+
+
+def test_text_processor_fits_chunks_to_the_model_window():
+    summarizer = MagicMock()
+    summarizer.tokenizer = WhitespaceTokenizer()
+    summarizer.tokenizer.model_max_length = 512
+    chunker = TextProcessor(registry=ModelRegistry(), chunk_overlap_tokens=400)._chunker(summarizer)
+    assert chunker.max_tokens + 24 == 512
+    assert chunker.overlap_tokens < chunker.max_tokens
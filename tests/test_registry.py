@@ -0,0 +1,62 @@
+# tests/test_registry.py
+from unittest.mock import patch, MagicMock
+
+from src.registry import ModelRegistry, rss_bytes
+
+
+@patch('src.registry.pipeline')
+def test_registry_loads_model_once(mock_pipeline):
+    mock_pipeline.return_value = MagicMock()
+    registry = ModelRegistry()
+
+    first = registry.get("model-a")
+    second = registry.get("model-a")
+
+    assert first is second
+    mock_pipeline.assert_called_once_with("summarization", model="model-a")
+
+
+@patch('src.registry.pipeline')
+def test_registry_keeps_models_side_by_side(mock_pipeline):
+    mock_pipeline.side_effect = lambda task, model: MagicMock(name=model)
+    registry = ModelRegistry()
+
+    assert registry.get("model-a") is not registry.get("model-b")
+    assert sorted(registry.loaded_models()) == ["model-a", "model-b"]
+    assert mock_pipeline.call_count == 2
+
+
+@patch('src.registry.pipeline')
+def test_registry_warmup_records_stats(mock_pipeline):
+    mock_summarizer = MagicMock()
+    mock_pipeline.return_value = mock_summarizer
+    registry = ModelRegistry()
+
+    registry.warmup(["model-a"])
+
+    stats = registry.stats()["model-a"]
+    assert stats.load_seconds >= 0
+    assert stats.rss_after > 0
+    mock_summarizer.assert_called_once()  # Warmup inference
+
+
+@patch('src.registry.pipeline')
+def test_registry_register_uses_given_summarizer(mock_pipeline):
+    summarizer = MagicMock()
+    registry = ModelRegistry()
+
+    registry.register("stand-in", summarizer)
+
+    assert registry.get("stand-in") is summarizer
+    assert registry.stats()["stand-in"].load_seconds == 0
+    mock_pipeline.assert_not_called()
+
+
+@patch('src.registry.resource.getrusage')
+@patch('builtins.open', side_effect=OSError)  # No /proc
+def test_rss_bytes_without_proc(mock_open, mock_getrusage):
+    mock_getrusage.return_value.ru_maxrss = 2048
+    with patch('sys.platform', 'darwin'):  # Bytes
+        assert rss_bytes() == 2048
+    with patch('sys.platform', 'freebsd14'):  # Kilobytes
+        assert rss_bytes() == 2048 * 1024
@@ -0,0 +1,208 @@
+# tests/test_services.py
+import asyncio
+import time
+from unittest.mock import patch, MagicMock
+
+import pytest
+
+from src.cache import LRUCache, SummaryCache
+from src.chunkers import WhitespaceTokenizer
+from src.models import ChapterSummary, Content, SummaryResult
+from src.processors import TextProcessor
+from src.registry import ModelRegistry
+from src.services import SummaryService
+
+
+class SlowSource:
+    def __init__(self, url):
+        self.url = url
+
+    def get_content(self):
+        time.sleep(0.2)  # Blocking network call
+        return Content(text=f"Text of {self.url}", source_type="test", source_url=self.url)
+
+
+@patch('src.services.SourceFactory.create_source', side_effect=SlowSource)
+def test_service_summarize(mock_create_source):
+    processor = MagicMock()
+    processor.process.return_value = SummaryResult(summary="Test summary")
+    service = SummaryService(processor)
+
+    content, result = asyncio.run(service.summarize("https://www.example.com/article"))
+
+    assert content.source_url == "https://www.example.com/article"
+    assert result.summary == "Test summary"
+    processor.process.assert_called_once_with(content)
+
+
+@patch('src.services.SourceFactory.create_source')
+def test_service_content_error(mock_create_source):
+    mock_create_source.return_value.get_content.return_value = Content(error_message="Test error")
+    processor = MagicMock()
+    service = SummaryService(processor)
+
+    _, result = asyncio.run(service.summarize("https://www.example.com/article"))
+
+    assert result.error_message == "Test error"
+    processor.process.assert_not_called()
+
+
+@patch('src.services.SourceFactory.create_source', side_effect=SlowSource)
+def test_service_runs_jobs_concurrently(mock_create_source):
+    processor = MagicMock()
+    processor.process.return_value = SummaryResult(summary="Test summary")
+    service = SummaryService(processor, max_concurrent_jobs=4)
+
+    async def run_all():
+        return await asyncio.gather(*(service.summarize(f"https://www.example.com/{i}") for i in range(4)))
+
+    started = time.perf_counter()
+    results = asyncio.run(run_all())
+    assert len(results) == 4
+    assert time.perf_counter() - started < 0.6  # Four blocking fetches of 0.2s did not run one after another
+
+
+@patch('src.services.SourceFactory.create_source', side_effect=ValueError("Not supported source."))
+def test_service_invalid_source(mock_create_source):
+    service = SummaryService(MagicMock())
+    with pytest.raises(ValueError):
+        asyncio.run(service.summarize("invalid-url"))
+
+
+@patch('src.services.SourceFactory.create_source', side_effect=SlowSource)
+def test_service_uses_summary_cache(mock_create_source):
+    processor = MagicMock()
+    processor.process.return_value = SummaryResult(summary="Test summary")
+    service = SummaryService(processor, cache=SummaryCache())
+
+    asyncio.run(service.summarize("https://youtu.be/dQw4w9WgXcQ"))
+    content, result = asyncio.run(service.summarize("https://www.youtube.com/watch?v=dQw4w9WgXcQ"))
+
+    assert result.summary == "Test summary"
+    processor.process.assert_called_once()
+    assert service.cache.stats()["hits"] == 1
+
+
+@patch('src.services.SourceFactory.create_source', side_effect=SlowSource)
+def test_service_coalesces_identical_requests(mock_create_source):
+    processor = MagicMock()
+    processor.process.return_value = SummaryResult(summary="Test summary")
+    service = SummaryService(processor)
+
+    async def run_all():
+        urls = ["https://youtu.be/dQw4w9WgXcQ", "https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=5"] * 5
+        return await asyncio.gather(*(service.summarize(url) for url in urls))
+
+    results = asyncio.run(run_all())
+
+    assert all(result.summary == "Test summary" for _, result in results)
+    processor.process.assert_called_once()
+
+
+@patch('src.registry.pipeline')
+@patch('src.services.SourceFactory.create_source', side_effect=SlowSource)
+def test_service_reports_progress(mock_create_source, mock_pipeline):
+    mock_summarizer = MagicMock()
+    mock_summarizer.side_effect = lambda chunks, **kwargs: [{'summary_text': 'Chunk summary.'} for _ in chunks]
+    mock_summarizer.tokenizer = WhitespaceTokenizer()
+    mock_pipeline.return_value = mock_summarizer
+    processor = TextProcessor(registry=ModelRegistry(), max_chunk_tokens=2, batch_size=1, map_reduce=False)
+    service = SummaryService(processor)
+    progress = []
+
+    _, result = asyncio.run(service.summarize("https://www.example.com/article", on_progress=progress.append))
+
+    assert result.summary == "Chunk summary. Chunk summary."  # SlowSource text is split into two chunks
+    assert [(item.done, item.total) for item in progress] == [(1, 2), (2, 2)]
+
+
+@patch('src.registry.pipeline')
+@patch('src.services.SourceFactory.create_source', side_effect=SlowSource)
+def test_service_traces_stages(mock_create_source, mock_pipeline):
+    from metrics import Trace, activate  # The module the service records to
+
+    mock_summarizer = MagicMock()
+    mock_summarizer.side_effect = lambda chunks, **kwargs: [{'summary_text': 'Chunk summary.'} for _ in chunks]
+    mock_summarizer.tokenizer = WhitespaceTokenizer()
+    mock_pipeline.return_value = mock_summarizer
+    processor = TextProcessor(registry=ModelRegistry(), max_chunk_tokens=2, batch_size=1, map_reduce=False)
+    service = SummaryService(processor)
+    trace = Trace(kind="test")
+
+    async def run():
+        with activate(trace):
+            return await service.summarize("https://www.example.com/article")
+
+    asyncio.run(run())
+
+    assert {"classify", "fetch", "summarize", "chunking", "inference"} <= set(trace.stages)
+    assert trace.stages["fetch"] >= 0.2
+    assert trace.counts["chunks"] == 2
+    assert trace.counts["tokens_input"] == 3
+
+
+@patch('src.services.SourceFactory.create_source', side_effect=SlowSource)
+def test_service_serves_a_chapter_from_the_cached_video(mock_create_source):
+    processor = MagicMock()
+    processor.process.return_value = SummaryResult(summary="Video summary", chapters=[
+        ChapterSummary(title="Intro", start=0.0, end=60.0, summary="Intro summary"),
+        ChapterSummary(title="Main", start=60.0, end=300.0, summary="Main summary"),
+    ])
+    service = SummaryService(processor, cache=SummaryCache())
+
+    asyncio.run(service.summarize("https://youtu.be/dQw4w9WgXcQ"))
+    _, result = asyncio.run(service.summarize("https://youtu.be/dQw4w9WgXcQ", chapter=1))
+
+    assert result.summary == "Main summary"
+    assert [chapter.title for chapter in result.chapters] == ["Main"]
+    processor.process.assert_called_once()
+
+
+class StandInSummarizer:
+    tokenizer = WhitespaceTokenizer()
+
+    def __call__(self, inputs, **kwargs):
+        texts = [inputs] if isinstance(inputs, str) else inputs
+        return [{"summary_text": f"Summary of {text}"} for text in texts]
+
+
+@patch('src.services.configure_threads')  # No torch here, the workers would otherwise import it
+def test_service_workers_inherit_the_preloaded_model(mock_configure_threads):
+    import registry  # The registry the service modules use
+
+    registry.model_registry.register("shared-test-model", StandInSummarizer())
+    registry.model_registry.register("shared-ru-model", StandInSummarizer())
+    processor = TextProcessor("shared-test-model", cache=LRUCache(), routes={"ru": "shared-ru-model"})
+    service = SummaryService(processor, inference_processes=2, share_model=True)
+    try:
+        assert service.share_model
+        with patch.object(registry.model_registry, "get", wraps=registry.model_registry.get) as get:
+            service.warmup(["shared-test-model"])
+        # The models routed to other languages are loaded before the fork too
+        assert {call.args[0] for call in get.call_args_list} == {"shared-test-model", "shared-ru-model"}
+        # The workers were forked after the model was loaded here, none of them loaded it again
+        result = asyncio.run(service.process(Content(text="Test text.", source_type="test")))
+        assert result.summary == "Summary of Test text."
+        result = asyncio.run(service.process(Content(text="Тестовый текст.", source_type="test")))
+        assert result.model == "shared-ru-model"
+
+        # The stages timed in the worker are recorded in the trace of the request
+        import metrics  # The module the service records into
+
+        async def traced():
+            with metrics.activate(metrics.Trace()) as trace:
+                await service.process(Content(text="Another text.", source_type="test"), on_progress=lambda progress: None)
+            return trace
+
+        assert {"chunking", "inference"} <= set(asyncio.run(traced()).stages)
+        mock_configure_threads.assert_called_once_with(1)  # Loaded on one thread, before the fork
+    finally:
+        service.shutdown()
+        registry.model_registry.clear()
+
+
+def test_service_warmup_loads_the_routed_models():
+    service = SummaryService(TextProcessor("en-model", cache=LRUCache(), routes={"ru": "ru-model"}))
+    with patch('src.services.model_registry.warmup') as warmup:
+        service.warmup(["en-model", "other-model"])
+    warmup.assert_called_once_with(["en-model", "ru-model", "other-model"], "eager")
@@ -0,0 +1,51 @@
+# tests/test_singleflight.py
+import asyncio
+
+from src.singleflight import SingleFlight
+
+
+def test_single_flight_shares_running_job():
+    calls = []
+
+    async def job():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def run_all():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do("key", job) for _ in range(5)))
+        return flight, results
+
+    flight, results = asyncio.run(run_all())
+    assert results == ["result"] * 5
+    assert len(calls) == 1
+    assert flight.shared == 4
+    assert flight.in_flight() == 0
+
+
+def test_single_flight_propagates_errors_to_every_caller():
+    async def job():
+        await asyncio.sleep(0.01)
+        raise ValueError("Test error")
+
+    async def run_all():
+        flight = SingleFlight()
+        return await asyncio.gather(*(flight.do("key", job) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run_all())
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_single_flight_runs_again_after_completion():
+    calls = []
+
+    async def job():
+        calls.append(1)
+        return len(calls)
+
+    async def run_twice():
+        flight = SingleFlight()
+        return await flight.do("key", job), await flight.do("key", job)
+
+    assert asyncio.run(run_twice()) == (1, 2)
@@ -3,7 +3,9 @@
 from unittest.mock import patch, MagicMock
 
 import pytest
+import requests
 
+from src.http_client import HttpResponse
 from src.sources import YouTubeSource, ArticleSource
 
 
@@ -35,32 +37,101 @@ def test_youtube_source_invalid_url(invalid_url):
     assert content.error_message is not None  # Expect an error
 
 
-# Mock YoutubeLoader to avoid making real network requests
-@patch('sources.YoutubeLoader.from_youtube_url')  # specify the full path
-def test_youtube_source_loader_error(mock_loader):
-    mock_loader.side_effect = Exception("Test error")  # Simulate an error
+# Mock the transcript API and yt-dlp to avoid making real network requests
+@patch('src.sources.YouTubeSource._get_metadata', return_value={})
+@patch('youtube_transcript_api.YouTubeTranscriptApi.list_transcripts')  # specify the full path
+def test_youtube_source_loader_error(mock_list_transcripts, mock_metadata):
+    mock_list_transcripts.side_effect = Exception("Test error")  # Simulate an error
     source = YouTubeSource("https://www.youtube.com/watch?v=dQw4w9WgXcQ")
     content = source.get_content()
     assert content.error_message is not None
 
 
-@patch('sources.YoutubeLoader.from_youtube_url')
-def test_youtube_source_no_docs(mock_loader):
-    mock_loader.return_value.load.return_value = []  # if load returned empty list.
+@patch('src.sources.YouTubeSource._get_metadata', return_value={})
+@patch('youtube_transcript_api.YouTubeTranscriptApi.list_transcripts')
+def test_youtube_source_no_docs(mock_list_transcripts, mock_metadata):
+    transcript = mock_list_transcripts.return_value.find_transcript.return_value
+    transcript.language_code = "ru"
+    transcript.fetch.return_value = []  # if fetch returned empty list.
     source = YouTubeSource("https://www.youtube.com/watch?v=dQw4w9WgXcQ")
     content = source.get_content()
     assert content.error_message is not None
 
 
+@patch('yt_dlp.YoutubeDL')
+@patch('youtube_transcript_api.YouTubeTranscriptApi.list_transcripts')
+def test_youtube_source_transcript_and_metadata(mock_list_transcripts, mock_youtube_dl):
+    transcript = mock_list_transcripts.return_value.find_transcript.return_value
+    transcript.language_code = "ru"
+    transcript.fetch.return_value = [
+        {"text": "First line ", "start": 0.0, "duration": 1.5},
+        {"text": "second line", "start": 1.5, "duration": 2.0},
+    ]
+    ydl = mock_youtube_dl.return_value.__enter__.return_value
+    ydl.extract_info.return_value = {
+        "title": "Test video", "duration": 3, "thumbnail": "https://i.ytimg.com/vi/test/hq.jpg", "subtitles": {"en": []},
+    }
+
+    for url in ("https://www.youtube.com/watch?v=test", "https://youtu.be/test"):
+        content = YouTubeSource(url).get_content()
+        assert content.error_message is None
+        assert content.text == "First line second line"
+        assert content.image_url == "https://i.ytimg.com/vi/test/hq.jpg"
+        assert content.metadata["title"] == "Test video"
+        assert content.metadata["languages"] == ["en"]
+
+    ydl.extract_info.assert_called_once()  # Metadata is cached per video ID
+
+
+@patch('src.sources.YouTubeSource._get_metadata', return_value={})
+@patch('youtube_transcript_api.YouTubeTranscriptApi.list_transcripts')
+def test_youtube_source_keeps_the_original_language(mock_list_transcripts, mock_metadata):
+    from youtube_transcript_api import NoTranscriptFound
+
+    transcript = MagicMock(language_code="de-DE")
+    transcript.fetch.return_value = [{"text": "Guten Tag", "start": 0.0, "duration": 1.0}]
+    mock_list_transcripts.return_value.find_transcript.side_effect = NoTranscriptFound("test", ["ru"], [])
+    mock_list_transcripts.return_value.__iter__.return_value = iter([transcript])
+
+    content = YouTubeSource("https://www.youtube.com/watch?v=german").get_content()
+    assert content.text == "Guten Tag"
+    assert content.language == "de"
+    transcript.translate.assert_not_called()
+
+
+@patch('src.sources.YouTubeSource._get_metadata', side_effect=Exception("Sign in to confirm you're not a bot"))
+@patch('youtube_transcript_api.YouTubeTranscriptApi.list_transcripts')
+def test_youtube_source_without_metadata(mock_list_transcripts, mock_metadata):
+    transcript = mock_list_transcripts.return_value.find_transcript.return_value
+    transcript.language_code = "ru"
+    transcript.fetch.return_value = [{"text": "First line", "start": 0.0, "duration": 1.5}]
+
+    content = YouTubeSource("https://www.youtube.com/watch?v=nometadata").get_content()
+
+    assert content.error_message is None
+    assert content.text == "First line"
+    assert content.metadata == {}
+    assert content.image_url is None
+
+
 # Tests for ArticleSource
 
-@patch('sources.requests.get')
+def mock_page(mock_get, html, encoding=None):
+    # The client streams the page into the extractor, after passing the headers
+    def get(url, consumer=None, on_headers=None, **kwargs):
+        if on_headers is not None:
+            on_headers(HttpResponse(url=url, status_code=200, encoding=encoding))
+        if consumer is not None:
+            consumer(html)
+        return HttpResponse(url=url, status_code=200, content=html, encoding=encoding)
+
+    mock_get.side_effect = get
+
+
+@patch('src.sources.http_client.get')
 def test_article_source_valid_url(mock_get):
     # Create a mock response object
-    mock_response = MagicMock()
-    mock_response.status_code = 200
-    mock_response.content = b"<html><body><p>Test text</p><img src='https://example.com/image.jpg'></body></html>"  # Simulate response
-    mock_get.return_value = mock_response  # Substitute
+    mock_page(mock_get, b"<html><body><p>Test text</p><img src='https://example.com/image.jpg'></body></html>")  # Simulate response
 
     source = ArticleSource("https://www.example.com/article")
     content = source.get_content()
@@ -71,25 +142,28 @@ def test_article_source_valid_url(mock_get):
     assert content.image_url == "https://example.com/image.jpg"
 
 
-@patch('sources.requests.get')
+@patch('src.sources.http_client.get')
+def test_article_source_charset_from_the_header(mock_get):
+    # No <meta charset>, only "Content-Type: text/html; charset=windows-1251"
+    mock_page(mock_get, "<html><body><p>Привет, мир</p></body></html>".encode("cp1251"), encoding="windows-1251")
+
+    content = ArticleSource("https://www.example.ru/article").get_content()
+    assert content.text == "Привет, мир"
+
+
+@patch('src.sources.http_client.get')
 def test_article_source_relative_image_url(mock_get):
     # Test handling of relative image URLs
-    mock_response = MagicMock()
-    mock_response.status_code = 200
-    mock_response.content = b"<html><body><p>Test text</p><img src='/image.jpg'></body></html>"  # Relative path
-    mock_get.return_value = mock_response
+    mock_page(mock_get, b"<html><body><p>Test text</p><img src='/image.jpg'></body></html>")  # Relative path
 
     source = ArticleSource("https://www.example.com/article")
     content = source.get_content()
     assert content.image_url == "https://www.example.com/image.jpg"
 
 
-@patch('sources.requests.get')
+@patch('src.sources.http_client.get')
 def test_article_source_no_image(mock_get):
-    mock_response = MagicMock()
-    mock_response.status_code = 200
-    mock_response.content = b"<html><body><p>Test text</p></body></html>"  # No image
-    mock_get.return_value = mock_response
+    mock_page(mock_get, b"<html><body><p>Test text</p></body></html>")  # No image
 
     source = ArticleSource("https://www.example.com/article")
     content = source.get_content()
@@ -107,7 +181,7 @@ def test_article_source_invalid_url(invalid_url):
     assert content.error_message is not None
 
 
-@patch('sources.requests.get')
+@patch('src.sources.http_client.get')
 def test_article_source_request_error(mock_get):
     mock_get.side_effect = requests.exceptions.RequestException("Test error")  # Simulate a request error
     source = ArticleSource("https://www.example.com/article")
@@ -0,0 +1,13 @@
+import os
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+HEAVY_MODULES = ["transformers", "torch", "yt_dlp", "youtube_transcript_api"]
+
+
+def test_main_does_not_import_heavy_dependencies():
+    # A fresh interpreter, the test process has imported them already
+    code = f"import sys, main; print([m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+    output = subprocess.run([sys.executable, "-c", code], cwd=SRC, capture_output=True, text=True, check=True).stdout
+    assert output.strip().splitlines()[-1] == "[]"
@@ -0,0 +1,46 @@
+# tests/test_urls.py
+
+import pytest
+
+from src.urls import canonicalize_url, extract_urls, extract_video_id
+
+
+@pytest.mark.parametrize("url", [
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+    "https://youtu.be/dQw4w9WgXcQ",
+    "https://youtu.be/dQw4w9WgXcQ?t=42",
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=42s",
+    "https://m.youtube.com/watch?feature=share&v=dQw4w9WgXcQ",
+    "https://youtube.com/shorts/dQw4w9WgXcQ",
+    " https://www.youtube.com/embed/dQw4w9WgXcQ ",
+    "https://www.youtube.com:443/watch?v=dQw4w9WgXcQ",
+    "https://user@youtu.be/dQw4w9WgXcQ",
+])
+def test_canonicalize_youtube_url(url):
+    assert canonicalize_url(url) == "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+
+def test_canonicalize_article_url():
+    url = "HTTPS://Www.Example.com/article/?b=2&utm_source=feed&a=1#comments"
+    assert canonicalize_url(url) == "https://www.example.com/article?a=1&b=2"
+
+
+@pytest.mark.parametrize("url", [
+    "https://www.youtube.com/playlist?list=PL12345",
+    "https://www.example.com/watch?v=dQw4w9WgXcQ",
+    "invalid-url",
+])
+def test_extract_video_id_not_a_video(url):
+    assert extract_video_id(url) is None
+
+
+def test_extract_urls_from_a_message():
+    message = ("Look: youtu.be/dQw4w9WgXcQ, and https://en.wikipedia.org/wiki/Python_(language). "
+               "Also (https://www.example.com/a?x=1) and www.example.com/b! Again: https://youtu.be/dQw4w9WgXcQ?t=3")
+    assert extract_urls(message) == [
+        "https://youtu.be/dQw4w9WgXcQ",
+        "https://en.wikipedia.org/wiki/Python_(language)",
+        "https://www.example.com/a?x=1",
+        "https://www.example.com/b",
+    ]
+    assert extract_urls("No links here.") == []